@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memória dos dtypes compactos na extração
+
+Cria uma tabela larga sintética no SQLite (no formato de utilizacao: chaves
+inteiras, códigos curtos, textos e valores) e compara o DataFrame lido por
+pd.read_sql com o lido pelo extrator do pipeline gerado (_compact_dtypes).
+
+Uso:
+    python benchmarks/bench_dtypes.py [--rows 200000] [--columns 40]
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd
+import sqlalchemy as sa
+from loguru import logger
+
+from src.generator.code_generator import CodeGenerator
+from src.models.ktr_models import Connection, Hop, KTRModel, TableInputStep, TableOutputStep
+
+
+def build_wide_table(engine, rows: int, columns: int, seed: int = 42):
+    """Tabela utilizacao com colunas de chave, código, texto e valor em rodízio"""
+    rng = random.Random(seed)
+    codes = ["A", "B", "C", "D", "E"]
+    data = {}
+    for i in range(columns):
+        kind = i % 4
+        if kind == 0:
+            data[f"id_{i}"] = [rng.randint(1, 10_000_000) for _ in range(rows)]
+        elif kind == 1:
+            data[f"cod_{i}"] = [rng.choice(codes) for _ in range(rows)]
+        elif kind == 2:
+            data[f"txt_{i}"] = [f"descricao {rng.randint(1, rows)}" for _ in range(rows)]
+        else:
+            data[f"vl_{i}"] = [rng.random() * 1000 for _ in range(rows)]
+    pd.DataFrame(data).to_sql("utilizacao", engine, index=False)
+
+
+def load_pipeline(model: KTRModel):
+    """Renderiza o pipeline gerado e retorna uma instância (sem conexões reais)"""
+    generator = CodeGenerator()
+    template_data = generator._prepare_template_data(model)
+    namespace = {"__name__": "bench_pipeline"}
+    exec(compile(generator._generate_main_pipeline(template_data), "bench_pipeline.py", "exec"), namespace)
+    namespace["create_engine"] = MagicMock()
+    pipeline = namespace[template_data["pipeline_class_name"]]({})
+    pipeline.setup_connections()
+    return pipeline
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arg_parser.add_argument("--rows", type=int, default=200000)
+    arg_parser.add_argument("--columns", type=int, default=40)
+    args = arg_parser.parse_args()
+
+    logger.remove()
+    model = KTRModel(
+        name="bench_dtypes",
+        connections=[Connection("db", "SQLITE", "", "", 0, "", "")],
+        steps=[
+            TableInputStep("utilizacao", connection_name="db", sql="SELECT * FROM utilizacao"),
+            TableOutputStep("saida", connection_name="db", table="saida"),
+        ],
+        hops=[Hop("utilizacao", "saida")],
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = sa.create_engine(f"sqlite:///{Path(tmp_dir) / 'bench.db'}")
+        build_wide_table(engine, args.rows, args.columns)
+        pipeline = load_pipeline(model)
+        pipeline.connections["db"] = engine
+
+        start = time.perf_counter()
+        with engine.connect() as connection:
+            default_df = pd.read_sql("SELECT * FROM utilizacao", connection)
+        default_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        compact_df = pipeline.extract_utilizacao()
+        compact_time = time.perf_counter() - start
+        engine.dispose()
+
+    default_mb = default_df.memory_usage(deep=True).sum() / 1024 ** 2
+    compact_mb = compact_df.memory_usage(deep=True).sum() / 1024 ** 2
+    print(f"{'leitura':<12} {'MB':>9} {'tempo s':>8}")
+    print(f"{'read_sql':<12} {default_mb:>9.1f} {default_time:>8.2f}")
+    print(f"{'compacta':<12} {compact_mb:>9.1f} {compact_time:>8.2f}")
+    print(f"redução: {default_mb / compact_mb:.1f}x")
+    print(compact_df.dtypes.value_counts().to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos engines pandas, Polars e DuckDB no mesmo pipeline gerado
+
+Gera o pipeline vendas → StringOperations → SelectValues → FilterRows →
+SortRows → GroupBy → TableOutput com cada engine e executa todos sobre a
+mesma tabela sintética no SQLite, medindo o tempo por etapa e conferindo
+que todos carregam o mesmo resultado.
+
+Uso:
+    python benchmarks/bench_engines.py [--rows 100000 1000000] [--engines pandas duckdb]
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd
+import sqlalchemy as sa
+from loguru import logger
+
+from src.generator.code_generator import ENGINES, CodeGenerator
+from src.models.ktr_models import (
+    Connection, FilterRowsStep, GroupByStep, Hop, KTRModel, SelectValuesStep, SortRowsStep,
+    StringOperationsStep, TableInputStep, TableOutputStep
+)
+
+UFS = ["SP", "RJ", "MG", "BA", "PR", "RS", "PE", "CE", "sp", "rj"]
+
+
+def build_model() -> KTRModel:
+    """Pipeline com as transformações cobertas por todos os engines"""
+    condition = {
+        "negated": False, "operator": "-", "leftvalue": "", "function": "=", "rightvalue": "", "value": None,
+        "conditions": [
+            {"negated": False, "operator": "-", "leftvalue": "valor", "function": ">", "rightvalue": "",
+             "value": {"type": "Number", "text": "100", "isnull": False}, "conditions": []},
+            {"negated": True, "operator": "AND", "leftvalue": "uf", "function": "IN LIST", "rightvalue": "",
+             "value": {"type": "String", "text": "CE;PE", "isnull": False}, "conditions": []},
+        ],
+    }
+    return KTRModel(
+        name="bench_engines",
+        connections=[Connection("db", "SQLITE", "", "", 0, "", "")],
+        steps=[
+            TableInputStep("vendas", connection_name="db", sql="SELECT * FROM vendas"),
+            StringOperationsStep("limpa", operations=[
+                {"field_name": "cliente", "trim_type": "both", "lower_upper": "upper", "padding_type": "none"}
+            ]),
+            SelectValuesStep("seleciona", fields=[
+                {"name": "uf", "rename": ""}, {"name": "cliente", "rename": ""},
+                {"name": "valor", "rename": ""}, {"name": "quantidade", "rename": "qtd"},
+            ]),
+            FilterRowsStep("filtra", condition=condition),
+            SortRowsStep("ordena", fields=[
+                {"name": "uf", "ascending": True, "case_sensitive": False},
+                {"name": "valor", "ascending": False, "case_sensitive": True},
+            ]),
+            GroupByStep("agrupa", group_fields=["uf"], aggregates=[
+                {"name": "total", "subject": "valor", "type": "SUM"},
+                {"name": "media", "subject": "valor", "type": "AVERAGE"},
+                {"name": "itens", "subject": "qtd", "type": "SUM"},
+                {"name": "clientes", "subject": "cliente", "type": "COUNT_DISTINCT"},
+                {"name": "linhas", "subject": "", "type": "COUNT_ANY"},
+            ]),
+            TableOutputStep("resumo", connection_name="db", table="resumo", truncate=True),
+        ],
+        hops=[
+            Hop("vendas", "limpa"), Hop("limpa", "seleciona"), Hop("seleciona", "filtra"),
+            Hop("filtra", "ordena"), Hop("ordena", "agrupa"), Hop("agrupa", "resumo"),
+        ],
+    )
+
+
+def build_source(engine, rows: int, seed: int = 42):
+    """Tabela vendas sintética"""
+    rng = random.Random(seed)
+    pd.DataFrame({
+        "id": range(rows),
+        "uf": [rng.choice(UFS) for _ in range(rows)],
+        "cliente": [f" cliente {rng.randint(1, rows // 10 + 1)} " for _ in range(rows)],
+        "valor": [round(rng.random() * 1000, 2) for _ in range(rows)],
+        "quantidade": [rng.randint(1, 20) for _ in range(rows)],
+        "obs": ["x" * 20] * rows,
+    }).to_sql("vendas", engine, index=False, chunksize=50000)
+
+
+def run_engine(engine_name: str, db_engine) -> tuple:
+    """Executa o pipeline gerado com o engine; retorna (tempo total, métricas, resultado)"""
+    generator = CodeGenerator(engine=engine_name)
+    template_data = generator._prepare_template_data(build_model())
+    namespace = {"__name__": f"bench_{engine_name}"}
+    exec(compile(generator._generate_main_pipeline(template_data), f"bench_{engine_name}.py", "exec"), namespace)
+    namespace["create_engine"] = MagicMock()
+    pipeline = namespace[template_data["pipeline_class_name"]]({"log_file": str(Path(tempfile.gettempdir()) / "bench_engines.log")})
+    pipeline.connections = {"db": db_engine}
+
+    start = time.perf_counter()
+    metrics = pipeline.run_pipeline()
+    elapsed = time.perf_counter() - start
+    if metrics["status"] != "success":
+        raise RuntimeError(metrics.get("error"))
+
+    with db_engine.connect() as connection:
+        result = pd.read_sql("SELECT * FROM resumo", connection)
+    return elapsed, metrics, result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arg_parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000])
+    arg_parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    args = arg_parser.parse_args()
+
+    logger.remove()
+    print(f"{'linhas':>10} {'engine':<8} {'extração s':>11} {'transf.+carga s':>16} {'total s':>8}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_engine = sa.create_engine(f"sqlite:///{Path(tmp_dir) / 'bench.db'}")
+            build_source(db_engine, rows)
+
+            results = {}
+            for engine_name in args.engines:
+                elapsed, metrics, results[engine_name] = run_engine(engine_name, db_engine)
+                extraction = metrics["steps"]["vendas"]["execution_time"]
+                print(f"{rows:>10} {engine_name:<8} {extraction:>11.2f} {elapsed - extraction:>16.2f} {elapsed:>8.2f}")
+            db_engine.dispose()
+
+        # GROUP BY no SQL não garante a ordem dos grupos
+        expected = results[args.engines[0]].sort_values("uf", ignore_index=True)
+        for engine_name in args.engines[1:]:
+            result = results[engine_name].sort_values("uf", ignore_index=True)
+            pd.testing.assert_frame_equal(result, expected, check_exact=False, check_dtype=False)
+    print("resultados idênticos em todos os engines")
+
+
+if __name__ == "__main__":
+    main()
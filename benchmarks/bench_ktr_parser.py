@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark do KTRParser: DOM completo vs streaming (iterparse)
+
+Gera KTRs sintéticos de tamanhos crescentes (SQL embutido, notas da GUI e
+blocos de tabelas de log) e mede tempo de parede e pico de memória de cada modo.
+
+Uso:
+    python benchmarks/bench_ktr_parser.py [--sizes 100 1000 5000]
+"""
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger
+
+from src.parser.ktr_parser import KTRParser
+
+SQL_COLUMNS = ", ".join(f"cast(col_{i} as bigint) col_{i}" for i in range(90))
+
+
+def build_synthetic_ktr(num_steps: int) -> str:
+    """Monta um KTR com num_steps cadeias TableInput → TableOutput"""
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        "<transformation>",
+        "  <info>",
+        f"    <name>bench_{num_steps}</name>",
+        "    <description>KTR sintético para benchmark</description>",
+        "    <log>",
+    ]
+    for i in range(num_steps // 10 + 1):
+        parts.append(
+            f"      <trans-log-table><connection/><table>log_{i}</table>"
+            + "".join(f"<field><id>F{j}</id><enabled>Y</enabled><name>F{j}</name></field>" for j in range(20))
+            + "</trans-log-table>"
+        )
+    parts.append("    </log>")
+    parts.append("  </info>")
+    parts.append(
+        "  <connection><name>db</name><server>localhost</server><type>POSTGRESQL</type>"
+        "<database>bench</database><port>5432</port><username>u</username><password>p</password></connection>"
+    )
+    parts.append("  <notepads>")
+    for i in range(num_steps // 5 + 1):
+        parts.append(f"    <notepad><note>{'Nota de documentação da GUI. ' * 40}</note><xloc>{i}</xloc></notepad>")
+    parts.append("  </notepads>")
+    parts.append("  <order>")
+    for i in range(num_steps // 2):
+        parts.append(f"    <hop><from>input_{i}</from><to>output_{i}</to><enabled>Y</enabled></hop>")
+    parts.append("  </order>")
+    for i in range(num_steps // 2):
+        parts.append(
+            f"  <step><name>input_{i}</name><type>TableInput</type><description/>"
+            f"<connection>db</connection><sql>SELECT {SQL_COLUMNS} FROM tabela_{i}</sql><limit>0</limit></step>"
+        )
+        parts.append(
+            f"  <step><name>output_{i}</name><type>TableOutput</type><description/>"
+            f"<connection>db</connection><schema>public</schema><table>destino_{i}</table>"
+            f"<truncate>Y</truncate><commit>1000</commit></step>"
+        )
+    parts.append("</transformation>")
+    return "\n".join(parts)
+
+
+def measure(parser: KTRParser, path: str, streaming: bool):
+    """Retorna (segundos, pico de memória em MB, modelo)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    model = parser.parse_file(path, streaming=streaming)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024), model
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arg_parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000, 5000])
+    args = arg_parser.parse_args()
+
+    logger.remove()
+    parser = KTRParser()
+
+    print(f"{'steps':>7} {'arquivo MB':>11} {'DOM s':>8} {'DOM MB':>8} {'stream s':>9} {'stream MB':>10} {'iguais':>7}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in args.sizes:
+            path = Path(tmp_dir) / f"bench_{size}.ktr"
+            path.write_text(build_synthetic_ktr(size), encoding="utf-8")
+            file_mb = path.stat().st_size / (1024 * 1024)
+
+            dom_time, dom_peak, dom_model = measure(parser, str(path), streaming=False)
+            stream_time, stream_peak, stream_model = measure(parser, str(path), streaming=True)
+
+            print(
+                f"{size:>7} {file_mb:>11.1f} {dom_time:>8.2f} {dom_peak:>8.1f} "
+                f"{stream_time:>9.2f} {stream_peak:>10.1f} {str(dom_model == stream_model):>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
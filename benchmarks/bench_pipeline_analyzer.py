@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark do PipelineAnalyzer em DAGs sintéticos
+
+Gera pipelines em camadas (entradas → transformações → saídas) com hops
+aleatórios entre camadas consecutivas, o que produz um número exponencial de
+caminhos simples, e mede o tempo de analyze_pipeline e find_critical_paths.
+
+Uso:
+    python benchmarks/bench_pipeline_analyzer.py [--sizes 10 100 1000 10000]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger
+
+from src.analyzer.pipeline_analyzer import PipelineAnalyzer
+from src.models.ktr_models import KTRModel, Step, StepType, Hop, TableInputStep, TableOutputStep
+
+# Limite esperado por análise
+TARGET_SECONDS = 1.0
+
+
+def build_synthetic_dag(num_steps: int, layer_width: int = 8, fan_out: int = 3, seed: int = 42) -> KTRModel:
+    """Monta um KTRModel em camadas com num_steps steps"""
+    rng = random.Random(seed)
+    layers = []
+    steps = []
+    for i in range(num_steps):
+        layer = i // layer_width
+        if layer == len(layers):
+            layers.append([])
+        name = f"step_{i}"
+        layers[layer].append(name)
+
+    last_layer = len(layers) - 1
+    for layer, names in enumerate(layers):
+        for name in names:
+            if layer == 0:
+                steps.append(TableInputStep(name, connection_name="db", sql="SELECT 1"))
+            elif layer == last_layer:
+                steps.append(TableOutputStep(name, connection_name="db", table=name))
+            else:
+                steps.append(Step(name, StepType.SELECT_VALUES))
+
+    hops = []
+    for layer in range(last_layer):
+        for name in layers[layer]:
+            for target in rng.sample(layers[layer + 1], min(fan_out, len(layers[layer + 1]))):
+                hops.append(Hop(name, target))
+
+    return KTRModel(name=f"bench_{num_steps}", steps=steps, hops=hops)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arg_parser.add_argument("--sizes", nargs="+", type=int, default=[10, 100, 1000, 10000])
+    args = arg_parser.parse_args()
+
+    logger.remove()
+    analyzer = PipelineAnalyzer()
+
+    print(f"{'steps':>7} {'hops':>7} {'análise s':>10} {'críticos s':>11} {'prof.':>6} {'larg.':>6} {'< 1s':>5}")
+    for size in args.sizes:
+        model = build_synthetic_dag(size)
+
+        start = time.perf_counter()
+        result = analyzer.analyze_pipeline(model)
+        analysis_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        analyzer.find_critical_paths(model)
+        paths_time = time.perf_counter() - start
+
+        within_target = analysis_time < TARGET_SECONDS and paths_time < TARGET_SECONDS
+        print(
+            f"{size:>7} {len(model.hops):>7} {analysis_time:>10.3f} {paths_time:>11.3f} "
+            f"{result.metrics['graph_depth']:>6} {result.metrics['graph_width']:>6} {str(within_target):>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
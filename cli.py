@@ -6,7 +6,7 @@ Ferramenta para migração de pipelines Pentaho KTR para Python
 Usage:
     ktr-migrator convert <ktr_file> --output <output_dir>
     ktr-migrator analyze <ktr_file> [--report <report_file>]
-    ktr-migrator batch-convert <input_dir> --output <output_dir>
+    ktr-migrator batch-convert <input_dir> --output <output_dir> [--jobs N]
     ktr-migrator validate <ktr_file>
 """
 
@@ -24,12 +24,17 @@ sys.path.insert(0, str(Path(__file__).parent / "src"))
 from src.parser.ktr_parser import KTRParser
 from src.generator.code_generator import CodeGenerator
 from src.analyzer.pipeline_analyzer import PipelineAnalyzer
+from src.cache.ktr_cache import KTRCache
+from src.batch.batch_converter import BatchConverter
 
 @click.group()
 @click.version_option(version="1.0.0")
-def cli():
+@click.option('--no-cache', is_flag=True, help='Ignorar o cache persistente de parse/análise')
+@click.pass_context
+def cli(ctx, no_cache: bool):
     """🔄 KTR Migrator - Migração de pipelines Pentaho para Python"""
     setup_logging()
+    ctx.obj = {"cache": KTRCache(enabled=not no_cache)}
 
 def setup_logging():
     """Configura logging global"""
@@ -53,29 +58,42 @@ def setup_logging():
 @click.option('--optimize', is_flag=True, help='Aplicar otimizações avançadas')
 @click.option('--format-code', is_flag=True, default=True, help='Formatar código gerado')
 @click.option('--generate-tests', is_flag=True, default=True, help='Gerar testes automatizados')
-def convert(ktr_file: str, output: str, optimize: bool, format_code: bool, generate_tests: bool):
+@click.option('--streaming', is_flag=True, help='Gerar pipeline em modo streaming (chunks)')
+@click.option('--chunk-size', type=int, help='Linhas por chunk no modo streaming (padrão: commit size das saídas)')
+@click.option('--engine', type=click.Choice(['pandas', 'polars', 'duckdb']), default='pandas', show_default=True,
+              help='Engine do pipeline gerado (polars: planos lazy multi-thread; duckdb: um plano SQL por saída)')
+@click.option('--in-database/--no-in-database', default=True, show_default=True,
+              help='Executar no banco (INSERT ... SELECT) fluxos com origem e destino na mesma conexão')
+@click.option('--pushdown/--no-pushdown', default=True, show_default=True,
+              help='Levar filtros, ordenações, limites e colunas não usadas de um TableInput para a consulta SQL')
+@click.pass_obj
+def convert(obj, ktr_file: str, output: str, optimize: bool, format_code: bool, generate_tests: bool,
+            streaming: bool, chunk_size: int, engine: str, in_database: bool, pushdown: bool):
     """
     🔄 Converte um arquivo KTR para pipeline Python
     
     \b
     Exemplo:
         ktr-migrator convert exemplo.ktr --output ./pipeline_python/
+        ktr-migrator convert exemplo.ktr --output ./pipeline_python/ --streaming
+        ktr-migrator convert exemplo.ktr --output ./pipeline_python/ --engine polars
     """
     logger.info(f"🚀 Iniciando conversão: {ktr_file}")
+    cache = obj["cache"]
     
     try:
         # Parse do KTR
-        parser = KTRParser()
-        ktr_model = parser.parse_file(ktr_file)
+        content_hash = cache.hash_file(ktr_file)
+        ktr_model = cache.parse_file(ktr_file, content_hash=content_hash)
         
         # Análise (se otimização habilitada)
         if optimize:
-            analyzer = PipelineAnalyzer()
-            analysis = analyzer.analyze_pipeline(ktr_model)
+            analysis = cache.analyze(ktr_model, content_hash)
             logger.info(f"📊 Análise completa: {analysis.complexity_score} pontos")
         
         # Geração do código
-        generator = CodeGenerator()
+        generator = CodeGenerator(streaming=streaming, chunk_size=chunk_size, engine=engine,
+                                  in_database=in_database, pushdown=pushdown)
         project = generator.generate_pipeline(ktr_model, output)
         
         # Pós-processamento
@@ -96,7 +114,8 @@ def convert(ktr_file: str, output: str, optimize: bool, format_code: bool, gener
 @click.argument('ktr_file', type=click.Path(exists=True))
 @click.option('--report', '-r', help='Arquivo de relatório (HTML/JSON)')
 @click.option('--format', 'report_format', type=click.Choice(['json', 'html', 'text']), default='text')
-def analyze(ktr_file: str, report: str, report_format: str):
+@click.pass_obj
+def analyze(obj, ktr_file: str, report: str, report_format: str):
     """
     🔍 Analisa um arquivo KTR sem gerar código
     
@@ -105,15 +124,15 @@ def analyze(ktr_file: str, report: str, report_format: str):
         ktr-migrator analyze exemplo.ktr --report relatorio.html --format html
     """
     logger.info(f"🔍 Analisando arquivo: {ktr_file}")
+    cache = obj["cache"]
     
     try:
         # Parse do KTR
-        parser = KTRParser()
-        ktr_model = parser.parse_file(ktr_file)
+        content_hash = cache.hash_file(ktr_file)
+        ktr_model = cache.parse_file(ktr_file, content_hash=content_hash)
         
         # Análise detalhada
-        analyzer = PipelineAnalyzer()
-        analysis = analyzer.analyze_pipeline(ktr_model)
+        analysis = cache.analyze(ktr_model, content_hash)
         
         # Gerar relatório
         if report:
@@ -132,18 +151,30 @@ def analyze(ktr_file: str, report: str, report_format: str):
 @click.option('--output', '-o', required=True, help='Diretório base de saída')
 @click.option('--pattern', default='*.ktr', help='Padrão de arquivos (ex: *.ktr)')
 @click.option('--optimize', is_flag=True, help='Aplicar otimizações')
-def batch_convert(input_dir: str, output: str, pattern: str, optimize: bool):
+@click.option('--jobs', '-j', default=1, show_default=True, help='Número de processos em paralelo')
+@click.option('--force', is_flag=True, help='Reconverter mesmo arquivos inalterados no manifesto')
+@click.option('--streaming', is_flag=True, help='Gerar pipelines em modo streaming (chunks)')
+@click.option('--chunk-size', type=int, help='Linhas por chunk no modo streaming (padrão: commit size das saídas)')
+@click.option('--engine', type=click.Choice(['pandas', 'polars', 'duckdb']), default='pandas', show_default=True,
+              help='Engine dos pipelines gerados')
+@click.option('--in-database/--no-in-database', default=True, show_default=True,
+              help='Executar no banco (INSERT ... SELECT) fluxos com origem e destino na mesma conexão')
+@click.option('--pushdown/--no-pushdown', default=True, show_default=True,
+              help='Levar filtros, ordenações, limites e colunas não usadas de um TableInput para a consulta SQL')
+@click.pass_obj
+def batch_convert(obj, input_dir: str, output: str, pattern: str, optimize: bool, jobs: int, force: bool,
+                  streaming: bool, chunk_size: int, engine: str, in_database: bool, pushdown: bool):
     """
     📦 Converte múltiplos arquivos KTR em lote
     
     \b
     Exemplo:
-        ktr-migrator batch-convert ./ktr_files/ --output ./python_pipelines/
+        ktr-migrator batch-convert ./ktr_files/ --output ./python_pipelines/ --jobs 8
     """
     logger.info(f"📦 Conversão em lote: {input_dir}")
     
     input_path = Path(input_dir)
-    ktr_files = list(input_path.glob(pattern))
+    ktr_files = sorted(input_path.glob(pattern))
     
     if not ktr_files:
         logger.warning(f"⚠️ Nenhum arquivo encontrado com padrão: {pattern}")
@@ -151,40 +182,35 @@ def batch_convert(input_dir: str, output: str, pattern: str, optimize: bool):
     
     logger.info(f"📁 {len(ktr_files)} arquivos encontrados")
     
-    success_count = 0
-    error_count = 0
-    
-    for ktr_file in ktr_files:
-        try:
-            logger.info(f"🔄 Processando: {ktr_file.name}")
-            
-            # Parse e geração
-            parser = KTRParser()
-            ktr_model = parser.parse_file(str(ktr_file))
-            
-            # Diretório específico para este pipeline
-            pipeline_output = Path(output) / ktr_model.name
-            
-            generator = CodeGenerator()
-            project = generator.generate_pipeline(ktr_model, str(pipeline_output))
-            
-            success_count += 1
-            logger.info(f"✅ {ktr_file.name} convertido")
-            
-        except Exception as e:
-            error_count += 1
-            logger.error(f"❌ Erro em {ktr_file.name}: {e}")
-            continue
+    converter = BatchConverter(
+        input_dir,
+        output,
+        jobs=jobs,
+        optimize=optimize,
+        use_cache=obj["cache"].enabled,
+        force=force,
+        streaming=streaming,
+        chunk_size=chunk_size,
+        engine=engine,
+        in_database=in_database,
+        pushdown=pushdown
+    )
+    summary = converter.run(ktr_files)
     
     # Relatório final
     logger.info(f"📊 Conversão em lote concluída:")
-    logger.info(f"   ✅ Sucessos: {success_count}")
-    logger.info(f"   ❌ Erros: {error_count}")
+    logger.info(f"   ✅ Sucessos: {summary.converted}")
+    logger.info(f"   ⏭️ Inalterados: {summary.skipped}")
+    logger.info(f"   ❌ Erros: {summary.errors}")
+    logger.info(f"   ⏱️ Tempo total: {summary.wall_time:.2f}s (soma dos workers: {summary.worker_time:.2f}s)")
+    logger.info(f"   🚀 Throughput: {summary.files_per_second:.2f} arquivos/s")
     logger.info(f"   📁 Saída: {output}")
+    logger.info(f"   📋 Manifesto: {converter.manifest.path}")
 
 @cli.command()
 @click.argument('ktr_file', type=click.Path(exists=True))
-def validate(ktr_file: str):
+@click.pass_obj
+def validate(obj, ktr_file: str):
     """
     ✅ Valida a estrutura de um arquivo KTR
     
@@ -195,8 +221,7 @@ def validate(ktr_file: str):
     logger.info(f"✅ Validando arquivo: {ktr_file}")
     
     try:
-        parser = KTRParser()
-        ktr_model = parser.parse_file(ktr_file)
+        ktr_model = obj["cache"].parse_file(ktr_file)
         
         # Validações básicas
         issues = []
@@ -247,7 +272,8 @@ def validate(ktr_file: str):
 
 @cli.command()
 @click.argument('ktr_file', type=click.Path(exists=True))
-def preview(ktr_file: str):
+@click.pass_obj
+def preview(obj, ktr_file: str):
     """
     👀 Preview do código que seria gerado (sem criar arquivos)
     
@@ -259,8 +285,7 @@ def preview(ktr_file: str):
     
     try:
         # Parse do KTR
-        parser = KTRParser()
-        ktr_model = parser.parse_file(ktr_file)
+        ktr_model = obj["cache"].parse_file(ktr_file)
         
         # Gerar apenas template principal
         generator = CodeGenerator()
@@ -338,6 +363,11 @@ def _print_analysis_summary(analysis):
     click.echo(f"🎯 Complexidade: {analysis.complexity_score}/100")
     click.echo(f"⚡ Performance estimada: {analysis.estimated_performance_gain}%")
     click.echo(f"🔧 Otimizações sugeridas: {len(analysis.optimizations)}")
+    in_database = analysis.metrics.get("in_database", {})
+    if in_database.get("flows"):
+        click.echo(f"🏭 Fluxos executados no banco (ELT): {len(in_database['flows'])}")
+    if analysis.metrics.get("pushdown"):
+        click.echo(f"🔽 Steps levados para o SQL (pushdown): {len(analysis.metrics['pushdown'])}")
 
 if __name__ == '__main__':
     cli() 
\ No newline at end of file
@@ -22,6 +22,7 @@ from scheduler import FlowScheduler
 from src.parser.ktr_parser import KTRParser
 from src.generator.code_generator import CodeGenerator
 from src.analyzer.pipeline_analyzer import PipelineAnalyzer
+from src.cache.ktr_cache import KTRCache
 
 # --- Configuração da Página ---
 st.set_page_config(
@@ -63,18 +64,29 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# --- Serviços compartilhados ---
+@st.cache_resource
+def get_platform_services():
+    """Cria uma única vez por processo o gerenciador, o executor e o scheduler.
+
+    Todas as abas/sessões do Streamlit usam as mesmas instâncias, de modo que
+    existe um só estado de fluxos, um só controle de processos em execução e
+    um só loop de agendamento (nenhum job dispara mais de uma vez).
+    """
+    flow_manager = FlowManager()
+    executor = FlowExecutor(flow_manager)
+    scheduler = FlowScheduler(flow_manager, executor)
+    scheduler.start()  # Iniciar o scheduler automaticamente
+    logger.info("🏭 Serviços da plataforma inicializados")
+    return flow_manager, executor, scheduler
+
 # --- Gerenciamento de Estado ---
-if 'flow_manager' not in st.session_state:
-    st.session_state.flow_manager = FlowManager()
-if 'executor' not in st.session_state:
-    st.session_state.executor = FlowExecutor(st.session_state.flow_manager)
-if 'scheduler' not in st.session_state:
-    st.session_state.scheduler = FlowScheduler(st.session_state.flow_manager, st.session_state.executor)
-    st.session_state.scheduler.start()  # Iniciar o scheduler automaticamente
 if 'view' not in st.session_state:
     st.session_state.view = 'dashboard'
 if 'ktr_model' not in st.session_state:
     st.session_state.ktr_model = None
+if 'ktr_hash' not in st.session_state:
+    st.session_state.ktr_hash = None
 if 'selected_flow_id' not in st.session_state:
     st.session_state.selected_flow_id = None
 if 'selected_flows' not in st.session_state:
@@ -82,10 +94,11 @@ if 'selected_flows' not in st.session_state:
 if 'auto_refresh' not in st.session_state:
     st.session_state.auto_refresh = False
 
-# Acessar os gerenciadores
-flow_manager = st.session_state.flow_manager
-executor = st.session_state.executor
-scheduler = st.session_state.scheduler
+# Acessar os gerenciadores (compartilhados entre sessões)
+flow_manager, executor, scheduler = get_platform_services()
+
+# Cache persistente de parse/análise (evita reprocessar o KTR a cada rerun)
+ktr_cache = KTRCache()
 
 def change_view(view_name, flow_id=None):
     """Muda a visualização atual."""
@@ -93,6 +106,7 @@ def change_view(view_name, flow_id=None):
     st.session_state.selected_flow_id = flow_id
     if view_name == 'dashboard':
         st.session_state.ktr_model = None
+        st.session_state.ktr_hash = None
 
 # --- Sidebar de Navegação ---
 with st.sidebar:
@@ -138,6 +152,7 @@ def show_global_header():
     
     total_flows = len(all_flows)
     running_flows = len([f for f in all_flows if executor.is_flow_running(f.id)])
+    queue_stats = executor.get_queue_stats()
     successful_flows = len([f for f in all_flows if f.execution_status == "Sucesso"])
     failed_flows = len([f for f in all_flows if f.execution_status in ["Falha", "Erro"]])
     total_schedules = len(all_schedules)
@@ -164,7 +179,8 @@ def show_global_header():
     with col1:
         st.metric("📁 Total de Fluxos", total_flows)
     with col2:
-        st.metric("⚡ Em Execução", running_flows, delta=f"+{running_flows}" if running_flows > 0 else None)
+        st.metric("⚡ Em Execução", f"{running_flows}/{queue_stats['slots']}",
+                  delta=f"{queue_stats['queued']} na fila" if queue_stats['queued'] else None, delta_color="off")
     with col3:
         st.metric("✅ Sucessos", successful_flows)
     with col4:
@@ -204,7 +220,7 @@ def show_dashboard():
     
     with col2:
         status_filter = st.selectbox("📋 Filtrar por status", 
-                                   ["Todos", "Pronto", "Executando", "Sucesso", "Falha", "Importando"])
+                                   ["Todos", "Pronto", "Na fila", "Executando", "Sucesso", "Falha", "Importando"])
     
     with col3:
         view_mode = st.radio("👁️ Visualização", ["Cards", "Tabela"], horizontal=True)
@@ -219,7 +235,8 @@ def show_dashboard():
         col1, col2 = st.columns([3, 1])
         
         with col1:
-            available_flows = [f for f in all_flows if f.status == "Pronto" and not executor.is_flow_running(f.id)]
+            available_flows = [f for f in all_flows if f.status == "Pronto"
+                               and not executor.is_flow_running(f.id) and not executor.is_flow_queued(f.id)]
             if available_flows:
                 selected_for_batch = st.multiselect(
                     "Selecionar fluxos para execução em lote:",
@@ -229,10 +246,11 @@ def show_dashboard():
         
         with col2:
             if st.button("▶️ Executar Selecionados", type="primary", disabled=not selected_for_batch if 'selected_for_batch' in locals() else True):
-                for flow_id in selected_for_batch:
-                    executor.execute_flow(flow_id)
-                st.success(f"🚀 {len(selected_for_batch)} fluxos iniciados!")
+                queued = sum(executor.execute_flow(flow_id) for flow_id in selected_for_batch)
+                st.success(f"🚀 {queued} fluxos enviados para a fila de execução!")
                 st.rerun()
+        
+        show_execution_queue()
     
     st.markdown("---")
     
@@ -245,6 +263,8 @@ def show_dashboard():
     if status_filter != "Todos":
         if status_filter == "Executando":
             filtered_flows = [f for f in filtered_flows if executor.is_flow_running(f.id)]
+        elif status_filter == "Na fila":
+            filtered_flows = [f for f in filtered_flows if executor.is_flow_queued(f.id)]
         else:
             filtered_flows = [f for f in filtered_flows if f.execution_status == status_filter]
     
@@ -264,6 +284,42 @@ def show_dashboard():
         pass  # Mantém a estrutura do if
 
 
+def show_execution_queue():
+    """Painel da fila de execução: slots, profundidade, espera e estado de cada job."""
+    jobs = executor.job_queue.snapshot()
+    if not jobs:
+        return
+    
+    stats = executor.get_queue_stats()
+    st.markdown("#### 📥 Fila de Execução")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Slots em uso", f"{stats['running']}/{stats['slots']}")
+    with col2:
+        st.metric("Na fila", stats['queued'])
+    with col3:
+        st.metric("Espera média", f"{stats['avg_wait']:.1f}s")
+    with col4:
+        st.metric("Maior espera atual", f"{stats['oldest_wait']:.1f}s")
+    
+    state_icons = {"Na fila": "⏳", "Executando": "🔄", "Finalizado": "✅", "Cancelado": "⏹️"}
+    rows = []
+    for job in jobs:
+        flow = flow_manager.get_flow(job.flow_id)
+        job_data = job.to_dict()
+        state = job_data['state']
+        if state == "Finalizado" and flow:
+            state = f"{state} ({flow.execution_status})"
+        rows.append({
+            'Fluxo': flow.name if flow else job.flow_id,
+            'Estado': f"{state_icons.get(job_data['state'], '')} {state}",
+            'Prioridade': job_data['priority'],
+            'Espera (s)': job_data['wait_seconds'],
+            'Enviado em': job_data['submitted_at'].split('T')[1][:8],
+        })
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+
 def show_flows_as_cards(flows):
     """Exibe fluxos como cards visuais."""
     st.markdown("### 📋 Meus Fluxos")
@@ -277,8 +333,9 @@ def show_flows_as_cards(flows):
             with cols[j]:
                 # Determinar classe CSS baseada no status
                 is_running = executor.is_flow_running(flow.id)
+                is_queued = executor.is_flow_queued(flow.id)
                 
-                if is_running:
+                if is_running or is_queued:
                     card_class = "running-card"
                     status_emoji = "⏳"
                 elif flow.execution_status == "Sucesso":
@@ -304,8 +361,8 @@ def show_flows_as_cards(flows):
                 cols_actions = st.columns(5)
                 
                 with cols_actions[0]:
-                    if is_running:
-                        if st.button("⏹️", key=f"stop_card_{flow.id}", help="Parar"):
+                    if is_running or is_queued:
+                        if st.button("⏹️", key=f"stop_card_{flow.id}", help="Retirar da fila" if is_queued else "Parar"):
                             executor.stop_flow(flow.id)
                             st.rerun()
                     else:
@@ -349,7 +406,7 @@ def show_flows_as_table(flows):
             'Status Execução': flow.execution_status,
             'Última Execução': flow.last_run_at.split('T')[0] if flow.last_run_at else '-',
             'Duração (s)': f"{flow.execution_duration:.1f}" if flow.execution_duration else '-',
-            'Em Execução': '▶️' if is_running else '-',
+            'Em Execução': '▶️' if is_running else ('⏳' if executor.is_flow_queued(flow.id) else '-'),
             'ID': flow.id
         })
     
@@ -369,31 +426,35 @@ def show_flows_as_table(flows):
         
         with cols[0]:
             if st.button("▶️ Executar Todos Prontos"):
-                ready_flows = [f for f in flows if f.status == "Pronto" and not executor.is_flow_running(f.id)]
+                ready_flows = [f for f in flows if f.status == "Pronto"
+                               and not executor.is_flow_running(f.id) and not executor.is_flow_queued(f.id)]
                 for flow in ready_flows:
                     executor.execute_flow(flow.id)
-                st.success(f"🚀 {len(ready_flows)} fluxos iniciados!")
+                st.success(f"🚀 {len(ready_flows)} fluxos enviados para a fila de execução!")
                 st.rerun()
         
         with cols[1]:
             if st.button("⏹️ Parar Todos"):
-                running_flows = [f for f in flows if executor.is_flow_running(f.id)]
+                running_flows = [f for f in flows if executor.is_flow_running(f.id) or executor.is_flow_queued(f.id)]
                 for flow in running_flows:
                     executor.stop_flow(flow.id)
                 st.success(f"⏹️ {len(running_flows)} fluxos parados!")
                 st.rerun()
 
 
-def show_detailed_ktr_analysis(ktr_model):
+def show_detailed_ktr_analysis(ktr_model, content_hash=None):
     """Mostra análise detalhada do fluxo KTR estilo n8n."""
     st.markdown("---")
     st.subheader("🔍 Análise Detalhada do Fluxo KTR - Visão n8n")
     
     with st.spinner("🔍 Executando análise avançada..."):
         try:
-            # Usar o PipelineAnalyzer para análise completa
-            analyzer = PipelineAnalyzer()
-            analysis_result = analyzer.analyze_pipeline(ktr_model)
+            # Usar o PipelineAnalyzer para análise completa (via cache quando o hash é conhecido)
+            if content_hash:
+                analysis_result = ktr_cache.analyze(ktr_model, content_hash)
+            else:
+                analyzer = PipelineAnalyzer()
+                analysis_result = analyzer.analyze_pipeline(ktr_model)
             
             # Header com informações gerais
             col1, col2, col3, col4, col5 = st.columns(5)
@@ -602,7 +663,7 @@ def show_step_configuration(step):
     # Configurações específicas por tipo
     if step.type.value == "TableInput":
         show_table_input_config(step)
-    elif step.type.value == "TableOutput":
+    elif step.type.value in ("TableOutput", "InsertUpdate", "Update"):
         show_table_output_config(step)
     elif step.type.value == "ExcelInput":
         show_excel_input_config(step)
@@ -635,6 +696,9 @@ def show_table_output_config(step):
     with col2:
         st.markdown(f"**🗑️ Truncar:** {'Sim' if getattr(step, 'truncate', False) else 'Não'}")
         st.markdown(f"**📦 Commit Size:** {getattr(step, 'commit_size', 1000)}")
+        if getattr(step, 'load_mode', 'insert') != 'insert':
+            st.markdown(f"**🔀 Modo:** {step.load_mode}")
+            st.markdown(f"**🔑 Chaves:** {', '.join(step.key_fields.values()) or 'Não definidas'}")
 
 
 def show_excel_input_config(step):
@@ -701,9 +765,9 @@ def show_step_connections(step, ktr_model):
     st.markdown("#### 🔗 Conectividade do Node")
     
     # Entrada (steps que conectam a este)
-    incoming = [hop for hop in ktr_model.hops if hop.to_step == step.name]
+    incoming = ktr_model.get_incoming_hops(step.name)
     # Saída (steps para onde este conecta)
-    outgoing = [hop for hop in ktr_model.hops if hop.from_step == step.name]
+    outgoing = ktr_model.get_outgoing_hops(step.name)
     
     col1, col2 = st.columns(2)
     
@@ -1028,27 +1092,7 @@ def get_estimated_time(step):
 
 def calculate_step_depth(step, ktr_model):
     """Calcula profundidade do step no pipeline"""
-    def get_depth(step_name, visited=None):
-        if visited is None:
-            visited = set()
-        
-        if step_name in visited:
-            return 0  # Evitar loops
-        
-        visited.add(step_name)
-        
-        incoming = [hop for hop in ktr_model.hops if hop.to_step == step_name]
-        if not incoming:
-            return 0
-        
-        max_depth = 0
-        for hop in incoming:
-            depth = get_depth(hop.from_step, visited.copy())
-            max_depth = max(max_depth, depth + 1)
-        
-        return max_depth
-    
-    return get_depth(step.name)
+    return PipelineAnalyzer().calculate_step_depths(ktr_model).get(step.name, 0)
 
 
 def get_step_speed_rating(step):
@@ -1186,17 +1230,8 @@ def create_flow_diagram(ktr_model):
         )
         return fig
     
-    # Criar grafo
-    G = nx.DiGraph()
-    
-    # Adicionar nós
-    for step in ktr_model.steps:
-        G.add_node(step.name, type=step.type.value)
-    
-    # Adicionar arestas
-    for hop in ktr_model.hops:
-        if hop.enabled:
-            G.add_edge(hop.from_step, hop.to_step)
+    # Grafo compartilhado (somente leitura) do modelo
+    G = ktr_model.get_graph()
     
     # Layout hierárquico
     try:
@@ -1234,8 +1269,10 @@ def create_flow_diagram(ktr_model):
         node_text.append(node)
         
         # Cor baseada no tipo
-        step = next(s for s in ktr_model.steps if s.name == node)
-        if step.is_input:
+        step = ktr_model.get_step(node)
+        if step is None:
+            node_color.append('#cccccc')
+        elif step.is_input:
             node_color.append('#667eea')
         elif step.is_output:
             node_color.append('#4facfe')
@@ -1280,35 +1317,8 @@ def create_flow_diagram(ktr_model):
 
 
 def find_critical_paths(ktr_model):
-    """Encontra caminhos críticos no pipeline"""
-    try:
-        import networkx as nx
-    except ImportError:
-        return []
-    
-    G = nx.DiGraph()
-    
-    for step in ktr_model.steps:
-        G.add_node(step.name)
-    
-    for hop in ktr_model.hops:
-        if hop.enabled:
-            G.add_edge(hop.from_step, hop.to_step)
-    
-    # Encontrar todos os caminhos simples
-    start_nodes = [n for n in G.nodes() if G.in_degree(n) == 0]
-    end_nodes = [n for n in G.nodes() if G.out_degree(n) == 0]
-    
-    paths = []
-    for start in start_nodes:
-        for end in end_nodes:
-            try:
-                for path in nx.all_simple_paths(G, start, end):
-                    paths.append(path)
-            except:
-                pass
-    
-    return paths
+    """Encontra caminhos críticos (mais longos) no pipeline"""
+    return PipelineAnalyzer().find_critical_paths(ktr_model)
 
 
 def find_bottlenecks(ktr_model):
@@ -1317,7 +1327,7 @@ def find_bottlenecks(ktr_model):
     
     for step in ktr_model.steps:
         # Steps com múltiplas entradas podem ser gargalos
-        incoming = [hop for hop in ktr_model.hops if hop.to_step == step.name]
+        incoming = ktr_model.get_incoming_hops(step.name)
         if len(incoming) > 1:
             bottlenecks.append({
                 "step": step.name,
@@ -1656,6 +1666,7 @@ def show_import_flow():
 
     if uploaded_file is None:
         st.session_state.ktr_model = None
+        st.session_state.ktr_hash = None
         
         # Dicas de uso
         with st.expander("💡 Dicas de Uso"):
@@ -1671,16 +1682,13 @@ def show_import_flow():
 
     # Análise automática
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.ktr') as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            tmp_path = tmp_file.name
+        ktr_bytes = uploaded_file.getvalue()
         
         with st.spinner("🔍 Analisando arquivo KTR..."):
-            parser = KTRParser()
-            ktr_model = parser.parse_file(tmp_path)
+            ktr_model = ktr_cache.parse_bytes(ktr_bytes, KTRParser())
             st.session_state.ktr_model = ktr_model
+            st.session_state.ktr_hash = KTRCache.hash_bytes(ktr_bytes)
             
-        os.unlink(tmp_path)
         st.success(f"✅ Arquivo '{uploaded_file.name}' analisado com sucesso!")
 
         # Preview da análise
@@ -1695,11 +1703,12 @@ def show_import_flow():
 
         # Botão para análise detalhada do fluxo
         if st.button("🔍 Analisar Fluxo Detalhadamente", type="secondary", use_container_width=True):
-            show_detailed_ktr_analysis(ktr_model)
+            show_detailed_ktr_analysis(ktr_model, st.session_state.ktr_hash)
 
     except Exception as e:
         st.error(f"❌ Erro na análise do KTR: {e}")
         st.session_state.ktr_model = None
+        st.session_state.ktr_hash = None
         return
 
     if st.session_state.ktr_model:
@@ -1829,6 +1838,9 @@ def show_monitor():
     
     # Status em tempo real
     is_running = executor.is_flow_running(flow_id)
+    # Só as últimas linhas são lidas a cada rerun; o total vem de um COUNT no banco de logs
+    execution_logs = flow_manager.get_execution_logs(flow_id, limit=50)
+    logs_total = flow_manager.count_execution_logs(flow_id)
     
     # Container principal de monitoramento
     st.markdown(f"""
@@ -1887,7 +1899,7 @@ def show_monitor():
     
     with progress_container:
         # Análise de progresso baseada nos logs
-        progress_steps = analyze_execution_progress(flow)
+        progress_steps = analyze_execution_progress(execution_logs)
         total_steps = len(progress_steps) if progress_steps else 3  # Mínimo de 3 etapas padrão
         completed_steps = len([s for s in progress_steps if s['status'] == 'completed'])
         current_step = None
@@ -2018,7 +2030,7 @@ def show_monitor():
     st.markdown("---")
     
     # Logs em tempo real com scroll automático
-    if flow.execution_logs:
+    if execution_logs:
         st.subheader("📊 Logs de Execução em Tempo Real")
         
         # Container de logs com altura fixa e auto-scroll
@@ -2027,11 +2039,11 @@ def show_monitor():
         with logs_container:
             # Durante execução, mostrar apenas os últimos 20 logs para performance
             if is_running:
-                recent_logs = flow.execution_logs[-20:]
+                recent_logs = execution_logs[-20:]
                 st.info("🔄 Exibindo logs em tempo real (últimas 20 entradas)")
             else:
-                recent_logs = flow.execution_logs[-50:]
-                st.info(f"📋 Total de {len(flow.execution_logs)} entradas de log")
+                recent_logs = execution_logs
+                st.info(f"📋 Total de {logs_total} entradas de log (exibindo as últimas {len(recent_logs)})")
             
             # Exibir logs com cores baseadas no conteúdo
             for log_entry in recent_logs:
@@ -2114,8 +2126,7 @@ def show_monitor():
             st.metric("Finalizado", "-" if not is_running else "🔄 Executando...")
     
     with col5:
-        logs_count = len(flow.execution_logs)
-        st.metric("Logs", f"{logs_count} entradas")
+        st.metric("Logs", f"{logs_total} entradas")
     
     # Controles de execução
     st.markdown("---")
@@ -2138,8 +2149,10 @@ def show_monitor():
     
     with col3:
         if st.button("📥 Exportar Logs", use_container_width=True):
-            if flow.execution_logs:
-                logs_text = "\n".join(flow.execution_logs)
+            # A exportação é o único ponto que lê o log completo, e só quando pedida
+            all_logs = flow_manager.get_execution_logs(flow_id)
+            if all_logs:
+                logs_text = "\n".join(all_logs)
                 st.download_button(
                     "💾 Download",
                     logs_text,
@@ -2161,13 +2174,13 @@ def show_monitor():
     if auto_refresh:
         st.caption(f"🔄 Auto-refresh ativo - Última atualização: {datetime.now().strftime('%H:%M:%S')}")
     
-    if flow.execution_logs:
+    if execution_logs:
         # Container para logs com altura fixa e scroll
         logs_container = st.container()
         
         with logs_container:
-            # Mostrar apenas os últimos 50 logs para performance
-            recent_logs = flow.execution_logs[-50:]
+            # Já limitado às últimas 50 entradas na leitura
+            recent_logs = execution_logs
             
             for log_entry in recent_logs:
                 # Colorir logs baseado no conteúdo
@@ -2184,7 +2197,7 @@ def show_monitor():
     else:
         st.info("📝 Nenhum log disponível. Execute o fluxo para gerar logs.")
 
-def analyze_execution_progress(flow):
+def analyze_execution_progress(execution_logs):
     """Analisa os logs para determinar o progresso das etapas."""
     steps = [
         {"name": "Inicialização", "description": "Preparando ambiente de execução", "status": "pending", "timestamp": None},
@@ -2195,12 +2208,12 @@ def analyze_execution_progress(flow):
         {"name": "Finalização", "description": "Limpeza e relatórios", "status": "pending", "timestamp": None}
     ]
     
-    if not flow.execution_logs:
+    if not execution_logs:
         return steps
     
     current_step = 0
     
-    for log in flow.execution_logs:
+    for log in execution_logs:
         # Mapear logs para etapas
         if "Iniciando execução" in log or "Iniciando pipeline" in log:
             if current_step < len(steps):
@@ -2311,21 +2324,28 @@ def show_rename():
     st.info(f"📝 Renomeando: **{flow.name}**")
     
     new_name = st.text_input("Novo nome do fluxo", value=flow.name, placeholder="Digite o novo nome...")
+    new_priority = st.number_input("Prioridade na fila de execução", value=flow.priority, step=1,
+                                   help="Fluxos com prioridade maior saem primeiro da fila; empates seguem a ordem de chegada.")
     
     col1, col2 = st.columns(2)
     
     with col1:
         if st.button("💾 Salvar Alterações", type="primary", use_container_width=True):
-            if new_name and new_name != flow.name:
-                flow_manager.rename_flow(flow_id, new_name)
-                st.success(f"✅ Fluxo renomeado para '{new_name}'!")
+            priority_changed = new_priority != flow.priority
+            if not new_name:
+                st.warning("⚠️ Por favor, forneça um nome.")
+            elif new_name != flow.name or priority_changed:
+                if new_name != flow.name:
+                    flow_manager.rename_flow(flow_id, new_name)
+                    st.success(f"✅ Fluxo renomeado para '{new_name}'!")
+                if priority_changed:
+                    flow_manager.set_flow_priority(flow_id, int(new_priority))
+                    st.success(f"✅ Prioridade de execução definida como {int(new_priority)}!")
                 time.sleep(1)
                 change_view('dashboard')
                 st.rerun()
-            elif not new_name:
-                st.warning("⚠️ Por favor, forneça um nome.")
             else:
-                st.info("ℹ️ O nome não foi alterado.")
+                st.info("ℹ️ Nenhuma alteração realizada.")
     
     with col2:
         if st.button("❌ Cancelar", use_container_width=True):
@@ -1,80 +1,108 @@
-import subprocess
 import threading
-import time
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Callable, List
+from typing import Optional, Callable, Dict, List
 import sys
 import os
 import re
 
 from flow_manager import FlowManager
+from job_queue import JobQueue, FlowJob, QUEUED
+from settings import MAX_CONCURRENT_FLOWS, STOP_ON_ERROR_LINE
+from supervisor import ProcessSupervisor, ManagedProcess
 
-def _stream_reader(stream, on_log: Callable[[str], None], stderr_lines: List[str], flow_id: str, flow_manager: FlowManager):
-    """Lê um stream linha por linha, analisa erros em tempo real e chama o callback."""
-    error_stage_patterns = {
-        'extração': [
-            r'❌ Erro na extração',
-            r'FileNotFoundError',
-            r'read_excel.*error',
-            r'extraction.*failed',
-            r'extract_data.*error'
-        ],
-        'transformação': [
-            r'❌ Erro na transformação',
-            r'transform_data.*error',
-            r'KeyError.*column',
-            r'transformation.*failed'
-        ],
-        'carregamento': [
-            r'❌ Erro na carga',
-            r'load_data.*error',
-            r'database.*error',
-            r'to_sql.*error',
-            r'connection.*failed'
-        ]
-    }
-    
-    for line in iter(stream.readline, ''):
-        if line:
-            clean_line = line.strip()
-            on_log(clean_line)
-            
-            # Capturar stderr separadamente
-            if stderr_lines is not None:
-                stderr_lines.append(clean_line)
-            
-            # Analisar se é um erro e identificar a etapa
-            if any(keyword in clean_line.lower() for keyword in ['error', 'exception', 'traceback', 'failed']):
-                stage = 'desconhecido'
-                for stage_name, patterns in error_stage_patterns.items():
-                    if any(re.search(pattern, clean_line, re.IGNORECASE) for pattern in patterns):
-                        stage = stage_name
-                        break
-                
-                # Salvar erro imediatamente com identificação da etapa
-                error_msg = f"[{stage.upper()}] {clean_line}"
-                flow_manager.update_execution_error(flow_id, error_msg)
-                
-    stream.close()
+ERROR_STAGE_PATTERNS = {
+    'extração': [
+        r'❌ Erro na extração',
+        r'FileNotFoundError',
+        r'read_excel.*error',
+        r'extraction.*failed',
+        r'extract_data.*error'
+    ],
+    'transformação': [
+        r'❌ Erro na transformação',
+        r'transform_data.*error',
+        r'KeyError.*column',
+        r'transformation.*failed'
+    ],
+    'carregamento': [
+        r'❌ Erro na carga',
+        r'load_data.*error',
+        r'database.*error',
+        r'to_sql.*error',
+        r'connection.*failed'
+    ]
+}
+
+ERROR_KEYWORDS = ['error', 'exception', 'traceback', 'failed']
+
+# Tempo dado ao pipeline após o primeiro erro, para o traceback completo chegar aos logs
+ERROR_GRACE_SECONDS = 0.5
+
+def _classify_error(line: str) -> Optional[str]:
+    """Se a linha indica erro, retorna a mensagem com a etapa identificada."""
+    if not any(keyword in line.lower() for keyword in ERROR_KEYWORDS):
+        return None
+    stage = 'desconhecido'
+    for stage_name, patterns in ERROR_STAGE_PATTERNS.items():
+        if any(re.search(pattern, line, re.IGNORECASE) for pattern in patterns):
+            stage = stage_name
+            break
+    return f"[{stage.upper()}] {line}"
+
+@dataclass
+class _FlowRun:
+    """Estado de uma execução acompanhada pelo supervisor."""
+    job: FlowJob
+    start_time: datetime
+    process: Optional[ManagedProcess] = None
+    stderr_lines: List[str] = field(default_factory=list)
+    first_error: Optional[str] = None  # primeira linha classificada como erro
+    error_detected: bool = False
+    stopped: bool = False
+
+    @property
+    def flow_id(self) -> str:
+        return self.job.flow_id
 
 class FlowExecutor:
-    """Executa fluxos Python de forma assíncrona e monitora sua execução."""
+    """Executa fluxos Python de forma assíncrona e monitora sua execução.
+
+    Os processos são acompanhados por um único ProcessSupervisor: a saída de
+    todos os fluxos é lida pelo mesmo event loop e o fim de cada processo é
+    tratado por callback, sem threads por execução nem polling.
+
+    _runs e o estado de cada _FlowRun são alterados pelo despachante da fila,
+    pela thread do supervisor e pelas sessões do Streamlit: toda alteração
+    acontece sob self._lock (nunca mantido durante I/O ou callbacks).
+
+    O sucesso ou a falha vem do código de saída. Linhas de log com cara de erro
+    só identificam a etapa da falha; com stop_on_error_line=True (ou
+    KTR_STOP_ON_ERROR_LINE=1) a primeira delas também interrompe o processo.
+    """
     
-    def __init__(self, flow_manager: FlowManager):
+    def __init__(self, flow_manager: FlowManager, max_concurrent: int = MAX_CONCURRENT_FLOWS,
+                 stop_on_error_line: bool = STOP_ON_ERROR_LINE):
         self.flow_manager = flow_manager
-        self._running_processes = {}  # flow_id -> processo
+        self.stop_on_error_line = stop_on_error_line
+        self._runs: Dict[str, _FlowRun] = {}  # flow_id -> execução em andamento
+        self._lock = threading.Lock()  # o executor é compartilhado entre as sessões do Streamlit
+        self.supervisor = ProcessSupervisor()
+        self.job_queue = JobQueue(self._start_job, slots=max_concurrent)
         
-    def execute_flow(self, flow_id: str, on_log: Optional[Callable[[str], None]] = None) -> bool:
+    def execute_flow(self, flow_id: str, on_log: Optional[Callable[[str], None]] = None,
+                     priority: Optional[int] = None) -> bool:
         """
-        Executa um fluxo de forma assíncrona.
+        Enfileira a execução de um fluxo; ela começa assim que houver slot livre.
         
         Args:
             flow_id: ID do fluxo a ser executado
             on_log: Callback opcional para receber logs em tempo real
+            priority: Prioridade na fila (padrão: a prioridade do fluxo)
             
         Returns:
-            True se a execução foi iniciada com sucesso, False caso contrário
+            True se a execução foi enfileirada, False caso contrário
         """
         flow = self.flow_manager.get_flow(flow_id)
         if not flow:
@@ -83,38 +111,42 @@ class FlowExecutor:
         if flow.status != "Pronto":
             return False
             
-        if flow_id in self._running_processes:
-            return False  # Já está executando
+        if priority is None:
+            priority = flow.priority
             
-        # Limpar logs anteriores
-        self.flow_manager.clear_execution_logs(flow_id)
-        
-        # Iniciar execução em thread separada
-        thread = threading.Thread(
-            target=self._run_flow_in_thread,
-            args=(flow_id, on_log),
-            daemon=True
-        )
-        thread.start()
-        
+        with self._lock:
+            if flow_id in self._runs or self.job_queue.get_job(flow_id):
+                return False  # Já está na fila ou executando
+            
+            # Abrir a execução (run_id) antes de enfileirar: o despachante pode iniciá-la imediatamente
+            self.flow_manager.start_run(flow_id)
+            self.flow_manager.update_execution_status(flow_id, "Na fila")
+            self.job_queue.submit(flow_id, priority=priority, on_log=on_log)
+            
+        position = self.job_queue.position(flow_id)
+        if position:
+            self._log_and_callback(flow_id, f"⏳ Na fila de execução (posição {position}, prioridade {priority})", on_log)
         return True
     
-    def _run_flow_in_thread(self, flow_id: str, on_log: Optional[Callable[[str], None]] = None):
-        """Executa o fluxo em uma thread separada, capturando stdout e stderr com análise em tempo real."""
+    def _start_job(self, job: FlowJob):
+        """Chamado pela fila quando um slot fica livre: inicia o processo e o entrega ao supervisor."""
+        flow_id = job.flow_id
         flow = self.flow_manager.get_flow(flow_id)
         if not flow:
+            self.job_queue.release(job)
             return
             
-        start_time = datetime.now()
-        start_time_str = start_time.isoformat()
+        run = _FlowRun(job=job, start_time=datetime.now())
+        with self._lock:
+            self._runs[flow_id] = run
         
         try:
             self.flow_manager.update_execution_status(
                 flow_id, 
                 "Executando",
-                start_time=start_time_str
+                start_time=run.start_time.isoformat()
             )
-            self._log_and_callback(flow_id, "🚀 Iniciando execução do fluxo...", on_log)
+            self._log_and_callback(flow_id, "🚀 Iniciando execução do fluxo...", job.on_log)
             
             project_path = Path(flow.project_path)
             pipeline_file = self._find_pipeline_file(project_path)
@@ -122,117 +154,106 @@ class FlowExecutor:
             if not pipeline_file:
                 raise FileNotFoundError("Arquivo de pipeline não encontrado")
                 
-            self._log_and_callback(flow_id, f"📁 Executando: {pipeline_file.name}", on_log)
+            self._log_and_callback(flow_id, f"📁 Executando: {pipeline_file.name}", job.on_log)
             
             # Adicionar variáveis de ambiente para melhor rastreamento
             env = os.environ.copy()
             env['PYTHONUNBUFFERED'] = '1'  # Forçar output sem buffer
             env['PYTHONFAULTHANDLER'] = '1'  # Ativar handler de falhas
             
-            process = subprocess.Popen(
+            process = self.supervisor.spawn(
+                flow_id,
                 [sys.executable, str(pipeline_file)],
                 cwd=str(project_path),
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=0,  # Sem buffer para captura em tempo real
-                universal_newlines=True,
-                env=env
+                env=env,
+                on_line=lambda process, line, is_stderr: self._on_line(run, process, line, is_stderr),
+                on_exit=lambda process, returncode: self._on_exit(run, returncode)
             )
+            with self._lock:
+                run.process = process
             
-            self._running_processes[flow_id] = process
-            
-            stderr_output = []
-
-            # Threads para capturar stdout e stderr em tempo real com análise
-            stdout_thread = threading.Thread(
-                target=_stream_reader,
-                args=(
-                    process.stdout, 
-                    lambda line: self._log_and_callback(flow_id, line, on_log), 
-                    None,
-                    flow_id,
-                    self.flow_manager
-                ),
-                daemon=True
-            )
-            stderr_thread = threading.Thread(
-                target=_stream_reader,
-                args=(
-                    process.stderr, 
-                    lambda line: self._log_and_callback(flow_id, f"[ERRO] {line}", on_log), 
-                    stderr_output,
-                    flow_id,
-                    self.flow_manager
-                ),
-                daemon=True
-            )
+        except Exception as e:
+            end_time = datetime.now()
+            duration = (end_time - run.start_time).total_seconds()
             
-            stdout_thread.start()
-            stderr_thread.start()
+            error_message_str = f"💥 Erro inesperado na execução: {str(e)}"
             
-            # Monitorar processo em tempo real
-            while process.poll() is None:
-                time.sleep(0.5)  # Verificar a cada 500ms
-                
-                # Se já temos erro identificado, interromper
-                current_flow = self.flow_manager.get_flow(flow_id)
-                if current_flow and current_flow.error_message:
-                    self._log_and_callback(flow_id, "💥 Erro detectado, interrompendo execução...", on_log)
-                    process.terminate()
-                    break
-
-            # Esperar as threads de leitura finalizarem
-            stdout_thread.join(timeout=5)
-            stderr_thread.join(timeout=5)
+            self.flow_manager.update_execution_status(
+                flow_id,
+                "Erro",
+                end_time=end_time.isoformat(),
+                duration=duration
+            )
+            self._log_and_callback(flow_id, error_message_str, job.on_log)
+            self.flow_manager.update_execution_error(flow_id, f"[EXECUTOR] {str(e)}")
             
-            if flow_id in self._running_processes:
-                del self._running_processes[flow_id]
+            with self._lock:
+                self._runs.pop(flow_id, None)
+            self.job_queue.release(job)
+    
+    def _on_line(self, run: _FlowRun, process: ManagedProcess, line: str, is_stderr: bool):
+        """Recebe cada linha de stdout/stderr (thread do supervisor) e identifica a etapa de erros."""
+        error_msg = _classify_error(line)
+        with self._lock:
+            if is_stderr:
+                run.stderr_lines.append(line)
+            if error_msg and run.first_error is None:
+                run.first_error = error_msg
+            # Só a primeira linha de erro interrompe (quando habilitado)
+            stop = bool(error_msg) and self.stop_on_error_line and not run.error_detected and not run.stopped
+            if stop:
+                run.error_detected = True
+        
+        self._log_and_callback(run.flow_id, f"[ERRO] {line}" if is_stderr else line, run.job.on_log)
+        if stop:
+            self.flow_manager.update_execution_error(run.flow_id, error_msg)
+            self._log_and_callback(run.flow_id, "💥 Erro detectado, interrompendo execução...", run.job.on_log)
+            self.supervisor.terminate(process, delay=ERROR_GRACE_SECONDS)
+    
+    def _on_exit(self, run: _FlowRun, returncode: int):
+        """Finaliza a execução quando o processo termina (thread do supervisor)."""
+        flow_id = run.flow_id
+        with self._lock:
+            if self._runs.get(flow_id) is run:
+                self._runs.pop(flow_id)
+            stopped = run.stopped
+            first_error, stderr_lines = run.first_error, list(run.stderr_lines)
+        
+        try:
+            if stopped:
+                return  # stop_flow já registrou a interrupção
             
             end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
+            duration = (end_time - run.start_time).total_seconds()
             
-            if process.returncode == 0:
+            if returncode == 0:
                 self.flow_manager.update_execution_status(
                     flow_id,
                     "Sucesso",
                     end_time=end_time.isoformat(),
                     duration=duration
                 )
-                self._log_and_callback(flow_id, f"✅ Execução concluída com sucesso em {duration:.2f}s", on_log)
+                self._log_and_callback(flow_id, f"✅ Execução concluída com sucesso em {duration:.2f}s", run.job.on_log)
             else:
-                error_summary = f"❌ Execução falhou com código {process.returncode}"
+                error_summary = f"❌ Execução falhou com código {returncode}"
                 self.flow_manager.update_execution_status(
                     flow_id,
                     "Falha",
                     end_time=end_time.isoformat(),
                     duration=duration
                 )
-                self._log_and_callback(flow_id, error_summary, on_log)
+                self._log_and_callback(flow_id, error_summary, run.job.on_log)
                 
-                # Se não temos erro específico ainda, salvar o stderr completo
+                # Sem erro registrado ainda: a primeira linha de erro (com a etapa) ou o stderr completo
                 current_flow = self.flow_manager.get_flow(flow_id)
-                if not current_flow.error_message and stderr_output:
-                    full_error_message = "\n".join(stderr_output)
-                    self.flow_manager.update_execution_error(flow_id, f"[GERAL] {full_error_message}")
-
-        except (Exception, FileNotFoundError) as e:
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
-            
-            error_message_str = f"💥 Erro inesperado na execução: {str(e)}"
-            
-            self.flow_manager.update_execution_status(
-                flow_id,
-                "Erro",
-                end_time=end_time.isoformat(),
-                duration=duration
-            )
-            self._log_and_callback(flow_id, error_message_str, on_log)
-            self.flow_manager.update_execution_error(flow_id, f"[EXECUTOR] {str(e)}")
-            
-            if flow_id in self._running_processes:
-                del self._running_processes[flow_id]
+                if current_flow and not current_flow.error_message:
+                    if first_error:
+                        self.flow_manager.update_execution_error(flow_id, first_error)
+                    elif stderr_lines:
+                        full_error_message = "\n".join(stderr_lines)
+                        self.flow_manager.update_execution_error(flow_id, f"[GERAL] {full_error_message}")
+        finally:
+            self.job_queue.release(run.job)
     
     def _find_pipeline_file(self, project_path: Path) -> Optional[Path]:
         """Encontra o arquivo principal do pipeline."""
@@ -258,22 +279,33 @@ class FlowExecutor:
     
     def is_flow_running(self, flow_id: str) -> bool:
         """Verifica se um fluxo está executando."""
-        return flow_id in self._running_processes
+        with self._lock:
+            return flow_id in self._runs
+    
+    def is_flow_queued(self, flow_id: str) -> bool:
+        """Verifica se um fluxo aguarda na fila de execução."""
+        job = self.job_queue.get_job(flow_id)
+        return bool(job and job.state == QUEUED)
     
     def stop_flow(self, flow_id: str) -> bool:
-        """Para a execução de um fluxo."""
-        if flow_id not in self._running_processes:
-            return False
+        """Para a execução de um fluxo (ou o retira da fila)."""
+        if self.job_queue.cancel(flow_id):
+            self.flow_manager.update_execution_status(flow_id, "Cancelado", end_time=datetime.now().isoformat())
+            self.flow_manager.add_execution_log(flow_id, "⏹️ Execução removida da fila pelo usuário")
+            return True
+            
+        with self._lock:
+            run = self._runs.get(flow_id)
+            if run is None or run.process is None or run.stopped:
+                return False  # Não está executando (ou o processo ainda não foi criado)
+            run.stopped = True
             
         try:
-            process = self._running_processes[flow_id]
-            process.terminate()
-            process.wait(timeout=5)  # Espera 5s para terminar graciosamente
-        except subprocess.TimeoutExpired:
-            process.kill()  # Força a parada se necessário
+            self.supervisor.stop(run.process, timeout=5)  # Termina e, após 5s, força a parada
         finally:
-            if flow_id in self._running_processes:
-                del self._running_processes[flow_id]
+            with self._lock:
+                if self._runs.get(flow_id) is run:
+                    self._runs.pop(flow_id)
             
             self.flow_manager.update_execution_status(
                 flow_id,
@@ -286,4 +318,13 @@ class FlowExecutor:
     
     def get_running_flows(self) -> list:
         """Retorna lista de IDs dos fluxos em execução."""
-        return list(self._running_processes.keys()) 
\ No newline at end of file
+        with self._lock:
+            return list(self._runs.keys())
+    
+    def get_queued_flows(self) -> list:
+        """Retorna os IDs dos fluxos na fila, na ordem em que serão executados."""
+        return [job.flow_id for job in self.job_queue.snapshot() if job.state == QUEUED]
+    
+    def get_queue_stats(self) -> dict:
+        """Profundidade da fila, slots ocupados e tempos de espera (segundos)."""
+        return self.job_queue.stats()
@@ -1,10 +1,16 @@
+import atexit
 import json
+import os
+import threading
 import uuid
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Dict, List, Optional
 
-from settings import FLOWS_METADATA_FILE, FLOWS_DIR
+from loguru import logger
+
+from settings import FLOWS_METADATA_FILE, FLOWS_DIR, FLOWS_FLUSH_INTERVAL
+from run_store import RunStore
 
 
 @dataclass
@@ -20,7 +26,8 @@ class Flow:
     
     # Novos campos para execução
     execution_status: str = "Nunca executado"
-    execution_logs: List[str] = field(default_factory=list)
+    last_run_id: Optional[str] = None  # logs ficam no RunStore, indexados pela execução
+    priority: int = 0  # maior valor sai primeiro da fila de execução
     execution_start_time: Optional[str] = None
     execution_end_time: Optional[str] = None
     execution_duration: Optional[float] = None
@@ -40,7 +47,8 @@ class Flow:
             "project_path": self.project_path,
             "last_run_at": self.last_run_at,
             "execution_status": self.execution_status,
-            "execution_logs": self.execution_logs,
+            "last_run_id": self.last_run_id,
+            "priority": self.priority,
             "execution_start_time": self.execution_start_time,
             "execution_end_time": self.execution_end_time,
             "execution_duration": self.execution_duration,
@@ -53,12 +61,30 @@ class Flow:
 
 
 class FlowManager:
-    """Gerencia o ciclo de vida dos fluxos (CRUD) e a persistência."""
+    """Gerencia o ciclo de vida dos fluxos (CRUD) e a persistência.
+
+    O estado fica em memória, protegido por um único lock, e é compartilhado
+    pelas threads de leitura do executor, pelo agendador e pelas sessões do
+    Streamlit. As alterações apenas marcam o estado como sujo; uma thread de
+    fundo grava flows.json no máximo uma vez por intervalo, com escrita em
+    arquivo temporário seguida de rename atômico.
+    """
 
-    def __init__(self):
+    def __init__(self, run_store: Optional[RunStore] = None, flush_interval: float = FLOWS_FLUSH_INTERVAL):
         self._flows: Dict[str, Flow] = {}
+        self._lock = threading.RLock()          # protege _flows e os objetos Flow
+        self._write_lock = threading.Lock()     # uma gravação de flows.json por vez
+        self._dirty = False
+        self._closed = False
+        self._wake = threading.Event()
+        self.flush_interval = flush_interval
+        self.run_store = run_store or RunStore()
         self._load_flows()
 
+        self._flusher = threading.Thread(target=self._flusher_loop, name="flow-manager-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+
     def _load_flows(self):
         """Carrega os metadados dos fluxos do arquivo JSON."""
         if not FLOWS_METADATA_FILE.exists():
@@ -68,50 +94,113 @@ class FlowManager:
         with open(FLOWS_METADATA_FILE, "r", encoding="utf-8") as f:
             try:
                 data = json.load(f)
-                for flow_data in data:
-                    flow = Flow.from_dict(flow_data)
-                    self._flows[flow.id] = flow
             except json.JSONDecodeError:
                 # O arquivo pode estar vazio ou corrompido, começamos com um estado limpo.
-                pass
+                return
+
+        migrated = False
+        for flow_data in data:
+            legacy_logs = flow_data.pop("execution_logs", None)
+            flow = Flow.from_dict(flow_data)
+            self._flows[flow.id] = flow
+            if legacy_logs:
+                self._migrate_legacy_logs(flow, legacy_logs)
+            migrated = migrated or legacy_logs is not None
+
+        if migrated:
+            # Reescreve flows.json já sem os corpos de log
+            self._save_flows()
+
+    def _migrate_legacy_logs(self, flow: Flow, logs: List[str]):
+        """Move os logs que ficavam dentro de flows.json para uma execução no RunStore."""
+        run_id = self.run_store.start_run(flow.id, started_at=flow.execution_start_time)
+        for message in logs:
+            self.run_store.append_log(run_id, flow.id, message)
+        self.run_store.update_run(run_id, flow.execution_status, flow.execution_end_time, flow.execution_duration)
+        self.run_store.flush()
+        flow.last_run_id = run_id
+
+    # --- Persistência ------------------------------------------------------
+
+    def _mark_dirty(self):
+        """Agenda a gravação do estado atual para o próximo ciclo do flusher."""
+        self._dirty = True
 
     def _save_flows(self):
-        """Salva os metadados dos fluxos no arquivo JSON."""
+        """Salva os metadados dos fluxos no arquivo JSON (temporário + rename atômico)."""
+        with self._lock:
+            flow_list = [flow.to_dict() for flow in self._flows.values()]
+            self._dirty = False
+
         FLOWS_METADATA_FILE.parent.mkdir(parents=True, exist_ok=True)
-        flow_list = [flow.to_dict() for flow in self._flows.values()]
-        with open(FLOWS_METADATA_FILE, "w", encoding="utf-8") as f:
+        tmp_file = FLOWS_METADATA_FILE.with_name(FLOWS_METADATA_FILE.name + ".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
             json.dump(flow_list, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, FLOWS_METADATA_FILE)
+
+    def flush(self):
+        """Grava imediatamente as alterações pendentes, se houver."""
+        with self._write_lock:
+            if self._dirty:
+                self._save_flows()
+
+    def _flusher_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                # Mantém o estado sujo para tentar de novo no próximo intervalo
+                self._dirty = True
+                logger.error(f"⚠️ Falha ao gravar {FLOWS_METADATA_FILE}: {e}")
+
+    def close(self):
+        """Para o flusher e grava o que estiver pendente."""
+        self._closed = True
+        self._wake.set()
+        self._flusher.join(timeout=self.flush_interval * 4)
+        self.flush()
+
+    # --- Fluxos ------------------------------------------------------------
             
     def get_all_flows(self) -> List[Flow]:
         """Retorna uma lista de todos os fluxos, ordenados por data de criação."""
-        return sorted(list(self._flows.values()), key=lambda f: f.created_at, reverse=True)
+        with self._lock:
+            return sorted(list(self._flows.values()), key=lambda f: f.created_at, reverse=True)
 
     def add_flow(self, name: str) -> Flow:
         """Adiciona um novo fluxo."""
         new_flow = Flow(name=name)
-        self._flows[new_flow.id] = new_flow
-        self._save_flows()
+        with self._lock:
+            self._flows[new_flow.id] = new_flow
+            self._mark_dirty()
         return new_flow
 
     def get_flow(self, flow_id: str) -> Optional[Flow]:
         """Busca um fluxo pelo seu ID."""
-        return self._flows.get(flow_id)
+        with self._lock:
+            return self._flows.get(flow_id)
 
     def update_flow_status(self, flow_id: str, status: str):
         """Atualiza o status de um fluxo."""
-        flow = self.get_flow(flow_id)
-        if flow:
-            flow.status = status
-            flow.updated_at = datetime.now().isoformat()
-            self._save_flows()
+        with self._lock:
+            flow = self._flows.get(flow_id)
+            if flow:
+                flow.status = status
+                flow.updated_at = datetime.now().isoformat()
+                self._mark_dirty()
 
     def update_execution_status(self, flow_id: str, execution_status: str, 
                                start_time: Optional[str] = None, 
                                end_time: Optional[str] = None,
                                duration: Optional[float] = None):
         """Atualiza o status de execução de um fluxo."""
-        flow = self.get_flow(flow_id)
-        if flow:
+        with self._lock:
+            flow = self._flows.get(flow_id)
+            if not flow:
+                return
             flow.execution_status = execution_status
             flow.updated_at = datetime.now().isoformat()
             
@@ -122,48 +211,94 @@ class FlowManager:
                 flow.last_run_at = end_time
             if duration:
                 flow.execution_duration = duration
-                
-            self._save_flows()
+            run_id = flow.last_run_id
+            self._mark_dirty()
+
+        if run_id:
+            self.run_store.update_run(run_id, execution_status, end_time, duration)
 
     def update_execution_error(self, flow_id: str, error_message: str):
         """Armazena a mensagem de erro detalhada da execução, acumulando múltiplos erros."""
-        flow = self.get_flow(flow_id)
-        if flow:
-            # Se já existe uma mensagem de erro, acumular em vez de sobrescrever
-            if flow.error_message:
-                # Evitar duplicações da mesma mensagem
-                if error_message not in flow.error_message:
-                    flow.error_message += f"\n\n---\n\n{error_message}"
-            else:
-                flow.error_message = error_message
-            self._save_flows()
+        with self._lock:
+            flow = self._flows.get(flow_id)
+            if flow:
+                # Se já existe uma mensagem de erro, acumular em vez de sobrescrever
+                if flow.error_message:
+                    # Evitar duplicações da mesma mensagem
+                    if error_message not in flow.error_message:
+                        flow.error_message += f"\n\n---\n\n{error_message}"
+                else:
+                    flow.error_message = error_message
+                self._mark_dirty()
+
+    def start_run(self, flow_id: str) -> Optional[str]:
+        """Abre uma nova execução para o fluxo e limpa a mensagem de erro anterior."""
+        with self._lock:
+            flow = self._flows.get(flow_id)
+            if not flow:
+                return None
+            flow.last_run_id = self.run_store.start_run(flow_id)
+            flow.error_message = None
+            self._mark_dirty()
+            return flow.last_run_id
 
     def add_execution_log(self, flow_id: str, log_message: str):
-        """Adiciona uma mensagem de log para a execução."""
-        flow = self.get_flow(flow_id)
-        if flow:
-            timestamp = datetime.now().isoformat()
-            flow.execution_logs.append(f"[{timestamp}] {log_message}")
-            self._save_flows()
+        """Adiciona uma mensagem de log à execução atual (gravada em lote, sem tocar flows.json)."""
+        with self._lock:
+            flow = self._flows.get(flow_id)
+            if not flow:
+                return
+            run_id = flow.last_run_id or self.start_run(flow_id)
+        timestamp = datetime.now().isoformat()
+        self.run_store.append_log(run_id, flow_id, f"[{timestamp}] {log_message}")
+
+    def _last_run_id(self, flow_id: str) -> Optional[str]:
+        with self._lock:
+            flow = self._flows.get(flow_id)
+            return flow.last_run_id if flow else None
+
+    def get_execution_logs(self, flow_id: str, limit: Optional[int] = None) -> List[str]:
+        """Retorna os logs da última execução do fluxo."""
+        run_id = self._last_run_id(flow_id)
+        return self.run_store.get_logs(run_id, limit) if run_id else []
+
+    def count_execution_logs(self, flow_id: str) -> int:
+        """Quantidade de linhas de log da última execução."""
+        run_id = self._last_run_id(flow_id)
+        return self.run_store.count_logs(run_id) if run_id else 0
 
     def clear_execution_logs(self, flow_id: str):
         """Limpa os logs de execução e a mensagem de erro."""
-        flow = self.get_flow(flow_id)
-        if flow:
-            flow.execution_logs = []
+        with self._lock:
+            flow = self._flows.get(flow_id)
+            if not flow:
+                return
             flow.error_message = None
-            self._save_flows()
+            self._mark_dirty()
+        self.run_store.clear_logs(flow_id)
 
     def delete_flow(self, flow_id: str):
         """Remove um fluxo."""
-        if flow_id in self._flows:
-            del self._flows[flow_id]
-            self._save_flows()
+        with self._lock:
+            if self._flows.pop(flow_id, None) is None:
+                return
+            self._mark_dirty()
+        self.run_store.delete_flow(flow_id)
 
     def rename_flow(self, flow_id: str, new_name: str):
         """Renomeia um fluxo."""
-        flow = self.get_flow(flow_id)
-        if flow:
-            flow.name = new_name
-            flow.updated_at = datetime.now().isoformat()
-            self._save_flows() 
\ No newline at end of file
+        with self._lock:
+            flow = self._flows.get(flow_id)
+            if flow:
+                flow.name = new_name
+                flow.updated_at = datetime.now().isoformat()
+                self._mark_dirty()
+
+    def set_flow_priority(self, flow_id: str, priority: int):
+        """Define a prioridade do fluxo na fila de execução."""
+        with self._lock:
+            flow = self._flows.get(flow_id)
+            if flow:
+                flow.priority = priority
+                flow.updated_at = datetime.now().isoformat()
+                self._mark_dirty()
@@ -0,0 +1,185 @@
+"""
+Fila de execução de fluxos da KTR Platform.
+
+Limita quantos pipelines rodam ao mesmo tempo (slots globais). Pedidos além
+do limite esperam numa fila ordenada por prioridade e, dentro da mesma
+prioridade, por ordem de chegada (FIFO).
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+# Estados de um job na fila
+QUEUED = "Na fila"
+RUNNING = "Executando"
+FINISHED = "Finalizado"
+CANCELLED = "Cancelado"
+
+
+@dataclass
+class FlowJob:
+    """Pedido de execução de um fluxo."""
+    flow_id: str
+    priority: int = 0
+    on_log: Optional[Callable[[str], None]] = None
+    seq: int = 0
+    state: str = QUEUED
+    enqueued_at: float = field(default_factory=time.monotonic)
+    submitted_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def __lt__(self, other: "FlowJob") -> bool:
+        # Maior prioridade primeiro; empate resolvido pela ordem de chegada
+        return (-self.priority, self.seq) < (-other.priority, other.seq)
+
+    @property
+    def wait_seconds(self) -> float:
+        """Tempo de espera na fila (até o início, ou até agora se ainda aguarda)."""
+        end = self.started_at if self.started_at is not None else time.monotonic()
+        return end - self.enqueued_at
+
+    def to_dict(self) -> Dict:
+        return {
+            "flow_id": self.flow_id,
+            "priority": self.priority,
+            "state": self.state,
+            "submitted_at": self.submitted_at,
+            "wait_seconds": round(self.wait_seconds, 2),
+        }
+
+
+class JobQueue:
+    """Fila com prioridade e número fixo de slots de execução.
+
+    Uma thread despachante retira o próximo job sempre que há slot livre e o
+    entrega a `start_job`. Quem executa o job deve chamar `release(job)` ao
+    terminar para liberar o slot.
+    """
+
+    def __init__(self, start_job: Callable[[FlowJob], None], slots: int = 4, history_size: int = 100):
+        self._start_job = start_job
+        self._slots = max(1, slots)
+        self._heap: List[FlowJob] = []
+        self._jobs: Dict[str, FlowJob] = {}  # flow_id -> job na fila ou executando
+        self._finished = deque(maxlen=history_size)
+        self._running = 0
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="flow-job-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    @property
+    def slots(self) -> int:
+        return self._slots
+
+    def set_slots(self, slots: int):
+        """Altera o número de execuções simultâneas."""
+        with self._cond:
+            self._slots = max(1, slots)
+            self._cond.notify_all()
+
+    def submit(self, flow_id: str, priority: int = 0,
+               on_log: Optional[Callable[[str], None]] = None) -> Optional[FlowJob]:
+        """Enfileira um fluxo; retorna None se ele já estiver na fila ou executando."""
+        with self._cond:
+            if flow_id in self._jobs:
+                return None
+            job = FlowJob(flow_id=flow_id, priority=priority, on_log=on_log, seq=next(self._counter))
+            self._jobs[flow_id] = job
+            heapq.heappush(self._heap, job)
+            self._cond.notify_all()
+            return job
+
+    def cancel(self, flow_id: str) -> bool:
+        """Remove um fluxo que ainda aguarda na fila."""
+        with self._cond:
+            job = self._jobs.get(flow_id)
+            if not job or job.state != QUEUED:
+                return False
+            # Remoção preguiçosa: o despachante descarta jobs cancelados
+            job.state = CANCELLED
+            job.finished_at = time.monotonic()
+            del self._jobs[flow_id]
+            self._finished.append(job)
+            return True
+
+    def release(self, job: FlowJob):
+        """Marca o job como finalizado e libera seu slot."""
+        with self._cond:
+            if job.state != RUNNING:
+                return
+            job.state = FINISHED
+            job.finished_at = time.monotonic()
+            self._running -= 1
+            self._jobs.pop(job.flow_id, None)
+            self._finished.append(job)
+            self._cond.notify_all()
+
+    def get_job(self, flow_id: str) -> Optional[FlowJob]:
+        """Job ativo (na fila ou executando) de um fluxo."""
+        with self._cond:
+            return self._jobs.get(flow_id)
+
+    def position(self, flow_id: str) -> Optional[int]:
+        """Posição (1 = próximo) de um fluxo na fila."""
+        with self._cond:
+            queued = sorted(job for job in self._heap if job.state == QUEUED)
+            for index, job in enumerate(queued, start=1):
+                if job.flow_id == flow_id:
+                    return index
+        return None
+
+    def snapshot(self) -> List[FlowJob]:
+        """Jobs executando, na fila (em ordem de saída) e finalizados recentemente."""
+        with self._cond:
+            running = [job for job in self._jobs.values() if job.state == RUNNING]
+            queued = sorted(job for job in self._heap if job.state == QUEUED)
+            finished = list(reversed(self._finished))
+        return sorted(running, key=lambda job: job.started_at) + queued + finished
+
+    def stats(self) -> Dict:
+        """Profundidade da fila, ocupação dos slots e tempos de espera."""
+        with self._cond:
+            queued = [job for job in self._heap if job.state == QUEUED]
+            started = [job for job in self._finished if job.started_at is not None]
+            started += [job for job in self._jobs.values() if job.state == RUNNING]
+            waits = [job.wait_seconds for job in started]
+            return {
+                "slots": self._slots,
+                "running": self._running,
+                "queued": len(queued),
+                "oldest_wait": round(max((job.wait_seconds for job in queued), default=0.0), 2),
+                "avg_wait": round(sum(waits) / len(waits), 2) if waits else 0.0,
+            }
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._next_ready():
+                    self._cond.wait()
+                job = heapq.heappop(self._heap)
+                job.state = RUNNING
+                job.started_at = time.monotonic()
+                self._running += 1
+
+            try:
+                self._start_job(job)
+            except Exception as e:
+                logger.error(f"❌ Falha ao iniciar o fluxo {job.flow_id}: {e}")
+                self.release(job)
+
+    def _next_ready(self) -> bool:
+        # Descarta do topo os jobs cancelados enquanto aguardavam
+        while self._heap and self._heap[0].state != QUEUED:
+            heapq.heappop(self._heap)
+        return bool(self._heap) and self._running < self._slots
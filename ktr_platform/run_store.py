@@ -0,0 +1,167 @@
+"""
+Armazenamento de execuções e logs da KTR Platform.
+
+Cada execução recebe um run_id e suas linhas de log vão para um SQLite em modo
+WAL, separado dos metadados em flows.json. As linhas são acumuladas em memória
+e gravadas em lote por uma thread de fundo, de modo que quem lê stdout/stderr
+dos pipelines nunca espera por disco.
+"""
+
+import atexit
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from settings import RUNS_DB_FILE
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    flow_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    ended_at TEXT,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_flow ON runs (flow_id, started_at);
+CREATE TABLE IF NOT EXISTS logs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    flow_id TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_logs_run ON logs (run_id, seq);
+CREATE INDEX IF NOT EXISTS idx_logs_flow ON logs (flow_id, seq);
+"""
+
+
+class RunStore:
+    """Guarda execuções (runs) e seus logs em SQLite com gravação em lote."""
+
+    def __init__(self, db_path: Path = RUNS_DB_FILE, flush_interval: float = 0.5, batch_size: int = 500):
+        self.db_path = Path(db_path)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+        self._db_lock = threading.Lock()       # uma operação por vez na conexão
+        self._pending_lock = threading.Lock()  # protege o buffer de linhas
+        self._pending: List[Tuple[str, str, str]] = []
+        self._wake = threading.Event()
+        self._closed = False
+        self._writer = threading.Thread(target=self._writer_loop, name="run-store-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    # --- Execuções ---------------------------------------------------------
+
+    def start_run(self, flow_id: str, started_at: Optional[str] = None) -> str:
+        """Registra uma nova execução e retorna seu run_id."""
+        run_id = str(uuid.uuid4())
+        with self._db_lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO runs (run_id, flow_id, status, started_at) VALUES (?, ?, ?, ?)",
+                (run_id, flow_id, "Executando", started_at or datetime.now().isoformat())
+            )
+        return run_id
+
+    def update_run(self, run_id: str, status: str, ended_at: Optional[str] = None,
+                   duration: Optional[float] = None):
+        """Atualiza status e, quando informados, fim e duração de uma execução."""
+        with self._db_lock, self._conn:
+            self._conn.execute(
+                "UPDATE runs SET status = ?, ended_at = COALESCE(?, ended_at), duration = COALESCE(?, duration) "
+                "WHERE run_id = ?",
+                (status, ended_at, duration, run_id)
+            )
+
+    def get_runs(self, flow_id: str, limit: int = 20) -> List[Dict]:
+        """Lista as execuções mais recentes de um fluxo."""
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT run_id, flow_id, status, started_at, ended_at, duration FROM runs "
+                "WHERE flow_id = ? ORDER BY started_at DESC LIMIT ?",
+                (flow_id, limit)
+            ).fetchall()
+        keys = ("run_id", "flow_id", "status", "started_at", "ended_at", "duration")
+        return [dict(zip(keys, row)) for row in rows]
+
+    # --- Logs --------------------------------------------------------------
+
+    def append_log(self, run_id: str, flow_id: str, message: str):
+        """Enfileira uma linha de log; a gravação acontece no próximo lote."""
+        with self._pending_lock:
+            self._pending.append((run_id, flow_id, message))
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def get_logs(self, run_id: str, limit: Optional[int] = None) -> List[str]:
+        """Retorna os logs de uma execução (as últimas `limit` linhas, se informado)."""
+        self.flush()
+        with self._db_lock:
+            if limit is None:
+                rows = self._conn.execute(
+                    "SELECT message FROM logs WHERE run_id = ? ORDER BY seq", (run_id,)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT message FROM (SELECT seq, message FROM logs WHERE run_id = ? "
+                    "ORDER BY seq DESC LIMIT ?) ORDER BY seq", (run_id, limit)
+                ).fetchall()
+        return [row[0] for row in rows]
+
+    def count_logs(self, run_id: str) -> int:
+        """Quantidade de linhas de log de uma execução."""
+        self.flush()
+        with self._db_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM logs WHERE run_id = ?", (run_id,)).fetchone()[0]
+
+    def clear_logs(self, flow_id: str):
+        """Remove os logs de todas as execuções de um fluxo."""
+        self.flush()
+        with self._db_lock, self._conn:
+            self._conn.execute("DELETE FROM logs WHERE flow_id = ?", (flow_id,))
+
+    def delete_flow(self, flow_id: str):
+        """Remove execuções e logs de um fluxo excluído."""
+        self.flush()
+        with self._db_lock, self._conn:
+            self._conn.execute("DELETE FROM logs WHERE flow_id = ?", (flow_id,))
+            self._conn.execute("DELETE FROM runs WHERE flow_id = ?", (flow_id,))
+
+    # --- Gravação em lote --------------------------------------------------
+
+    def flush(self):
+        """Grava imediatamente as linhas pendentes em uma única transação."""
+        # A troca do buffer acontece sob o lock da conexão para preservar a ordem entre lotes
+        with self._db_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+            if batch:
+                with self._conn:
+                    self._conn.executemany("INSERT INTO logs (run_id, flow_id, message) VALUES (?, ?, ?)", batch)
+
+    def _writer_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        """Grava o que falta e fecha a conexão."""
+        self._closed = True
+        self._wake.set()
+        self._writer.join(timeout=self.flush_interval * 4)
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
@@ -48,6 +48,10 @@ class FlowScheduler:
         self.schedules: Dict[str, ScheduleConfig] = {}
         self.running = False
         self.thread = None
+        # Agenda própria (e não a global do módulo `schedule`) para que nenhuma outra
+        # instância limpe ou execute os jobs desta; o lock serializa a UI e a thread do loop
+        self._jobs = schedule.Scheduler()
+        self._lock = threading.RLock()
         self.data_file = "ktr_platform/data/schedules.json"
         
         # Garantir que o diretório existe
@@ -72,7 +76,7 @@ class FlowScheduler:
     def save_schedules(self):
         """Salva agendamentos no arquivo JSON."""
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
+            with self._lock, open(self.data_file, 'w', encoding='utf-8') as f:
                 data = [asdict(schedule) for schedule in self.schedules.values()]
                 json.dump(data, f, indent=2, ensure_ascii=False)
             logger.info("Agendamentos salvos com sucesso")
@@ -95,9 +99,10 @@ class FlowScheduler:
             created_at=datetime.now().isoformat()
         )
         
-        self.schedules[schedule_id] = schedule_config
-        self._register_schedule(schedule_config)
-        self.save_schedules()
+        with self._lock:
+            self.schedules[schedule_id] = schedule_config
+            self._register_schedule(schedule_config)
+            self.save_schedules()
         
         logger.info(f"Agendamento diário criado: {flow.name} às {time}")
         return schedule_id
@@ -119,9 +124,10 @@ class FlowScheduler:
             created_at=datetime.now().isoformat()
         )
         
-        self.schedules[schedule_id] = schedule_config
-        self._register_schedule(schedule_config)
-        self.save_schedules()
+        with self._lock:
+            self.schedules[schedule_id] = schedule_config
+            self._register_schedule(schedule_config)
+            self.save_schedules()
         
         days_str = ", ".join(days)
         logger.info(f"Agendamento semanal criado: {flow.name} - {days_str} às {time}")
@@ -157,9 +163,10 @@ class FlowScheduler:
             created_at=datetime.now().isoformat()
         )
         
-        self.schedules[schedule_id] = schedule_config
-        self._register_specific_dates_schedule(schedule_config)
-        self.save_schedules()
+        with self._lock:
+            self.schedules[schedule_id] = schedule_config
+            self._register_specific_dates_schedule(schedule_config)
+            self.save_schedules()
         
         logger.info(f"Agendamento para datas específicas criado: {flow.name} - {len(future_dates)} datas")
         return schedule_id
@@ -185,9 +192,10 @@ class FlowScheduler:
             created_at=datetime.now().isoformat()
         )
         
-        self.schedules[schedule_id] = schedule_config
-        self._register_schedule(schedule_config)
-        self.save_schedules()
+        with self._lock:
+            self.schedules[schedule_id] = schedule_config
+            self._register_schedule(schedule_config)
+            self.save_schedules()
         
         logger.info(f"Agendamento customizado criado: {flow.name}")
         return schedule_id
@@ -215,9 +223,10 @@ class FlowScheduler:
             created_at=datetime.now().isoformat()
         )
         
-        self.schedules[schedule_id] = schedule_config
-        self._register_multiple_times_schedule(schedule_config)
-        self.save_schedules()
+        with self._lock:
+            self.schedules[schedule_id] = schedule_config
+            self._register_multiple_times_schedule(schedule_config)
+            self.save_schedules()
         
         logger.info(f"Agendamento múltiplos horários criado: {flow.name} - {len(times)} horários")
         return schedule_id
@@ -245,9 +254,10 @@ class FlowScheduler:
             created_at=datetime.now().isoformat()
         )
         
-        self.schedules[schedule_id] = schedule_config
-        self._register_day_specific_times_schedule(schedule_config)
-        self.save_schedules()
+        with self._lock:
+            self.schedules[schedule_id] = schedule_config
+            self._register_day_specific_times_schedule(schedule_config)
+            self.save_schedules()
         
         total_executions = sum(len(times) for times in day_times.values())
         logger.info(f"Agendamento horários por dia criado: {flow.name} - {total_executions} execuções/semana")
@@ -281,42 +291,45 @@ class FlowScheduler:
             created_at=datetime.now().isoformat()
         )
         
-        self.schedules[schedule_id] = schedule_config
-        self._register_interval_schedule(schedule_config)
-        self.save_schedules()
+        with self._lock:
+            self.schedules[schedule_id] = schedule_config
+            self._register_interval_schedule(schedule_config)
+            self.save_schedules()
         
         logger.info(f"Agendamento por intervalo criado: {flow.name} - {interval_minutes}min")
         return schedule_id
 
     def update_schedule(self, schedule_id: str, **kwargs) -> bool:
         """Atualiza um agendamento existente."""
-        if schedule_id not in self.schedules:
-            return False
-        
-        schedule_config = self.schedules[schedule_id]
-        
-        # Campos editáveis
-        editable_fields = ['time', 'days', 'specific_dates', 'start_date', 'end_date', 'description']
-        
-        # Parar agendamento atual
-        schedule.clear(schedule_id)
-        
-        # Atualizar campos
-        for field, value in kwargs.items():
-            if field in editable_fields and hasattr(schedule_config, field):
-                setattr(schedule_config, field, value)
-        
-        # Recalcular próxima execução
-        schedule_config.next_run = self._calculate_next_run(schedule_config)
-        
-        # Re-registrar agendamento
-        if schedule_config.active:
-            if schedule_config.schedule_type == 'specific_dates':
-                self._register_specific_dates_schedule(schedule_config)
-            else:
-                self._register_schedule(schedule_config)
-        
-        self.save_schedules()
+        with self._lock:
+            if schedule_id not in self.schedules:
+                return False
+            
+            schedule_config = self.schedules[schedule_id]
+            
+            # Campos editáveis
+            editable_fields = ['time', 'days', 'specific_dates', 'start_date', 'end_date', 'description']
+            
+            # Parar agendamento atual
+            self._jobs.clear(schedule_id)
+            
+            # Atualizar campos
+            for field, value in kwargs.items():
+                if field in editable_fields and hasattr(schedule_config, field):
+                    setattr(schedule_config, field, value)
+            
+            # Recalcular próxima execução
+            schedule_config.next_run = self._calculate_next_run(schedule_config)
+            
+            # Re-registrar agendamento
+            if schedule_config.active:
+                if schedule_config.schedule_type == 'specific_dates':
+                    self._register_specific_dates_schedule(schedule_config)
+                else:
+                    self._register_schedule(schedule_config)
+            
+            self.save_schedules()
+            
         logger.info(f"Agendamento atualizado: {schedule_config.flow_name}")
         return True
     
@@ -332,17 +345,17 @@ class FlowScheduler:
             self._execute_scheduled_flow(schedule_config.id)
         
         if schedule_config.schedule_type == 'daily':
-            schedule.every().day.at(schedule_config.time).do(job).tag(schedule_config.id)
+            self._jobs.every().day.at(schedule_config.time).do(job).tag(schedule_config.id)
         elif schedule_config.schedule_type == 'weekly':
             for day in schedule_config.days:
-                getattr(schedule.every(), day.lower()).at(schedule_config.time).do(job).tag(schedule_config.id)
+                getattr(self._jobs.every(), day.lower()).at(schedule_config.time).do(job).tag(schedule_config.id)
         elif schedule_config.schedule_type == 'custom':
             # Agendamento customizado considera período e dias
             if schedule_config.days:
                 for day in schedule_config.days:
-                    getattr(schedule.every(), day.lower()).at(schedule_config.time).do(job).tag(schedule_config.id)
+                    getattr(self._jobs.every(), day.lower()).at(schedule_config.time).do(job).tag(schedule_config.id)
             else:
-                schedule.every().day.at(schedule_config.time).do(job).tag(schedule_config.id)
+                self._jobs.every().day.at(schedule_config.time).do(job).tag(schedule_config.id)
 
     def _should_execute_now(self, schedule_config: ScheduleConfig) -> bool:
         """Verifica se um agendamento deve ser executado agora."""
@@ -616,42 +629,46 @@ class FlowScheduler:
 
     def delete_schedule(self, schedule_id: str) -> bool:
         """Remove um agendamento."""
-        if schedule_id in self.schedules:
+        with self._lock:
+            if schedule_id not in self.schedules:
+                return False
             # Remover do scheduler
-            schedule.clear(schedule_id)
+            self._jobs.clear(schedule_id)
             
             # Remover da lista
             del self.schedules[schedule_id]
             self.save_schedules()
             
-            logger.info(f"Agendamento removido: {schedule_id}")
-            return True
-        return False
+        logger.info(f"Agendamento removido: {schedule_id}")
+        return True
     
     def toggle_schedule(self, schedule_id: str) -> bool:
         """Ativa/desativa um agendamento."""
-        if schedule_id in self.schedules:
+        with self._lock:
+            if schedule_id not in self.schedules:
+                return False
             schedule_config = self.schedules[schedule_id]
             schedule_config.active = not schedule_config.active
             
             if schedule_config.active:
                 self._register_schedule(schedule_config)
             else:
-                schedule.clear(schedule_id)
+                self._jobs.clear(schedule_id)
             
             self.save_schedules()
-            logger.info(f"Agendamento {'ativado' if schedule_config.active else 'desativado'}: {schedule_config.flow_name}")
-            return True
-        return False
+        logger.info(f"Agendamento {'ativado' if schedule_config.active else 'desativado'}: {schedule_config.flow_name}")
+        return True
     
     def get_all_schedules(self) -> List[ScheduleConfig]:
         """Retorna todos os agendamentos."""
         # Atualizar próximas execuções
-        for schedule_config in self.schedules.values():
+        with self._lock:
+            schedules = list(self.schedules.values())
+        for schedule_config in schedules:
             if schedule_config.active:
                 schedule_config.next_run = self._calculate_next_run(schedule_config)
         
-        return list(self.schedules.values())
+        return schedules
     
     def get_next_runs(self, limit: int = 10) -> List[Dict]:
         """Retorna as próximas execuções agendadas."""
@@ -678,35 +695,41 @@ class FlowScheduler:
         return next_runs[:limit]
     
     def start(self):
-        """Inicia o scheduler em thread separada."""
-        if self.running:
-            return
-        
-        self.running = True
-        
-        # Registrar todos os agendamentos ativos
-        schedule.clear()  # Limpar agendamentos anteriores
-        for schedule_config in self.schedules.values():
-            if schedule_config.active:
-                self._register_schedule(schedule_config)
-        
-        # Iniciar thread do scheduler
-        self.thread = threading.Thread(target=self._run_scheduler, daemon=True)
-        self.thread.start()
+        """Inicia o scheduler em thread separada (no máximo um loop por instância)."""
+        with self._lock:
+            if self.running or (self.thread and self.thread.is_alive()):
+                return
+            
+            self.running = True
+            
+            # Registrar todos os agendamentos ativos
+            self._jobs.clear()  # Limpar agendamentos anteriores
+            for schedule_config in self.schedules.values():
+                if schedule_config.active:
+                    self._register_schedule(schedule_config)
+            
+            # Iniciar thread do scheduler
+            self.thread = threading.Thread(target=self._run_scheduler, name="flow-scheduler", daemon=True)
+            self.thread.start()
         
         logger.info("Scheduler iniciado")
     
     def stop(self):
-        """Para o scheduler."""
-        self.running = False
-        schedule.clear()
+        """Para o scheduler e aguarda o fim do loop."""
+        with self._lock:
+            self.running = False
+            self._jobs.clear()
+            thread = self.thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=5)
         logger.info("Scheduler parado")
     
     def _run_scheduler(self):
         """Loop principal do scheduler."""
         while self.running:
             try:
-                schedule.run_pending()
+                with self._lock:
+                    self._jobs.run_pending()
                 time.sleep(1)
             except Exception as e:
                 logger.error(f"Erro no scheduler: {e}")
@@ -730,7 +753,7 @@ class FlowScheduler:
                     hour, minute = int(time_parts[0]), int(time_parts[1])
                     
                     # Agendar para a data e hora específicas
-                    schedule.every().day.at(schedule_config.time).do(job).tag(schedule_config.id)
+                    self._jobs.every().day.at(schedule_config.time).do(job).tag(schedule_config.id)
                     
             except Exception as e:
                 logger.error(f"Erro ao registrar data específica {date_str}: {e}")
@@ -750,10 +773,10 @@ class FlowScheduler:
         # Registrar para cada horário
         for time_str in schedule_config.times:
             if schedule_config.schedule_type == 'daily':
-                schedule.every().day.at(time_str).do(create_job(time_str)).tag(schedule_config.id)
+                self._jobs.every().day.at(time_str).do(create_job(time_str)).tag(schedule_config.id)
             elif schedule_config.schedule_type == 'weekly' and schedule_config.days:
                 for day in schedule_config.days:
-                    getattr(schedule.every(), day.lower()).at(time_str).do(create_job(time_str)).tag(schedule_config.id)
+                    getattr(self._jobs.every(), day.lower()).at(time_str).do(create_job(time_str)).tag(schedule_config.id)
 
     def _register_day_specific_times_schedule(self, schedule_config: ScheduleConfig):
         """Registra agendamento com horários específicos por dia."""
@@ -770,7 +793,7 @@ class FlowScheduler:
         # Registrar para cada dia e horário
         for day, times in schedule_config.day_times.items():
             for time_str in times:
-                getattr(schedule.every(), day.lower()).at(time_str).do(create_job()).tag(schedule_config.id)
+                getattr(self._jobs.every(), day.lower()).at(time_str).do(create_job()).tag(schedule_config.id)
 
     def _register_interval_schedule(self, schedule_config: ScheduleConfig):
         """Registra agendamento por intervalo."""
@@ -807,7 +830,7 @@ class FlowScheduler:
             self._execute_scheduled_flow(schedule_config.id)
         
         # Registrar execução a cada intervalo
-        schedule.every(schedule_config.interval_minutes).minutes.do(job).tag(schedule_config.id)
+        self._jobs.every(schedule_config.interval_minutes).minutes.do(job).tag(schedule_config.id)
 
     def _validate_time_format(self, time_str: str) -> bool:
         """Valida formato de horário HH:MM."""
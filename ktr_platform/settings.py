@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Diretório base da plataforma
@@ -10,4 +11,15 @@ FLOWS_DIR = PLATFORM_DIR / "flows"
 DATA_DIR = PLATFORM_DIR / "data"
 
 # Arquivo para armazenar os metadados dos fluxos
-FLOWS_METADATA_FILE = DATA_DIR / "flows.json" 
\ No newline at end of file
+FLOWS_METADATA_FILE = DATA_DIR / "flows.json" 
+# Banco SQLite (WAL) com o histórico de execuções e seus logs
+RUNS_DB_FILE = DATA_DIR / "runs.db"
+
+# Intervalo (segundos) entre gravações de flows.json; uma queda perde no máximo um intervalo
+FLOWS_FLUSH_INTERVAL = 1.0
+
+# Quantidade máxima de fluxos executando ao mesmo tempo; os demais aguardam na fila
+MAX_CONCURRENT_FLOWS = int(os.environ.get("KTR_MAX_CONCURRENT_FLOWS", "4"))
+
+# Interromper o fluxo na primeira linha de log com cara de erro; por padrão o resultado vem do código de saída
+STOP_ON_ERROR_LINE = os.environ.get("KTR_STOP_ON_ERROR_LINE", "0") == "1"
@@ -0,0 +1,163 @@
+"""
+Supervisão dos subprocessos dos pipelines da KTR Platform.
+
+Um único event loop asyncio, rodando em uma thread, lê stdout/stderr de todos
+os fluxos em execução e é avisado quando cada processo termina. Não há
+polling nem threads de leitura por execução, e centenas de fluxos
+simultâneos são acompanhados pela mesma thread.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import warnings
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+# Linhas maiores que isso são entregues em pedaços
+LINE_LIMIT = 1024 * 1024
+
+
+@dataclass
+class ManagedProcess:
+    """Processo acompanhado pelo supervisor."""
+    key: str
+    process: asyncio.subprocess.Process
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.process.returncode
+
+
+_watcher_lock = threading.Lock()
+_watcher_installed = False
+
+
+def _install_pidfd_child_watcher(loop: asyncio.AbstractEventLoop):
+    """No Linux com Python < 3.12, troca o watcher padrão (uma thread por filho) pelo de pidfd.
+
+    O watcher é global no processo: fica ligado ao loop do primeiro supervisor
+    e atende os demais, pois o aviso de término é repassado ao loop dono do
+    processo via call_soon_threadsafe.
+    """
+    global _watcher_installed
+    if sys.platform == "win32" or sys.version_info >= (3, 12) or not hasattr(os, "pidfd_open"):
+        return  # Windows usa o Proactor; a partir do 3.12 o pidfd já é o padrão
+    with _watcher_lock:
+        if _watcher_installed:
+            return
+        try:
+            os.close(os.pidfd_open(os.getpid()))
+        except OSError:
+            return  # kernel sem suporte a pidfd: mantém o watcher padrão
+        watcher = asyncio.PidfdChildWatcher()
+        watcher.attach_loop(loop)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            asyncio.set_child_watcher(watcher)
+        _watcher_installed = True
+
+
+class ProcessSupervisor:
+    """Inicia subprocessos e multiplexa sua saída em um único event loop."""
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        _install_pidfd_child_watcher(self._loop)
+        self._processes: Dict[str, ManagedProcess] = {}
+        self._thread = threading.Thread(target=self._run_loop, name="flow-supervisor", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def spawn(self, key: str, args: List[str], cwd: str, env: Dict[str, str],
+              on_line: Callable[[ManagedProcess, str, bool], None],
+              on_exit: Callable[[ManagedProcess, int], None]) -> ManagedProcess:
+        """Inicia um processo e passa a acompanhá-lo.
+
+        `on_line(processo, linha, is_stderr)` e `on_exit(processo, returncode)` são chamados na
+        thread do supervisor e não devem bloquear. Erros ao criar o processo
+        são levantados para quem chamou.
+        """
+        create = asyncio.create_subprocess_exec(
+            *args, cwd=cwd, env=env, limit=LINE_LIMIT,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        process = asyncio.run_coroutine_threadsafe(create, self._loop).result()
+        managed = ManagedProcess(key, process)
+        self._processes[key] = managed
+        asyncio.run_coroutine_threadsafe(self._watch(managed, on_line, on_exit), self._loop)
+        return managed
+
+    def stop(self, managed: ManagedProcess, timeout: float = 5.0):
+        """Termina o processo, forçando o kill se não encerrar em `timeout` segundos."""
+        future = asyncio.run_coroutine_threadsafe(self._stop(managed, timeout), self._loop)
+        future.result(timeout + 1)
+
+    def terminate(self, managed: ManagedProcess, delay: float = 0.0):
+        """Pede o término do processo após `delay` segundos, sem bloquear (seguro de qualquer thread)."""
+        self._loop.call_soon_threadsafe(self._loop.call_later, delay, self._terminate, managed)
+
+    def running_count(self) -> int:
+        """Quantidade de processos acompanhados no momento."""
+        return len(self._processes)
+
+    async def _watch(self, managed: ManagedProcess, on_line, on_exit):
+        try:
+            await asyncio.gather(
+                self._read(managed, managed.process.stdout, on_line, False),
+                self._read(managed, managed.process.stderr, on_line, True),
+            )
+        except Exception as e:
+            logger.error(f"❌ Erro lendo a saída de {managed.key}: {e}")
+        finally:
+            returncode = await managed.process.wait()
+            self._processes.pop(managed.key, None)
+            self._safe_call(on_exit, managed, returncode)
+
+    async def _read(self, managed: ManagedProcess, stream: asyncio.StreamReader, on_line, is_stderr: bool):
+        while True:
+            try:
+                raw = await stream.readuntil(b"\n")
+            except asyncio.IncompleteReadError as e:
+                raw = e.partial  # fim do stream (última linha sem quebra)
+                if not raw:
+                    break
+            except asyncio.LimitOverrunError as e:
+                # Linha acima do limite: entrega o pedaço já recebido sem descartá-lo
+                raw = await stream.read(e.consumed)
+            line = raw.decode("utf-8", errors="replace").strip()
+            if line:
+                self._safe_call(on_line, managed, line, is_stderr)
+
+    async def _stop(self, managed: ManagedProcess, timeout: float):
+        self._terminate(managed)
+        try:
+            await asyncio.wait_for(managed.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            managed.process.kill()  # Força a parada se necessário
+            await managed.process.wait()
+
+    @staticmethod
+    def _terminate(managed: ManagedProcess):
+        if managed.process.returncode is None:
+            try:
+                managed.process.terminate()
+            except ProcessLookupError:
+                pass  # já encerrou
+
+    @staticmethod
+    def _safe_call(callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.error(f"❌ Erro no callback do supervisor: {e}")
@@ -7,6 +7,12 @@ from loguru import logger
 import networkx as nx
 
 from src.models.ktr_models import KTRModel, Step, Hop, StepType
+from src.generator.in_database import DEFAULT_ROW_BYTES, estimate_transfer_avoided, find_in_database_flows
+from src.generator.pushdown import push_down
+
+# Versão das regras de análise; altere ao mudar métricas, padrões ou sugestões
+# (invalida entradas do cache persistente)
+ANALYZER_VERSION = "1.5.0"
 
 @dataclass
 class OptimizationSuggestion:
@@ -66,6 +72,7 @@ class PipelineAnalyzer:
             "lookup_join": self._detect_lookup_pattern,
             "aggregation": self._detect_aggregation_pattern,
             "file_processing": self._detect_file_processing,
+            "in_database_elt": self._detect_in_database_elt,
         }
         
         self.optimization_rules = [
@@ -74,19 +81,26 @@ class PipelineAnalyzer:
             self._suggest_data_validation,
             self._suggest_connection_pooling,
             self._suggest_sql_optimization,
+            self._suggest_in_database_elt,
         ]
     
-    def analyze_pipeline(self, ktr_model: KTRModel) -> AnalysisResult:
+    def analyze_pipeline(self, ktr_model: KTRModel, row_counts: Optional[Dict[str, int]] = None) -> AnalysisResult:
         """
         Análise completa do pipeline
+        
+        row_counts (step → linhas, ex.: métricas de uma execução anterior)
+        permite quantificar o tráfego de rede evitado pelos fluxos ELT.
         """
         logger.info(f"🔍 Analisando pipeline: {ktr_model.name}")
         
         # Criar grafo do pipeline
         graph = self._create_pipeline_graph(ktr_model)
+        structure = self._graph_structure(graph)
         
         # Calcular métricas básicas
-        metrics = self._calculate_metrics(ktr_model, graph)
+        metrics = self._calculate_metrics(ktr_model, graph, structure)
+        metrics["in_database"] = self.estimate_in_database_savings(ktr_model, row_counts)
+        metrics["pushdown"] = [rewrite.to_dict() for rewrite in push_down(ktr_model)[1]]
         
         # Detectar padrões
         patterns = self._detect_patterns(ktr_model, graph)
@@ -95,7 +109,7 @@ class PipelineAnalyzer:
         optimizations = self._suggest_optimizations(ktr_model, patterns)
         
         # Calcular complexidade
-        complexity = self._calculate_complexity(ktr_model, graph)
+        complexity = self._calculate_complexity(ktr_model, graph, structure)
         
         # Estimar ganho de performance
         performance_gain = self._estimate_performance_gain(optimizations)
@@ -112,43 +126,111 @@ class PipelineAnalyzer:
         return result
     
     def _create_pipeline_graph(self, ktr_model: KTRModel) -> nx.DiGraph:
-        """Cria grafo direcionado do pipeline"""
-        graph = nx.DiGraph()
+        """Grafo direcionado do pipeline (instância em cache no modelo, somente leitura)"""
+        return ktr_model.get_graph()
+    
+    def _graph_structure(self, graph: nx.DiGraph) -> Dict[str, Any]:
+        """
+        Estrutura do grafo calculada em tempo linear (O(V+E))
         
-        # Adicionar steps como nós
-        for step in ktr_model.steps:
-            graph.add_node(step.name, step_type=step.type.value, step_obj=step)
+        Os componentes fortemente conexos são colapsados (condensação), de modo
+        que profundidade, largura e caminhos críticos ficam definidos mesmo
+        quando o pipeline contém ciclos.
+        """
+        condensed = nx.condensation(graph)
+        
+        # Componentes com mais de um step ou com auto-laço formam ciclos
+        cyclic_components = []
+        for component in condensed.nodes():
+            members = condensed.nodes[component]["members"]
+            if len(members) > 1 or any(graph.has_edge(m, m) for m in members):
+                cyclic_components.append(sorted(members))
+        
+        # Caminho mais longo por programação dinâmica na ordem topológica
+        distance = {}
+        predecessor = {}
+        for component in nx.topological_sort(condensed):
+            distance.setdefault(component, 0)
+            for successor in condensed.successors(component):
+                if distance[component] + 1 > distance.get(successor, 0):
+                    distance[successor] = distance[component] + 1
+                    predecessor[successor] = component
+        
+        # Largura: maior número de steps numa mesma geração topológica
+        width = 0
+        for generation in nx.topological_generations(condensed):
+            width = max(width, sum(len(condensed.nodes[c]["members"]) for c in generation))
         
-        # Adicionar hops como arestas
-        for hop in ktr_model.hops:
-            if hop.enabled:
-                graph.add_edge(hop.from_step, hop.to_step)
+        return {
+            "condensation": condensed,
+            "cyclic_components": cyclic_components,
+            "distance": distance,
+            "predecessor": predecessor,
+            "depth": max(distance.values(), default=0),
+            "width": width,
+        }
+    
+    def find_critical_paths(self, ktr_model: KTRModel) -> List[List[str]]:
+        """
+        Caminho mais longo (crítico) de cada componente conectado do pipeline
         
-        return graph
+        Steps de um mesmo ciclo aparecem agrupados na posição do ciclo.
+        """
+        structure = self._graph_structure(self._create_pipeline_graph(ktr_model))
+        condensed = structure["condensation"]
+        distance = structure["distance"]
+        predecessor = structure["predecessor"]
+        
+        paths = []
+        for component in nx.weakly_connected_components(condensed):
+            end = max(component, key=lambda c: (distance[c], -c))
+            chain = [end]
+            while chain[-1] in predecessor:
+                chain.append(predecessor[chain[-1]])
+            
+            path = [name for c in reversed(chain) for name in sorted(condensed.nodes[c]["members"])]
+            if len(path) > 1:
+                paths.append(path)
+        
+        return sorted(paths, key=lambda path: (-len(path), path[0]))
+    
+    def calculate_step_depths(self, ktr_model: KTRModel) -> Dict[str, int]:
+        """Profundidade de cada step (maior número de hops desde uma origem)"""
+        structure = self._graph_structure(self._create_pipeline_graph(ktr_model))
+        mapping = structure["condensation"].graph["mapping"]
+        return {step: structure["distance"][component] for step, component in mapping.items()}
     
-    def _calculate_metrics(self, ktr_model: KTRModel, graph: nx.DiGraph) -> Dict[str, Any]:
+    def _calculate_metrics(self, ktr_model: KTRModel, graph: nx.DiGraph, structure: Dict[str, Any]) -> Dict[str, Any]:
         """Calcula métricas do pipeline"""
-        metrics = {
+        return {
             "total_steps": len(ktr_model.steps),
             "total_connections": len(ktr_model.connections),
             "total_hops": len(ktr_model.hops),
             "input_steps": len([s for s in ktr_model.steps if s.is_input]),
             "transform_steps": len([s for s in ktr_model.steps if s.is_transform]),
             "output_steps": len([s for s in ktr_model.steps if s.is_output]),
-            "graph_depth": 0,
-            "graph_width": 0,
-            "cycles": len(list(nx.simple_cycles(graph))),
+            "graph_depth": structure["depth"],
+            "graph_width": structure["width"],
+            # Número de componentes cíclicos (SCCs), não de ciclos elementares
+            "cycles": len(structure["cyclic_components"]),
         }
+    
+    def estimate_in_database_savings(self, ktr_model: KTRModel, row_counts: Optional[Dict[str, int]] = None,
+                                     row_bytes: int = DEFAULT_ROW_BYTES) -> Dict[str, Any]:
+        """
+        Fluxos que o gerador executa no banco (INSERT ... SELECT) e o tráfego evitado
         
-        # Calcular profundidade e largura do grafo
-        try:
-            if graph.nodes():
-                metrics["graph_depth"] = nx.dag_longest_path_length(graph) if nx.is_directed_acyclic_graph(graph) else 0
-                metrics["graph_width"] = max(len(list(nx.ancestors(graph, node))) + 1 for node in graph.nodes())
-        except:
-            pass
-        
-        return metrics
+        Sem row_counts, linhas e bytes ficam indefinidos (None); com ele, somam
+        a leitura da origem e a gravação no destino de cada fluxo.
+        """
+        flows = find_in_database_flows(ktr_model)
+        return {
+            "flows": [
+                {"steps": flow.step_names, "connection": flow.connection, "target": flow.target.table}
+                for flow in flows
+            ],
+            **estimate_transfer_avoided(flows, row_counts, row_bytes),
+        }
     
     def _detect_patterns(self, ktr_model: KTRModel, graph: nx.DiGraph) -> List[PipelinePattern]:
         """Detecta padrões comuns no pipeline"""
@@ -231,6 +313,20 @@ class PipelineAnalyzer:
         
         return None
     
+    def _detect_in_database_elt(self, ktr_model: KTRModel, graph: nx.DiGraph) -> Optional[PipelinePattern]:
+        """Detecta fluxos com origem e destino na mesma conexão, executáveis no banco"""
+        flows = find_in_database_flows(ktr_model)
+        
+        if flows:
+            return PipelinePattern(
+                name="In-Database ELT",
+                description="Origem e destino na mesma conexão, com transformações expressáveis em SQL",
+                steps_involved=[name for flow in flows for name in flow.step_names],
+                confidence=0.9
+            )
+        
+        return None
+    
     def _suggest_optimizations(self, ktr_model: KTRModel, patterns: List[PipelinePattern]) -> List[OptimizationSuggestion]:
         """Sugere otimizações baseadas na análise"""
         optimizations = []
@@ -337,8 +433,24 @@ engine = create_engine(
         return None
     
     def _suggest_sql_optimization(self, ktr_model: KTRModel, patterns: List[PipelinePattern]) -> Optional[OptimizationSuggestion]:
-        """Sugere otimizações de SQL"""
+        """Sugere otimizações de SQL (pushdown aplicado automaticamente pelo gerador, quando possível)"""
         table_inputs = [s for s in ktr_model.steps if s.type == StepType.TABLE_INPUT]
+        rewrites = push_down(ktr_model)[1]
+        
+        if rewrites:
+            steps = sorted({rewrite.step for rewrite in rewrites})
+            clauses = sorted({rewrite.clause for rewrite in rewrites})
+            before = next(r.sql_before for r in rewrites if r.source == rewrites[-1].source)
+            return OptimizationSuggestion(
+                type="sql_optimization",
+                description=f"Levar {', '.join(clauses)} para a consulta de origem: {', '.join(steps)}",
+                impact="high",
+                code_example=f'''-- Antes ({rewrites[-1].source})
+{before}
+
+-- Depois
+{rewrites[-1].sql_after}'''
+            )
         
         if table_inputs:
             return OptimizationSuggestion(
@@ -361,7 +473,26 @@ LIMIT 10000
         
         return None
     
-    def _calculate_complexity(self, ktr_model: KTRModel, graph: nx.DiGraph) -> int:
+    def _suggest_in_database_elt(self, ktr_model: KTRModel, patterns: List[PipelinePattern]) -> Optional[OptimizationSuggestion]:
+        """Sugere ELT no banco (aplicado automaticamente pelo gerador)"""
+        flows = find_in_database_flows(ktr_model)
+        
+        if flows:
+            flow = flows[0]
+            return OptimizationSuggestion(
+                type="in_database_elt",
+                description=f"Executar {len(flows)} fluxo(s) no próprio banco, sem trafegar as linhas pelo Python",
+                impact="high",
+                code_example=f'''-- {" → ".join(flow.step_names)}
+INSERT INTO {flow.target.table}
+SELECT * FROM (
+{flow.sql}
+) q'''
+            )
+        
+        return None
+    
+    def _calculate_complexity(self, ktr_model: KTRModel, graph: nx.DiGraph, structure: Dict[str, Any]) -> int:
         """Calcula score de complexidade (0-100)"""
         base_score = 0
         
@@ -372,23 +503,14 @@ LIMIT 10000
         base_score += min(len(ktr_model.connections) * 10, 20)
         
         # Complexidade baseada em profundidade do grafo
-        try:
-            if nx.is_directed_acyclic_graph(graph):
-                depth = nx.dag_longest_path_length(graph)
-                base_score += min(depth * 3, 15)
-        except:
-            pass
+        base_score += min(structure["depth"] * 3, 15)
         
         # Complexidade baseada em padrões complexos
         transform_steps = len([s for s in ktr_model.steps if s.is_transform])
         base_score += min(transform_steps * 3, 20)
         
         # Penalidade por ciclos
-        try:
-            cycles = len(list(nx.simple_cycles(graph)))
-            base_score += cycles * 10
-        except:
-            pass
+        base_score += len(structure["cyclic_components"]) * 10
         
         return min(base_score, 100)
     
@@ -0,0 +1 @@
+"""Conversão em lote de arquivos KTR"""
\ No newline at end of file
@@ -0,0 +1,285 @@
+"""
+Conversão em lote de KTRs com pool de processos e manifesto retomável
+
+Cada processo worker mantém uma única instância de KTRParser, PipelineAnalyzer
+e CodeGenerator (com seu Environment Jinja). O manifesto registra status, hash
+e duração por arquivo, permitindo que uma nova execução pule arquivos que não
+mudaram desde a última conversão bem-sucedida com a mesma versão do parser e
+do gerador e as mesmas opções de geração (engine, streaming, pushdown...).
+Cada KTR gera seu projeto em um diretório derivado do caminho
+relativo do arquivo, de modo que KTRs com o mesmo nome de transformação não
+se sobrescrevem.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from src.cache.ktr_cache import KTRCache
+from src.generator.code_generator import GENERATOR_VERSION
+from src.parser.ktr_parser import PARSER_VERSION
+
+MANIFEST_FILE = ".ktr_manifest.json"
+
+# Intervalo mínimo entre gravações intermediárias do manifesto
+MANIFEST_FLUSH_SECONDS = 5.0
+
+# Versão que produziu cada saída; mudança no parser ou no gerador força a reconversão
+BUILD_VERSION = f"{PARSER_VERSION}-{GENERATOR_VERSION}"
+
+@dataclass
+class ManifestEntry:
+    """Resultado da conversão de um arquivo KTR"""
+    file: str
+    sha256: str
+    status: str  # "success", "error"
+    duration: float = 0.0
+    pipeline_name: Optional[str] = None
+    output_dir: Optional[str] = None
+    error: Optional[str] = None
+    version: Optional[str] = None  # BUILD_VERSION da conversão (ausente em manifestos antigos)
+    options: Optional[Dict[str, Any]] = None  # opções do CodeGenerator usadas na conversão
+    converted_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+class ConversionManifest:
+    """Manifesto JSON com o status de cada arquivo convertido"""
+
+    def __init__(self, output_dir: str):
+        self.path = Path(output_dir) / MANIFEST_FILE
+        self.entries: Dict[str, ManifestEntry] = {}
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for entry_data in data.get("files", []):
+                entry = ManifestEntry(**entry_data)
+                self.entries[entry.file] = entry
+        except (json.JSONDecodeError, TypeError) as e:
+            logger.warning(f"⚠️ Manifesto inválido ignorado ({self.path}): {e}")
+
+    def is_up_to_date(self, file_key: str, sha256: str, output_dir: Optional[str] = None,
+                      options: Optional[Dict[str, Any]] = None) -> bool:
+        """Arquivo já convertido com sucesso, pela versão e opções atuais e sem alterações desde então"""
+        entry = self.entries.get(file_key)
+        return (
+            entry is not None
+            and entry.status == "success"
+            and entry.sha256 == sha256
+            and entry.version == BUILD_VERSION
+            and entry.output_dir is not None
+            and (output_dir is None or entry.output_dir == output_dir)
+            and (options is None or entry.options == options)
+            and Path(entry.output_dir).exists()
+        )
+
+    def update(self, entry: ManifestEntry):
+        self.entries[entry.file] = entry
+
+    def save(self):
+        """Gravação atômica do manifesto"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "updated_at": datetime.now().isoformat(),
+            "files": [asdict(entry) for entry in sorted(self.entries.values(), key=lambda e: e.file)],
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+@dataclass
+class BatchSummary:
+    """Resumo de uma execução em lote"""
+    total: int = 0
+    converted: int = 0
+    skipped: int = 0
+    errors: int = 0
+    wall_time: float = 0.0
+    worker_time: float = 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        processed = self.converted + self.errors
+        return processed / self.wall_time if self.wall_time > 0 else 0.0
+
+# Estado por processo: criado uma vez pelo initializer do pool
+_worker_state: Dict[str, Any] = {}
+
+def _init_worker(optimize: bool, use_cache: bool, options: Optional[Dict[str, Any]] = None):
+    """Cria parser, analisador e gerador reutilizados por todos os arquivos do worker"""
+    from src.parser.ktr_parser import KTRParser
+    from src.analyzer.pipeline_analyzer import PipelineAnalyzer
+    from src.generator.code_generator import CodeGenerator
+
+    _worker_state["parser"] = KTRParser()
+    _worker_state["analyzer"] = PipelineAnalyzer() if optimize else None
+    _worker_state["options"] = dict(options or {})
+    _worker_state["generator"] = CodeGenerator(**_worker_state["options"])
+    _worker_state["cache"] = KTRCache(enabled=use_cache)
+
+def output_dir_for(output_base: str, file_key: str) -> Path:
+    """
+    Diretório do projeto gerado para um KTR, derivado do seu caminho relativo
+
+    sub/carga.ktr vira <saída>/sub/carga. Arquivos fora do diretório de entrada
+    (chave absoluta ou com "..") usam o nome do arquivo com um sufixo de hash
+    do caminho, para não colidirem entre si.
+    """
+    key = Path(file_key)
+    if key.is_absolute() or ".." in key.parts:
+        digest = hashlib.sha256(file_key.encode("utf-8")).hexdigest()[:8]
+        return Path(output_base) / f"{key.stem}-{digest}"
+    return Path(output_base) / key.with_suffix("")
+
+def _convert_one(ktr_file: str, file_key: str, sha256: str, output_dir: str) -> ManifestEntry:
+    """Parse, análise e geração de um único arquivo (executado no worker)"""
+    start = time.perf_counter()
+    cache: KTRCache = _worker_state["cache"]
+
+    try:
+        ktr_model = cache.parse_file(ktr_file, _worker_state["parser"], content_hash=sha256)
+
+        if _worker_state["analyzer"] is not None:
+            cache.analyze(ktr_model, sha256, _worker_state["analyzer"])
+
+        _worker_state["generator"].generate_pipeline(ktr_model, output_dir)
+
+        return ManifestEntry(
+            file=file_key,
+            sha256=sha256,
+            status="success",
+            duration=time.perf_counter() - start,
+            pipeline_name=ktr_model.name,
+            output_dir=output_dir,
+            version=BUILD_VERSION,
+            options=_worker_state["options"],
+        )
+
+    except Exception as e:
+        return ManifestEntry(
+            file=file_key,
+            sha256=sha256,
+            status="error",
+            duration=time.perf_counter() - start,
+            error=str(e),
+            version=BUILD_VERSION,
+            options=_worker_state["options"],
+        )
+
+class BatchConverter:
+    """Orquestra a conversão em lote, sequencial ou com pool de processos"""
+
+    def __init__(self, input_dir: str, output_dir: str, jobs: int = 1, optimize: bool = False,
+                 use_cache: bool = True, force: bool = False, streaming: bool = False,
+                 chunk_size: Optional[int] = None, engine: str = "pandas", in_database: bool = True,
+                 pushdown: bool = True):
+        self.input_dir = Path(input_dir)
+        self.output_dir = Path(output_dir)
+        self.jobs = max(1, jobs)
+        self.optimize = optimize
+        self.use_cache = use_cache
+        self.force = force
+        # Opções do CodeGenerator: mudar qualquer uma muda o código gerado
+        self.options = {
+            "streaming": streaming,
+            "chunk_size": chunk_size,
+            "engine": engine,
+            "in_database": in_database,
+            "pushdown": pushdown,
+        }
+        self.manifest = ConversionManifest(str(self.output_dir))
+
+    def run(self, ktr_files: List[Path]) -> BatchSummary:
+        """Converte os arquivos e retorna o resumo de throughput"""
+        summary = BatchSummary(total=len(ktr_files))
+        start = time.perf_counter()
+
+        pending = []
+        for ktr_file in ktr_files:
+            file_key = self._file_key(ktr_file)
+            sha256 = KTRCache.hash_file(str(ktr_file))
+            output_dir = str(output_dir_for(str(self.output_dir), file_key))
+            if not self.force and self.manifest.is_up_to_date(file_key, sha256, output_dir, self.options):
+                summary.skipped += 1
+                logger.debug(f"⏭️ Sem alterações, pulando: {file_key}")
+                continue
+            pending.append((str(ktr_file), file_key, sha256, output_dir))
+
+        if summary.skipped:
+            logger.info(f"⏭️ {summary.skipped} arquivos inalterados pulados (manifesto)")
+
+        if pending:
+            if self.jobs == 1:
+                self._run_sequential(pending, summary)
+            else:
+                self._run_parallel(pending, summary)
+
+        self.manifest.save()
+        summary.wall_time = time.perf_counter() - start
+        return summary
+
+    def _run_sequential(self, pending: List[tuple], summary: BatchSummary):
+        _init_worker(self.optimize, self.use_cache, self.options)
+        last_flush = time.monotonic()
+        for args in pending:
+            logger.info(f"🔄 Processando: {args[1]}")
+            self._record(_convert_one(*args), summary)
+            last_flush = self._maybe_flush(last_flush)
+
+    def _run_parallel(self, pending: List[tuple], summary: BatchSummary):
+        workers = min(self.jobs, len(pending))
+        logger.info(f"⚡ Convertendo {len(pending)} arquivos com {workers} processos")
+
+        last_flush = time.monotonic()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.optimize, self.use_cache, self.options),
+        ) as pool:
+            futures = {pool.submit(_convert_one, *args): args for args in pending}
+            for future in as_completed(futures):
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    # Falha do próprio worker (ex.: processo encerrado)
+                    _, file_key, sha256, _ = futures[future]
+                    entry = ManifestEntry(file=file_key, sha256=sha256, status="error", error=str(e),
+                                          version=BUILD_VERSION, options=self.options)
+                self._record(entry, summary)
+                last_flush = self._maybe_flush(last_flush)
+
+    def _record(self, entry: ManifestEntry, summary: BatchSummary):
+        self.manifest.update(entry)
+        summary.worker_time += entry.duration
+        if entry.status == "success":
+            summary.converted += 1
+            logger.info(f"✅ {entry.file} convertido em {entry.duration:.2f}s")
+        else:
+            summary.errors += 1
+            logger.error(f"❌ Erro em {entry.file}: {entry.error}")
+
+    def _maybe_flush(self, last_flush: float) -> float:
+        """Grava o manifesto periodicamente para permitir retomar após falhas"""
+        now = time.monotonic()
+        if now - last_flush >= MANIFEST_FLUSH_SECONDS:
+            self.manifest.save()
+            return now
+        return last_flush
+
+    def _file_key(self, ktr_file: Path) -> str:
+        try:
+            return str(ktr_file.resolve().relative_to(self.input_dir.resolve()))
+        except ValueError:
+            return str(ktr_file)
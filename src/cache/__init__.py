@@ -0,0 +1 @@
+"""Cache persistente de parse e análise de KTRs"""
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""
+Cache persistente (endereçado por conteúdo) de KTRModel e AnalysisResult
+
+As entradas são identificadas pelo SHA-256 dos bytes do arquivo KTR somado à
+versão do parser (ou do analisador), serializadas em pickle compactado com
+zlib e removidas por ordem de último acesso (LRU) quando o tamanho total
+ultrapassa o limite configurado.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from loguru import logger
+
+from src.models.ktr_models import KTRModel
+from src.parser.ktr_parser import KTRParser, PARSER_VERSION
+from src.analyzer.pipeline_analyzer import PipelineAnalyzer, AnalysisResult, ANALYZER_VERSION
+
+# Versão do layout dos arquivos de cache
+CACHE_FORMAT_VERSION = 1
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("KTR_CACHE_DIR", Path.home() / ".cache" / "ktr_migrator"))
+DEFAULT_MAX_BYTES = int(os.environ.get("KTR_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+CACHE_SUFFIX = ".bin"
+
+
+class KTRCache:
+    """Cache em disco de modelos KTR e resultados de análise"""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES, enabled: bool = True):
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        """SHA-256 do conteúdo do arquivo"""
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def hash_file(file_path: str) -> str:
+        """SHA-256 de um arquivo lido em blocos"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def parse_file(self, ktr_file_path: str, parser: Optional[KTRParser] = None,
+                   content_hash: Optional[str] = None) -> KTRModel:
+        """Retorna o KTRModel do arquivo, reaproveitando o cache quando possível"""
+        content_hash = content_hash or self.hash_file(ktr_file_path)
+        parser = parser or KTRParser()
+        return self._get_or_compute(
+            self._model_key(content_hash),
+            lambda: parser.parse_file(ktr_file_path)
+        )
+
+    def parse_bytes(self, data: bytes, parser: Optional[KTRParser] = None) -> KTRModel:
+        """
+        Retorna o KTRModel a partir do conteúdo em memória (ex.: upload do Streamlit)
+
+        Um arquivo temporário só é escrito quando não há entrada em cache.
+        """
+        parser = parser or KTRParser()
+
+        def _parse() -> KTRModel:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".ktr") as tmp_file:
+                tmp_file.write(data)
+                tmp_path = tmp_file.name
+            try:
+                return parser.parse_file(tmp_path)
+            finally:
+                os.unlink(tmp_path)
+
+        return self._get_or_compute(self._model_key(self.hash_bytes(data)), _parse)
+
+    def analyze(self, ktr_model: KTRModel, content_hash: str,
+                analyzer: Optional[PipelineAnalyzer] = None) -> AnalysisResult:
+        """Retorna a análise do pipeline identificado por content_hash"""
+        analyzer = analyzer or PipelineAnalyzer()
+        return self._get_or_compute(
+            self._analysis_key(content_hash),
+            lambda: analyzer.analyze_pipeline(ktr_model)
+        )
+
+    def clear(self) -> int:
+        """Remove todas as entradas e retorna quantas foram apagadas"""
+        removed = 0
+        if self.cache_dir.exists():
+            for entry in self.cache_dir.glob(f"*{CACHE_SUFFIX}"):
+                entry.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def total_size(self) -> int:
+        """Tamanho total ocupado pelas entradas, em bytes"""
+        if not self.cache_dir.exists():
+            return 0
+        return sum(entry.stat().st_size for entry in self.cache_dir.glob(f"*{CACHE_SUFFIX}"))
+
+    def _model_key(self, content_hash: str) -> str:
+        return f"model-{CACHE_FORMAT_VERSION}-{PARSER_VERSION}-{content_hash}"
+
+    def _analysis_key(self, content_hash: str) -> str:
+        return f"analysis-{CACHE_FORMAT_VERSION}-{PARSER_VERSION}-{ANALYZER_VERSION}-{content_hash}"
+
+    def _get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Busca a entrada no disco ou calcula, grava e aplica a política LRU"""
+        if not self.enabled:
+            return compute()
+
+        cached = self._read(key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            logger.debug(f"⚡ Cache hit: {key[:48]}")
+            return cached
+
+        self.stats["misses"] += 1
+        value = compute()
+        self._write(key, value)
+        self._evict()
+        return value
+
+    def _read(self, key: str) -> Any:
+        path = self.cache_dir / f"{key}{CACHE_SUFFIX}"
+        try:
+            with open(path, "rb") as f:
+                value = pickle.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Entrada corrompida ou de uma versão incompatível das classes
+            logger.warning(f"⚠️ Entrada de cache inválida descartada ({path.name}): {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+        # Marca o acesso para a política LRU (atime não é confiável com noatime)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def _write(self, key: str, value: Any):
+        """Gravação atômica (arquivo temporário + rename)"""
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            payload = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 6)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, self.cache_dir / f"{key}{CACHE_SUFFIX}")
+        except Exception as e:
+            # Falha no cache nunca deve impedir o parse/análise
+            logger.warning(f"⚠️ Não foi possível gravar no cache: {e}")
+
+    def _evict(self):
+        """Remove as entradas menos recentemente usadas até caber no limite"""
+        entries = []
+        total = 0
+        for entry in self.cache_dir.glob(f"*{CACHE_SUFFIX}"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+            total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            entry.unlink(missing_ok=True)
+            total -= size
+            self.stats["evictions"] += 1
+            if total <= self.max_bytes:
+                break
@@ -2,6 +2,7 @@
 Gerador de código Python a partir de modelos KTR
 """
 import os
+import json
 from pathlib import Path
 from jinja2 import Environment, FileSystemLoader
 from typing import Dict, List, Any
@@ -10,14 +11,81 @@ from loguru import logger
 
 from src.models.ktr_models import (
     KTRModel, GeneratedProject, TableInputStep, 
-    TableOutputStep, ExcelInputStep, StringOperationsStep
+    TableOutputStep, ExcelInputStep, StringOperationsStep,
+    SelectValuesStep, FilterRowsStep, SortRowsStep, GroupByStep
 )
+from src.generator.dataflow import build_dataflow_plan, DataflowNode
+from src.generator.in_database import InDatabaseFlow, find_in_database_flows
+from src.generator.pushdown import filtered_sources, ordered_sources, push_down, required_columns
+from src.generator.dtypes import read_options, render_mapping, requires_pyarrow, sql_type, upstream_fields
+from src.generator.expressions import (
+    PANDAS_AGGREGATES, PANDAS_CASTS, POLARS_AGGREGATES, POLARS_CASTS, SQL_AGGREGATES, SQL_CASTS,
+    pandas_condition, polars_condition, quote_identifier, sql_condition, supported_aggregates
+)
+
+# Tamanho de chunk para ramos sem TableOutput (modo streaming)
+DEFAULT_CHUNK_SIZE = 10000
+
+# Linhas por ida ao banco nas leituras (yield_per / cursor no servidor)
+DEFAULT_FETCH_SIZE = 10000
+
+# Versão do código gerado; altere ao mudar templates ou a geração
+# (conversões em lote feitas por versões anteriores deixam de ser puladas)
+GENERATOR_VERSION = "1.5.0"
+
+# Bibliotecas de DataFrames suportadas no pipeline gerado
+ENGINES = ("pandas", "polars", "duckdb")
+
+# Linhas por lote Arrow entregue às cargas no engine DuckDB
+DUCKDB_BATCH_SIZE = 100000
+
+# Atributos de cursor ajustados por SGBD (Connection.type); PostgreSQL e MySQL
+# dependem apenas do cursor no servidor (stream_results)
+FETCH_CURSOR_ATTRIBUTES = {
+    "ORACLE": ["arraysize", "prefetchrows"],
+    "SQLSERVER": ["arraysize"],
+}
 
 class CodeGenerator:
     """Gerador principal de código Python"""
     
-    def __init__(self, templates_dir: str = None):
-        """Inicializa o gerador com diretório de templates"""
+    def __init__(self, templates_dir: str = None, streaming: bool = False, chunk_size: int = None,
+                 engine: str = "pandas", in_database: bool = True, pushdown: bool = True):
+        """
+        Inicializa o gerador com diretório de templates
+        
+        Com streaming=True o pipeline gerado processa os dados em chunks; o
+        tamanho padrão de cada ramo é o menor commit_size de suas saídas,
+        a menos que chunk_size seja informado.
+        
+        Com engine="polars" cada ramo vira um plano lazy do Polars, executado
+        por collect_all antes das cargas (streaming=True usa o engine de
+        streaming do Polars em vez dos chunks do pandas).
+        
+        Com engine="duckdb" as transformações de cada saída são compiladas em
+        uma única consulta SQL executada pelo DuckDB sobre as fontes extraídas.
+        
+        Com in_database=True (padrão) cadeias TableInput → ... → TableOutput na
+        mesma conexão, com steps traduzíveis para SQL padrão, viram um único
+        INSERT ... SELECT executado no próprio banco, em qualquer engine.
+        
+        Com pushdown=True (padrão) filtros, ordenações e o limite de linhas logo
+        após um TableInput são reescritos na própria consulta (WHERE, ORDER BY,
+        LIMIT), e as fontes leem só as colunas consumidas por algum destino
+        (SELECT reduzido, usecols no Excel); as reescritas ficam registradas em
+        docs/pushdown.json.
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Engine não suportado: {engine} (opções: {', '.join(ENGINES)})")
+        self.streaming = streaming
+        self.chunk_size = chunk_size
+        self.engine = engine
+        self.in_database = in_database
+        self.pushdown = pushdown
+        self._ordered_sources = set()
+        self._filtered_sources = set()
+        self._source_columns = {}
+        
         if templates_dir is None:
             current_dir = Path(__file__).parent
             templates_dir = current_dir.parent / "templates"
@@ -62,6 +130,10 @@ class CodeGenerator:
             f"tests/test_{ktr_model.name.lower()}_pipeline.py": test_content,
         }
         
+        # Consultas reescritas pelo pushdown, para auditoria
+        if template_data["pushdowns"]:
+            files["docs/pushdown.json"] = json.dumps(template_data["pushdowns"], indent=2, ensure_ascii=False)
+        
         # Gerar arquivos específicos de ETL
         extractor_files = self._generate_extractor_files(template_data)
         transformer_files = self._generate_transformer_files(template_data)
@@ -118,6 +190,17 @@ class CodeGenerator:
     def _prepare_template_data(self, ktr_model: KTRModel) -> Dict[str, Any]:
         """Prepara dados para os templates"""
         
+        # Filtros, ordenações, limites e colunas não consumidas vão para o SQL
+        # (no DuckDB a ordem de leitura não sobrevive ao plano: ordenações ficam nele)
+        pushdowns = []
+        if self.pushdown:
+            ktr_model, pushdowns = push_down(ktr_model, sort=self.engine != "duckdb")
+            for rewrite in pushdowns:
+                logger.info(f"🔽 Pushdown: {self._describe_pushdown(rewrite.to_dict())}")
+        self._ordered_sources = ordered_sources(pushdowns)
+        self._filtered_sources = filtered_sources(pushdowns)
+        self._source_columns = required_columns(ktr_model) if self.pushdown else {}
+        
         # Analisar steps
         extractors = []
         transformers = []
@@ -127,10 +210,69 @@ class CodeGenerator:
             if step.is_input:
                 extractors.append(self._create_extractor_config(step))
             elif step.is_output:
-                loaders.append(self._create_loader_config(step))
+                loaders.append(self._create_loader_config(step, self._loader_sql_types(ktr_model, step)))
             else:
                 transformers.append(self._create_transformer_config(step))
         
+        # Plano de execução seguindo os hops (ordem topológica, um frame por ramo)
+        plan = build_dataflow_plan(ktr_model)
+        # Ramos que rodam inteiros no banco (ELT): seus steps não viram métodos
+        in_database_flows = {
+            flow.target.name: flow for flow in find_in_database_flows(ktr_model)
+        } if self.in_database else {}
+        in_database_steps = {name for flow in in_database_flows.values() for name in flow.step_names}
+        configs = {c["name"]: c for c in extractors + transformers + loaders}
+        dataflow_steps = []
+        max_step_copies = 1
+        polars = self.engine == "polars"
+        duckdb = self.engine == "duckdb"
+        # No Polars e no DuckDB o streaming fica a cargo do próprio engine
+        streaming = self.streaming and self.engine == "pandas"
+        for node in plan.nodes:
+            if node.step.name in in_database_steps:
+                continue
+            step_data = {
+                "name": node.step.name,
+                "type": node.step.type.value,
+                "method_name": node.method_name,
+                "role": node.role,
+                "description": configs[node.step.name]["description"],
+                "generate_code": configs[node.step.name]["generate_code"],
+                "finalize_code": None,
+                "finalize_method": f"finalize_{node.identifier}",
+                "worker_function": None,
+            }
+            if polars:
+                # Planos lazy já usam todos os núcleos: cópias do step são ignoradas
+                step_data["generate_code"] = self._generate_polars_code(node, ktr_model)
+            elif duckdb:
+                step_data["generate_code"] = self._generate_duckdb_code(node, ktr_model)
+                if node.role == "load":
+                    step_data["finalize_code"] = self._generate_loader_finalize_code(node.step)
+            elif node.role == "transform" and node.step.copies > 1 and not node.is_breaker:
+                # Código do step vira função de módulo, executável em outros processos
+                step_data["worker_function"] = f"_{node.method_name}"
+                step_data["worker_code"] = step_data["generate_code"]
+                step_data["generate_code"] = self._generate_copies_code(node)
+                max_step_copies = max(max_step_copies, node.step.copies)
+            if streaming and node.role == "extract":
+                step_data["generate_code"] = self._generate_streaming_extractor_code(node.step)
+            elif streaming and node.role == "load":
+                step_data["generate_code"] = self._generate_loader_code(
+                    node.step, streaming=True, sql_types=self._loader_sql_types(ktr_model, node.step)
+                )
+                step_data["finalize_code"] = self._generate_loader_finalize_code(node.step)
+            dataflow_steps.append(step_data)
+        
+        if polars:
+            generate_branch = self._generate_polars_branch_code
+        elif duckdb:
+            generate_branch = self._generate_duckdb_branch_code
+        elif streaming:
+            generate_branch = self._generate_streaming_branch_code
+        else:
+            generate_branch = self._generate_branch_code
+        
         return {
             "pipeline_name": ktr_model.name,
             "pipeline_class_name": self._to_class_name(ktr_model.name),
@@ -138,13 +280,298 @@ class CodeGenerator:
             "source_ktr": f"{ktr_model.name}.ktr",
             "generation_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "connections": ktr_model.connections,
+            "default_fetch_size": DEFAULT_FETCH_SIZE,
+            "fetch_cursor_attributes": {
+                connection.name: FETCH_CURSOR_ATTRIBUTES.get(connection.type.upper(), [])
+                for connection in ktr_model.connections
+            },
             "extractors": extractors,
             "transformers": transformers,
             "loaders": loaders,
+            "dataflow_steps": dataflow_steps,
+            "dataflow_branches": [
+                {
+                    "method_name": f"_run_branch_{index}",
+                    "name": f"ramo_{index}",
+                    "steps": [node.step.name for node in branch],
+                    "generate_code": (
+                        self._generate_in_database_branch_code(in_database_flows[branch[-1].step.name])
+                        if branch[-1].step.name in in_database_flows else generate_branch(branch)
+                    ),
+                } for index, branch in enumerate(plan.branches, start=1)
+            ],
+            "skipped_steps": plan.skipped,
+            "in_database_flows": [flow.step_names for flow in in_database_flows.values()],
+            "pushdowns": [rewrite.to_dict() for rewrite in pushdowns],
+            "filtered_sources": sorted(self._filtered_sources),
+            "max_step_copies": max_step_copies,
+            "streaming": streaming,
+            "engine": self.engine,
+            "collect_engine": "streaming" if self.streaming else "auto",
+            "duckdb_batch_size": self.chunk_size or DUCKDB_BATCH_SIZE,
             "custom_imports": self._get_custom_imports(ktr_model),
             "required_fields": self._extract_required_fields(ktr_model)
         }
     
+    def _generate_copies_code(self, node: DataflowNode) -> str:
+        """Gera a chamada que distribui as linhas do step entre suas cópias"""
+        step = node.step
+        if step.partition_method == "mod" and step.partition_field:
+            origin = f"particionamento {step.partition_schema or 'mod'} pelo campo {step.partition_field}"
+            partition_field = f'"{step.partition_field}"'
+        else:
+            origin = "distribuição round-robin"
+            partition_field = "None"
+        
+        return f'''# Pentaho: {step.copies} cópias, {origin}
+df = self._run_copies("{step.name}", _{node.method_name}, df, copies={step.copies}, partition_field={partition_field})'''
+    
+    def _generate_branch_code(self, nodes: List[DataflowNode]) -> str:
+        """
+        Gera o corpo de um ramo: uma chamada por step na ordem topológica
+        
+        Cada step recebe o frame de seus predecessores (concatenados quando há
+        mais de um). Frames com vários consumidores são reutilizados, com cópia
+        apenas para transformações que ainda não são o último consumidor, e
+        liberados com del após o último uso.
+        """
+        lines = ["loaded = {}", ""]
+        
+        for node in nodes:
+            step_name = json.dumps(node.step.name, ensure_ascii=False)
+            connection = f", connection={json.dumps(node.connection, ensure_ascii=False)}" if node.connection else ""
+            
+            frames = []
+            for source in node.inputs:
+                copy = node.role == "transform" and source in node.copy_inputs and len(node.inputs) == 1
+                frames.append(f"df_{source}.copy()" if copy else f"df_{source}")
+            
+            if len(frames) > 1:
+                input_expr = f"pd.concat([{', '.join(frames)}], ignore_index=True)"
+            elif frames:
+                input_expr = frames[0]
+            else:
+                input_expr = "pd.DataFrame()"
+            
+            lines.append(f"# {node.step.name}")
+            
+            if node.role == "extract":
+                call = f'self._run_step("extract", {step_name}, self.{node.method_name}{connection})'
+                lines.append(f"{node.frame} = {call}")
+                lines.append(f"if not self.validate_data({node.frame}{self._allow_empty(node.step)}):")
+                message = json.dumps(f"Falha na validação de dados: {node.step.name}", ensure_ascii=False)
+                lines.append(f"    raise ValueError({message})")
+            
+            elif node.role == "transform":
+                call = f'self._run_step("transform", {step_name}, self.{node.method_name}, {input_expr}{connection})'
+                lines.append(f"{node.frame} = {call}" if node.consumers else call)
+            
+            else:
+                # Steps de saída repassam as linhas recebidas aos seus consumidores
+                if node.consumers:
+                    lines.append(f"{node.frame} = {input_expr}")
+                    input_expr = node.frame
+                lines.append(
+                    f'loaded[{step_name}] = self._run_step("load", {step_name}, self.{node.method_name}, {input_expr}{connection})'
+                )
+            
+            if node.role == "extract" and not node.consumers:
+                lines.append(f"del {node.frame}")
+            
+            if node.release:
+                lines.append(f"del {', '.join(f'df_{source}' for source in node.release)}")
+            
+            lines.append("")
+        
+        lines.append("return loaded")
+        return '\n'.join(lines)
+    
+    def _generate_streaming_branch_code(self, nodes: List[DataflowNode]) -> str:
+        """
+        Gera o corpo de um ramo em modo streaming
+        
+        O ramo é descrito como um dicionário step → especificação (função,
+        consumidores, número de entradas, conexão, se é bloqueante) executado
+        por _stream_branch no modelo push, chunk a chunk.
+        """
+        names = {node.identifier: json.dumps(node.step.name, ensure_ascii=False) for node in nodes}
+        
+        commit_sizes = [node.step.commit_size for node in nodes if isinstance(node.step, TableOutputStep)]
+        chunk_size = self.chunk_size or min(commit_sizes, default=DEFAULT_CHUNK_SIZE)
+        
+        lines = ["flow = {"]
+        for node in nodes:
+            entries = [
+                f'"stage": "{node.role}"',
+                f'"func": self.{node.method_name}',
+                f'"consumers": [{", ".join(names[c] for c in node.consumers)}]',
+                f'"inputs": {len(node.inputs)}',
+            ]
+            if node.connection:
+                entries.append(f'"connection": {json.dumps(node.connection, ensure_ascii=False)}')
+            if node.is_breaker:
+                entries.append('"breaker": True')
+            if node.role == "load" and self._generate_loader_finalize_code(node.step):
+                entries.append(f'"finalize": self.finalize_{node.identifier}')
+            lines.append(f"    {names[node.identifier]}: {{{', '.join(entries)}}},")
+        lines.append("}")
+        lines.append("")
+        lines.append(f'return self._stream_branch(flow, chunksize=self.config.get("chunk_size", {chunk_size}))')
+        return '\n'.join(lines)
+
+    def _generate_polars_branch_code(self, nodes: List[DataflowNode]) -> str:
+        """
+        Gera o corpo de um ramo com o engine Polars
+
+        Extrações materializam a fonte e a convertem em LazyFrame; transformações
+        apenas compõem o plano. Os planos de todas as saídas do ramo são
+        executados juntos (_collect_plans) e só então carregados, na ordem
+        topológica. LazyFrames são imutáveis: consumidores não precisam de cópia.
+        """
+        lines = ["loaded = {}", ""]
+        loads = []
+
+        for node in nodes:
+            step_name = json.dumps(node.step.name, ensure_ascii=False)
+            connection = f", connection={json.dumps(node.connection, ensure_ascii=False)}" if node.connection else ""
+
+            frames = [f"df_{source}" for source in node.inputs]
+            if len(frames) > 1:
+                input_expr = f'pl.concat([{", ".join(frames)}], how="diagonal_relaxed")'
+            elif frames:
+                input_expr = frames[0]
+            else:
+                input_expr = "pl.LazyFrame()"
+
+            if node.role == "load":
+                loads.append((node, step_name, connection, input_expr))
+                if node.consumers:
+                    # Saída que repassa as linhas: o plano de entrada segue adiante
+                    lines.append(f"# {node.step.name}")
+                    lines.append(f"{node.frame} = {input_expr}")
+                    lines.append("")
+                continue
+
+            lines.append(f"# {node.step.name}")
+            if node.role == "extract":
+                call = f'self._run_step("extract", {step_name}, self.{node.method_name}{connection})'
+                lines.append(f"{node.frame} = {call}")
+                lines.append(f"if not self.validate_data({node.frame}{self._allow_empty(node.step)}):")
+                message = json.dumps(f"Falha na validação de dados: {node.step.name}", ensure_ascii=False)
+                lines.append(f"    raise ValueError({message})")
+                lines.append(f"{node.frame} = {node.frame}.lazy()")
+            else:
+                lines.append(f"{node.frame} = self.{node.method_name}({input_expr})")
+            lines.append("")
+
+        if loads:
+            outputs = [f"out_{node.identifier}" for node, *_ in loads]
+            lines.append("# Planos das saídas executados juntos (subplanos comuns calculados uma vez)")
+            lines.append(f"[{', '.join(outputs)}] = self._collect_plans([{', '.join(expr for *_, expr in loads)}])")
+            for (node, step_name, connection, _), output in zip(loads, outputs):
+                lines.append(
+                    f'loaded[{step_name}] = self._run_step("load", {step_name}, self.{node.method_name}, {output}{connection})'
+                )
+                lines.append(f"del {output}")
+            lines.append("")
+
+        lines.append("return loaded")
+        return '\n'.join(lines)
+
+    def _generate_in_database_branch_code(self, flow: InDatabaseFlow) -> str:
+        """Gera o ramo executado inteiramente no banco de origem/destino (INSERT ... SELECT)"""
+        target = flow.target
+        step_name = json.dumps(target.name, ensure_ascii=False)
+        connection = json.dumps(flow.connection, ensure_ascii=False)
+        return f'''# {" → ".join(flow.step_names)}
+# Origem e destino na conexão {flow.connection}: o fluxo roda no banco, sem trafegar as linhas
+query = {self._python_string(flow.sql)}
+loaded = {{}}
+loaded[{step_name}] = self._run_step(
+    "load",
+    {step_name},
+    lambda: self._insert_select(
+        self.connections[{connection}],
+        query,
+        table="{target.table}",
+        schema="{target.schema}" or None,
+        truncate={target.truncate},
+        step_name={step_name}
+    ),
+    connection={connection}
+)
+return loaded'''
+
+    def _python_string(self, sql: str) -> str:
+        """SQL como literal Python legível (r-string: barras de expressões regulares chegam intactas)"""
+        if '"""' in sql or sql.endswith("\\"):
+            return repr(sql)
+        return f'r"""\n{sql}\n"""'
+
+    def _generate_duckdb_branch_code(self, nodes: List[DataflowNode]) -> str:
+        """
+        Gera o corpo de um ramo com o engine DuckDB
+
+        As fontes são gravadas em tabelas do DuckDB (lotes Arrow); cada
+        transformação devolve o SELECT sobre as relações de entrada e cada
+        saída executa uma única consulta com os steps a montante como CTEs,
+        deixando ao otimizador do DuckDB filtros, projeções e paralelismo.
+        """
+        relation_nodes = [node for node in nodes if node.role == "transform" or (node.role == "load" and node.consumers)]
+        relation_ids = {node.identifier for node in relation_nodes}
+        inputs = {node.identifier: node.inputs for node in nodes}
+
+        def upstream(node: DataflowNode) -> List[str]:
+            pending, found = list(node.inputs), set()
+            while pending:
+                identifier = pending.pop()
+                if identifier in relation_ids and identifier not in found:
+                    found.add(identifier)
+                    pending.extend(inputs[identifier])
+            return [other.identifier for other in relation_nodes if other.identifier in found]
+
+        lines = ["loaded = {}", "with self._duckdb_session() as con:"]
+        for node in nodes:
+            if node.role != "extract":
+                continue
+            step_name = json.dumps(node.step.name, ensure_ascii=False)
+            connection = f", connection={json.dumps(node.connection, ensure_ascii=False)}" if node.connection else ""
+            lines.append(f"    # {node.step.name}")
+            lines.append(f'    self._run_step("extract", {step_name}, self.{node.method_name}, con{connection})')
+            lines.append("")
+
+        if relation_nodes:
+            lines.append("    # SELECT de cada step intermediário sobre as relações de entrada")
+            lines.append("    relations = {")
+            for node in relation_nodes:
+                sql = f"self.{node.method_name}()" if node.role == "transform" else repr(self._duckdb_source(node))
+                lines.append(f'        "{node.identifier}": {sql},')
+            lines.append("    }")
+        else:
+            lines.append("    relations = {}")
+        lines.append("")
+
+        for node in nodes:
+            if node.role != "load":
+                continue
+            step_name = json.dumps(node.step.name, ensure_ascii=False)
+            connection = f", connection={json.dumps(node.connection, ensure_ascii=False)}" if node.connection else ""
+            finalize = f", finalize=self.finalize_{node.identifier}" if self._generate_loader_finalize_code(node.step) else ""
+            lines.append(f"    # {node.step.name}")
+            lines.append(f"    query = self._compile_plan(relations, {upstream(node)!r}, {self._duckdb_source(node)!r})")
+            lines.append(
+                f"    loaded[{step_name}] = self._load_query(con, query, {step_name}, self.{node.method_name}{connection}{finalize})"
+            )
+            lines.append("")
+
+        lines.append("return loaded")
+        return '\n'.join(lines)
+
+    def _duckdb_source(self, node: DataflowNode) -> str:
+        """SELECT que une as entradas do step (UNION ALL BY NAME quando há mais de uma)"""
+        selects = [f"SELECT * FROM {quote_identifier(source)}" for source in node.inputs]
+        return "\nUNION ALL BY NAME\n".join(selects) if selects else "SELECT NULL AS vazio WHERE FALSE"
+
     def _create_extractor_config(self, step) -> Dict[str, Any]:
         """Cria configuração para extractor"""
         config = {
@@ -173,7 +600,7 @@ class CodeGenerator:
         }
         return config
     
-    def _create_loader_config(self, step) -> Dict[str, Any]:
+    def _create_loader_config(self, step, sql_types: Dict[str, str] = None) -> Dict[str, Any]:
         """Cria configuração para loader"""
         config = {
             "name": step.name,
@@ -188,26 +615,52 @@ class CodeGenerator:
         if hasattr(step, 'schema'):
             config["schema"] = step.schema
             
-        config["generate_code"] = self._generate_loader_code(step)
+        config["generate_code"] = self._generate_loader_code(step, sql_types=sql_types)
         return config
     
     def _generate_extractor_code(self, step) -> str:
         """Gera código específico para extrator"""
         if isinstance(step, TableInputStep):
-            return f'''# Extração via SQL
-connection = self.connections["{step.connection_name}"]
-df = pd.read_sql("""{step.sql}""", connection)'''
+            return f'''# Extração via SQL (cursor no servidor, em lotes de fetch_size linhas)
+df = self._read_sql("""{step.sql}""", "{step.connection_name}", step_name="{step.name}"{self._ordered_argument(step)})'''
         
         elif isinstance(step, ExcelInputStep):
-            return f'''# Extração de Excel
+            # Só as colunas consumidas a jusante (planilhas com cabeçalho)
+            columns = self._source_columns.get(step.name) if step.header else None
+            fields = [f for f in step.fields if columns is None or f.name in columns]
+            dtypes, parse_dates = read_options(fields)
+            usecols = f",\n    usecols={sorted(columns)!r}" if columns else ""
+            return f'''# Extração de Excel (dtypes compactos a partir dos campos do KTR)
 df = pd.read_excel(
     "{step.file_path}",
     sheet_name="{step.sheet_name}",
-    header={0 if step.header else None}
+    header={0 if step.header else None},
+    dtype={render_mapping(dtypes) if dtypes else None},
+    parse_dates={parse_dates or False}{usecols}
 )'''
         
         return "# Extração genérica\ndf = pd.DataFrame()"
     
+    def _ordered_argument(self, step) -> str:
+        """Consulta com ORDER BY/LIMIT do pushdown: leitura única, sem faixas que desfariam a ordem ou o limite"""
+        return ", ordered=True" if step.name in self._ordered_sources else ""
+
+    def _allow_empty(self, step) -> str:
+        """Consulta com WHERE/LIMIT do pushdown: nenhuma linha é resultado válido do filtro absorvido"""
+        return ", allow_empty=True" if step.name in self._filtered_sources else ""
+    
+    def _generate_streaming_extractor_code(self, step) -> str:
+        """Gera extrator em chunks (gerador de DataFrames) para o modo streaming"""
+        if isinstance(step, TableInputStep):
+            return f'''# Extração via SQL em chunks (cursor no servidor)
+yield from self._read_sql_chunks("""{step.sql}""", "{step.connection_name}", chunksize, step_name="{step.name}"{self._ordered_argument(step)})'''
+        
+        # Fontes sem leitura incremental são lidas inteiras e fatiadas
+        code = self._generate_extractor_code(step)
+        return code + '''
+for start in range(0, len(df), chunksize):
+    yield df.iloc[start:start + chunksize]'''
+    
     def _generate_transformer_code(self, step) -> str:
         """Gera código específico para transformador"""
         if isinstance(step, StringOperationsStep):
@@ -228,40 +681,378 @@ df = pd.read_excel(
                     code_lines.append(f"df['{field_name}'] = df['{field_name}'].str.upper()")
             
             return '\n'.join(code_lines) if code_lines else "# Sem transformações"
-        
+
+        elif isinstance(step, SelectValuesStep):
+            code_lines = []
+            if step.fields:
+                selected = [f["name"] for f in step.fields]
+                if step.select_unspecified:
+                    code_lines.append(f"df = df[{selected!r} + [c for c in df.columns if c not in {selected!r}]]")
+                else:
+                    code_lines.append(f"df = df[{selected!r}]")
+                renames = {f["name"]: f["rename"] for f in step.fields if f["rename"]}
+                if renames:
+                    code_lines.append(f"df = df.rename(columns={renames!r})")
+            if step.remove:
+                code_lines.append(f"df = df.drop(columns={step.remove!r})")
+            meta_renames = {m["name"]: m["rename"] for m in step.meta if m["rename"]}
+            if meta_renames:
+                code_lines.append(f"df = df.rename(columns={meta_renames!r})")
+            for meta in step.meta:
+                name = meta["rename"] or meta["name"]
+                if meta["type"] in PANDAS_CASTS:
+                    code_lines.append(f"df[{name!r}] = " + PANDAS_CASTS[meta["type"]].format(column=f"df[{name!r}]"))
+
+            return '\n'.join(code_lines) if code_lines else "# Sem transformações"
+
+        elif isinstance(step, FilterRowsStep):
+            return f'''# Filtro: linhas em que a condição é verdadeira (NULL: `<>` verdadeiro, demais comparações falsas)
+mask = {pandas_condition(step.condition)}
+df = df[mask.fillna(False).astype(bool)]'''
+
+        elif isinstance(step, SortRowsStep):
+            if not step.fields:
+                return "# Sem campos de ordenação"
+            names = [f["name"] for f in step.fields]
+            ascending = [f["ascending"] for f in step.fields]
+            # Nulos primeiro, como no Pentaho; sort estável preserva a ordem de chegada nos empates
+            code = f'''df = df.sort_values(
+    by={names!r},
+    ascending={ascending!r},
+    kind="stable",
+    na_position="first",
+    ignore_index=True'''
+            insensitive = [f["name"] for f in step.fields if not f["case_sensitive"]]
+            if insensitive:
+                code += f''',
+    key=lambda column: column.str.lower() if column.name in {insensitive!r} and pd.api.types.is_string_dtype(column) else column'''
+            code += "\n)"
+            if step.unique_rows:
+                code += f"\ndf = df.drop_duplicates(subset={names!r}, ignore_index=True)"
+            return code
+
+        elif isinstance(step, GroupByStep):
+            aggregates = supported_aggregates(step.aggregates, step.name)
+            group = step.group_fields or ["_grupo"]
+            entries = []
+            for aggregate in aggregates:
+                column = aggregate["subject"] or group[0]
+                entries.append(f"    {aggregate['name']!r}: ({column!r}, {PANDAS_AGGREGATES[aggregate['type']]}),")
+            aggregations = "{\n" + "\n".join(entries) + "\n}"
+            if step.group_fields:
+                # sort=False: grupos na ordem de chegada (entrada ordenada, como exige o Pentaho)
+                return f'''df = df.groupby({step.group_fields!r}, sort=False, dropna=False).agg(**{aggregations}).reset_index()'''
+            return f'''# Agregação sobre todas as linhas
+df = df.assign(_grupo=0).groupby("_grupo").agg(**{aggregations}).reset_index(drop=True)'''
+
+        return "# Transformação genérica"
+
+    def _generate_polars_code(self, node: DataflowNode, ktr_model: KTRModel) -> str:
+        """Gera o corpo do método do step para o engine Polars"""
+        step = node.step
+        if node.role == "extract":
+            if isinstance(step, TableInputStep):
+                return f'''# Extração via SQL direto para Arrow (cursor no servidor, em lotes de fetch_size linhas)
+df = self._read_polars("""{step.sql}""", "{step.connection_name}", step_name="{step.name}"{self._ordered_argument(step)})'''
+            # Demais fontes são lidas pelo pandas e convertidas
+            return self._generate_extractor_code(step) + "\ndf = pl.from_pandas(df)"
+
+        if node.role == "load":
+            code = self._generate_loader_code(step, sql_types=self._loader_sql_types(ktr_model, step))
+            return f'''# Rotinas de carga (COPY/staging/upsert) recebem o frame em pandas, sobre os buffers Arrow
+df = df.to_pandas(use_pyarrow_extension_array=True)
+{code}'''
+
+        return self._generate_polars_transformer_code(step)
+
+    def _generate_polars_transformer_code(self, step) -> str:
+        """Gera a transformação como composição do plano lazy (pl.LazyFrame)"""
+        if isinstance(step, StringOperationsStep):
+            expressions = []
+            for op in step.operations:
+                methods = ""
+                if op['trim_type'] == 'both':
+                    methods += ".str.strip_chars()"
+                elif op['trim_type'] == 'left':
+                    methods += ".str.strip_chars_start()"
+                elif op['trim_type'] == 'right':
+                    methods += ".str.strip_chars_end()"
+                if op['lower_upper'] == 'lower':
+                    methods += ".str.to_lowercase()"
+                elif op['lower_upper'] == 'upper':
+                    methods += ".str.to_uppercase()"
+                if methods:
+                    expressions.append(f"    pl.col({op['field_name']!r}){methods},")
+            if not expressions:
+                return "# Sem transformações"
+            return "df = df.with_columns(\n" + "\n".join(expressions) + "\n)"
+
+        elif isinstance(step, SelectValuesStep):
+            code_lines = []
+            if step.fields:
+                selected = [
+                    f"pl.col({f['name']!r}).alias({f['rename']!r})" if f["rename"] else f"pl.col({f['name']!r})"
+                    for f in step.fields
+                ]
+                if step.select_unspecified:
+                    selected.append(f"pl.exclude({', '.join(repr(f['name']) for f in step.fields)})")
+                code_lines.append(f"df = df.select({', '.join(selected)})")
+            if step.remove:
+                code_lines.append(f"df = df.drop({step.remove!r})")
+            meta_renames = {m["name"]: m["rename"] for m in step.meta if m["rename"]}
+            if meta_renames:
+                code_lines.append(f"df = df.rename({meta_renames!r})")
+            casts = []
+            for meta in step.meta:
+                name = meta["rename"] or meta["name"]
+                if meta["type"] in POLARS_CASTS:
+                    casts.append("    " + POLARS_CASTS[meta["type"]].format(column=f"pl.col({name!r})", name=name) + ",")
+            if casts:
+                if any("schema[" in cast for cast in casts):
+                    code_lines.append("schema = df.collect_schema()")
+                code_lines.append("df = df.with_columns(\n" + "\n".join(casts) + "\n)")
+
+            return '\n'.join(code_lines) if code_lines else "# Sem transformações"
+
+        elif isinstance(step, FilterRowsStep):
+            return f'''# Filtro: linhas em que a condição é verdadeira (NULL: `<>` verdadeiro, demais comparações falsas)
+df = df.filter({polars_condition(step.condition)})'''
+
+        elif isinstance(step, SortRowsStep):
+            if not step.fields:
+                return "# Sem campos de ordenação"
+            keys = []
+            for f in step.fields:
+                column = f"pl.col({f['name']!r})"
+                if not f["case_sensitive"]:
+                    column = f"{column}.str.to_lowercase() if schema[{f['name']!r}] == pl.String else {column}"
+                keys.append(column)
+            code = ""
+            if any(not f["case_sensitive"] for f in step.fields):
+                code += "schema = df.collect_schema()\n"
+            # Nulos primeiro, como no Pentaho; maintain_order preserva a ordem de chegada nos empates
+            code += f'''df = df.sort(
+    [{", ".join(keys)}],
+    descending={[not f["ascending"] for f in step.fields]!r},
+    nulls_last=False,
+    maintain_order=True
+)'''
+            if step.unique_rows:
+                names = [f["name"] for f in step.fields]
+                code += f'\ndf = df.unique(subset={names!r}, keep="first", maintain_order=True)'
+            return code
+
+        elif isinstance(step, GroupByStep):
+            aggregates = supported_aggregates(step.aggregates, step.name)
+            expressions = []
+            for aggregate in aggregates:
+                column = f"pl.col({aggregate['subject']!r})" if aggregate["subject"] else "pl.len()"
+                expression = POLARS_AGGREGATES[aggregate["type"]].format(column=column)
+                expressions.append(f"    {expression}.alias({aggregate['name']!r}),")
+            if step.group_fields:
+                # maintain_order: grupos na ordem de chegada (entrada ordenada, como exige o Pentaho)
+                return f"df = df.group_by({step.group_fields!r}, maintain_order=True).agg(\n" + "\n".join(expressions) + "\n)"
+            return "# Agregação sobre todas as linhas\ndf = df.select(\n" + "\n".join(expressions) + "\n)"
+
         return "# Transformação genérica"
     
-    def _generate_loader_code(self, step) -> str:
-        """Gera código específico para loader"""
+    def _generate_duckdb_code(self, node: DataflowNode, ktr_model: KTRModel) -> str:
+        """Gera o corpo do método do step para o engine DuckDB"""
+        step = node.step
+        if node.role == "extract":
+            relation = json.dumps(node.identifier)
+            step_name = json.dumps(step.name, ensure_ascii=False)
+            if isinstance(step, TableInputStep):
+                return f'''# Extração via SQL em lotes (cursor no servidor), gravados no DuckDB como Arrow
+chunks = self._read_sql_chunks(
+    """{step.sql}""",
+    "{step.connection_name}",
+    self.fetch_options["{step.connection_name}"]["execution"]["yield_per"],
+    step_name="{step.name}"{self._ordered_argument(step)}
+)
+return self._ingest(con, {relation}, chunks, {step_name})'''
+            return self._generate_extractor_code(step) + f"\nreturn self._ingest(con, {relation}, [df], {step_name})"
+
+        if node.role == "load":
+            # Cargas recebem lotes do resultado; a publicação da staging fica na finalização
+            return self._generate_loader_code(step, streaming=True, sql_types=self._loader_sql_types(ktr_model, step))
+
+        source = self._duckdb_source(node)
+        if len(node.inputs) > 1:
+            source = f"(\n{source}\n)"
+        else:
+            source = source[len("SELECT * FROM "):] if node.inputs else f"({source})"
+        comment, sql = self._generate_sql_transformer(step, source)
+        return f"# {comment}\nreturn {self._python_string(sql)}"
+
+    def _generate_sql_transformer(self, step, source: str) -> tuple:
+        """Traduz a transformação em um SELECT (dialeto DuckDB) sobre source; retorna (comentário, SQL)"""
+        if isinstance(step, StringOperationsStep):
+            replaces = []
+            for op in step.operations:
+                column = quote_identifier(op["field_name"])
+                expression = column
+                if op["trim_type"] in ("both", "left", "right"):
+                    function = {"both": "trim", "left": "ltrim", "right": "rtrim"}[op["trim_type"]]
+                    expression = f"{function}({expression})"
+                if op["lower_upper"] in ("lower", "upper"):
+                    expression = f"{op['lower_upper']}({expression})"
+                if expression != column:
+                    replaces.append(f"{expression} AS {column}")
+            if not replaces:
+                return "Sem transformações", f"SELECT * FROM {source}"
+            return "Operações de texto", f"SELECT * REPLACE ({', '.join(replaces)})\nFROM {source}"
+
+        elif isinstance(step, SelectValuesStep):
+            sql = f"SELECT * FROM {source}"
+            if step.fields:
+                selected = [
+                    f"{quote_identifier(f['name'])} AS {quote_identifier(f['rename'])}" if f["rename"]
+                    else quote_identifier(f["name"])
+                    for f in step.fields
+                ]
+                if step.select_unspecified:
+                    selected.append(f"* EXCLUDE ({', '.join(quote_identifier(f['name']) for f in step.fields)})")
+                sql = f"SELECT {', '.join(selected)}\nFROM {source}"
+            if step.remove:
+                sql = f"SELECT * EXCLUDE ({', '.join(map(quote_identifier, step.remove))})\nFROM ({sql})"
+            meta_renames = [m for m in step.meta if m["rename"]]
+            if meta_renames:
+                renames = ", ".join(f"{quote_identifier(m['name'])} AS {quote_identifier(m['rename'])}" for m in meta_renames)
+                sql = f"SELECT * RENAME ({renames})\nFROM ({sql})"
+            casts = []
+            for meta in step.meta:
+                name = quote_identifier(meta["rename"] or meta["name"])
+                if meta["type"] in SQL_CASTS:
+                    casts.append(f"CAST({name} AS {SQL_CASTS[meta['type']]}) AS {name}")
+            if casts:
+                sql = f"SELECT * REPLACE ({', '.join(casts)})\nFROM ({sql})"
+            return "Seleção de campos", sql
+
+        elif isinstance(step, FilterRowsStep):
+            # WHERE descarta as linhas em que a condição é falsa ou nula
+            return "Filtro: linhas em que a condição é verdadeira", f"SELECT * FROM {source}\nWHERE {sql_condition(step.condition)}"
+
+        elif isinstance(step, SortRowsStep):
+            if not step.fields:
+                return "Sem campos de ordenação", f"SELECT * FROM {source}"
+            keys = []
+            for f in step.fields:
+                column = quote_identifier(f["name"])
+                direction = "ASC" if f["ascending"] else "DESC"
+                if not f["case_sensitive"]:
+                    keys.append(
+                        f"CASE WHEN typeof({column}) = 'VARCHAR' THEN lower(CAST({column} AS VARCHAR)) END {direction} NULLS FIRST"
+                    )
+                keys.append(f"{column} {direction} NULLS FIRST")
+            distinct = ""
+            if step.unique_rows:
+                distinct = f"DISTINCT ON ({', '.join(quote_identifier(f['name']) for f in step.fields)}) "
+            # Nulos primeiro, como no Pentaho
+            return "Ordenação", f"SELECT {distinct}* FROM {source}\nORDER BY {', '.join(keys)}"
+
+        elif isinstance(step, GroupByStep):
+            aggregates = supported_aggregates(step.aggregates, step.name)
+            selected = [quote_identifier(name) for name in step.group_fields]
+            for aggregate in aggregates:
+                column = quote_identifier(aggregate["subject"]) if aggregate["subject"] else "*"
+                expression = SQL_AGGREGATES[aggregate["type"]].format(column=column)
+                selected.append(f"{expression} AS {quote_identifier(aggregate['name'])}")
+            sql = f"SELECT {', '.join(selected)}\nFROM {source}"
+            if step.group_fields:
+                return "Agregação por grupo", sql + f"\nGROUP BY {', '.join(map(quote_identifier, step.group_fields))}"
+            return "Agregação sobre todas as linhas", sql
+
+        return "Transformação genérica", f"SELECT * FROM {source}"
+
+    def _loader_sql_types(self, ktr_model: KTRModel, step) -> Dict[str, str]:
+        """Tipos SQLAlchemy das colunas do destino a partir dos campos declarados a montante"""
+        mapping = getattr(step, "field_mapping", {})
+        sql_types = {}
+        for field in upstream_fields(ktr_model, step.name):
+            expression = sql_type(field)
+            if expression:
+                sql_types[mapping.get(field.name, field.name)] = expression
+        return sql_types
+    
+    def _generate_loader_code(self, step, streaming: bool = False, sql_types: Dict[str, str] = None) -> str:
+        """
+        Gera código específico para loader
+        
+        Com truncate=Y os dados vão para uma tabela de staging e o destino é
+        substituído em uma única transação (_publish_staging), preservando seu
+        DDL. Em modo streaming cada chunk vai para a staging e a publicação
+        fica em _generate_loader_finalize_code, executada após o último chunk.
+        """
         if isinstance(step, TableOutputStep):
-            schema_table = f"{step.schema}.{step.table}" if step.schema else step.table
-            
             code = f'''# Carga para PostgreSQL
 connection = self.connections["{step.connection_name}"]
-
-# {'Truncar tabela antes da carga' if step.truncate else 'Inserção incremental'}
 '''
-            if step.truncate:
-                code += f'''with connection.begin() as conn:
-    conn.execute(sa.text("TRUNCATE TABLE {schema_table}"))
-    logger.info("🗑️ Tabela truncada: {schema_table}")
-'''
-            
-            code += f'''
-df.to_sql(
-    name="{step.table}",
-    schema="{step.schema}" if "{step.schema}" else None,
-    con=connection,
-    if_exists="{'replace' if step.truncate else 'append'}",
-    index=False,
-    method="multi",
-    chunksize={step.commit_size}
+            # Tipos das colunas ao criar tabelas (destino/staging) a partir dos campos do KTR
+            hints = f",\n    dtype={render_mapping(sql_types)}" if sql_types else ""
+            if step.load_mode in ("upsert", "update"):
+                code += "\n" + self._generate_merge_code(step, hints)
+            elif step.truncate:
+                code += f'''
+# Truncar e recarregar via staging (destino substituído em uma transação)
+self._stage_frame(
+    connection,
+    {self._target_frame(step)},
+    table="{step.table}",
+    schema="{step.schema}" or None,
+    chunksize={step.commit_size}{hints}
+)'''
+                if not streaming:
+                    code += "\n" + self._generate_loader_finalize_code(step)
+            else:
+                code += f'''
+# Inserção incremental
+self._write_frame(
+    connection,
+    {self._target_frame(step)},
+    table="{step.table}",
+    schema="{step.schema}" or None,
+    if_exists="append",
+    chunksize={step.commit_size}{hints}
 )'''
             
             return code
         
         return "# Carga genérica"
     
+    def _target_frame(self, step: TableOutputStep) -> str:
+        """Frame gravado no destino: com campos especificados, só chaves e campos mapeados, renomeados para as colunas"""
+        if not (step.field_mapping or step.key_fields):
+            return "df"
+        streams = list(step.key_fields) + [s for s in step.field_mapping if s not in step.key_fields]
+        return f"df[{streams!r}].rename(columns={ {**step.field_mapping, **step.key_fields}!r})"
+    
+    def _generate_merge_code(self, step: TableOutputStep, hints: str = "") -> str:
+        """Gera o upsert (InsertUpdate) ou update em lote pelas colunas-chave do step"""
+        keys = list(step.key_fields.values())
+        frame = self._target_frame(step)
+        update_columns = step.update_columns if (step.update_columns or step.field_mapping) else None
+        label = "Upsert" if step.load_mode == "upsert" else "Atualização"
+        
+        return f'''# {label} em lote (chaves: {", ".join(keys) or "não definidas"})
+self._merge_frame(
+    connection,
+    {frame},
+    table="{step.table}",
+    schema="{step.schema}" or None,
+    keys={keys!r},
+    update_columns={update_columns!r},
+    insert={step.load_mode == "upsert"},
+    chunksize={step.commit_size}{hints}
+)'''
+    
+    def _generate_loader_finalize_code(self, step) -> str:
+        """Gera a finalização do destino após a carga (publicação da staging), se houver"""
+        if isinstance(step, TableOutputStep) and step.truncate and step.load_mode == "insert":
+            return f'''self._publish_staging(self.connections["{step.connection_name}"], "{step.table}", "{step.schema}" or None)'''
+        
+        return ""
+    
     def _generate_main_pipeline(self, template_data: Dict[str, Any]) -> str:
         """Gera arquivo principal do pipeline"""
         template = self.jinja_env.get_template("base_pipeline.py.j2")
@@ -315,8 +1106,13 @@ PIPELINE_CONFIG = {{
             "pandas>=2.0.0",
             "sqlalchemy>=2.0.0", 
             "loguru>=0.7.0",
-            "python-decouple>=3.8"
+            "python-decouple>=3.8",
+            "pyarrow>=14.0.0"
         ]
+        if template_data.get("engine") == "polars":
+            base_requirements.append("polars>=1.30.0")
+        elif template_data.get("engine") == "duckdb":
+            base_requirements.append("duckdb>=1.1.0")
         
         # Adicionar dependências específicas baseadas nos steps
         for extractor in template_data["extractors"]:
@@ -327,8 +1123,22 @@ PIPELINE_CONFIG = {{
         
         return '\n'.join(sorted(set(base_requirements)))
     
+    def _describe_pushdown(self, rewrite: Dict[str, str]) -> str:
+        """Resumo de uma reescrita do pushdown (logs e README)"""
+        if rewrite["clause"] == "SELECT":
+            return f"`{rewrite['source']}`: SELECT reduzido às colunas consumidas a jusante"
+        return f"`{rewrite['step']}` → {rewrite['clause']} na consulta de `{rewrite['source']}`"
+    
     def _generate_readme(self, template_data: Dict[str, Any]) -> str:
         """Gera arquivo README.md"""
+        pushdown = ""
+        if template_data["pushdowns"]:
+            lines = "\n".join(f"- {self._describe_pushdown(rewrite)}" for rewrite in template_data["pushdowns"])
+            pushdown = f"""
+## Pushdown para o SQL
+Steps levados para a consulta de origem (SQL antes/depois em `docs/pushdown.json`):
+{lines}
+"""
         return f'''# Pipeline {template_data["pipeline_name"]}
 
 Pipeline ETL gerado automaticamente do KTR: {template_data["source_ktr"]}
@@ -340,7 +1150,7 @@ Pipeline ETL gerado automaticamente do KTR: {template_data["source_ktr"]}
 - **Extractors**: {len(template_data["extractors"])} configurados
 - **Transformers**: {len(template_data["transformers"])} configurados  
 - **Loaders**: {len(template_data["loaders"])} configurados
-
+{pushdown}
 ## Instalação
 ```bash
 pip install -r requirements.txt
@@ -367,12 +1177,39 @@ Logs são gerados em: `logs/{template_data["pipeline_name"].lower()}_YYYYMMDD.lo
     
     def _generate_tests(self, template_data: Dict[str, Any]) -> str:
         """Gera arquivo de testes"""
+        sql_extract_methods = [
+            step["method_name"] for step in template_data["dataflow_steps"] if step["type"] == "TableInput"
+        ]
+        
+        # Leituras em lotes (chunksize) pelo cursor no servidor; no modo
+        # streaming os extratores são geradores de chunks
+        mock_setup = '''mock_read_sql.side_effect = lambda *args, **kwargs: iter([mock_df]) if kwargs.get("chunksize") else mock_df
+        self.pipeline.connections = {name: MagicMock() for name in self.pipeline.connections}'''
+        if template_data.get("streaming"):
+            extract_call = "pd.concat(getattr(self.pipeline, method_name)(1000))"
+        else:
+            extract_call = "getattr(self.pipeline, method_name)()"
+        extract_lines = f"result = {extract_call}"
+        
+        # Engine Polars: frames pl.DataFrame e leitura via pl.read_database (em lotes)
+        frames, read_target, imports = "pd", "pandas.read_sql", "import pandas as pd"
+        if template_data.get("engine") == "polars":
+            frames, read_target, imports = "pl", "polars.read_database", "import pandas as pd\nimport polars as pl"
+            mock_setup = '''mock_read_sql.side_effect = lambda *args, **kwargs: iter([mock_df])
+        self.pipeline.connections = {name: MagicMock() for name in self.pipeline.connections}'''
+        elif template_data.get("engine") == "duckdb":
+            # Extratores gravam em tabelas do DuckDB com o nome do step
+            imports = "import duckdb\nimport pandas as pd"
+            extract_lines = '''con = duckdb.connect()
+            getattr(self.pipeline, method_name)(con)
+            result = con.table(method_name.removeprefix("extract_")).df()'''
+        
         return f'''"""
 Testes para pipeline {template_data["pipeline_name"]}
 """
 import pytest
-import pandas as pd
-from unittest.mock import Mock, patch
+{imports}
+from unittest.mock import MagicMock, Mock, patch
 
 from src.pipelines.{template_data["pipeline_name"].lower()}_pipeline import {template_data["pipeline_class_name"]}
 
@@ -394,39 +1231,38 @@ class Test{template_data["pipeline_class_name"]}:
     
     def test_data_validation_empty_dataframe(self):
         """Testa validação com DataFrame vazio"""
-        df_empty = pd.DataFrame()
+        df_empty = {frames}.DataFrame()
         assert not self.pipeline.validate_data(df_empty)
     
     def test_data_validation_valid_dataframe(self):
         """Testa validação com DataFrame válido"""
-        df_valid = pd.DataFrame({{"col1": [1, 2, 3], "col2": ["a", "b", "c"]}})
+        df_valid = {frames}.DataFrame({{"col1": [1, 2, 3], "col2": ["a", "b", "c"]}})
         assert self.pipeline.validate_data(df_valid)
     
-    @patch('pandas.read_sql')
-    def test_extract_data(self, mock_read_sql):
-        """Testa extração de dados"""
+    @patch('{read_target}')
+    def test_sql_extractors(self, mock_read_sql):
+        """Testa extratores SQL do pipeline"""
         # Mock da resposta
-        mock_df = pd.DataFrame({{"test_col": [1, 2, 3]}})
-        mock_read_sql.return_value = mock_df
+        mock_df = {frames}.DataFrame({{"test_col": [1, 2, 3]}})
+        {mock_setup}
         
-        # Executar teste
-        result = self.pipeline.extract_data()
+        extract_methods = {sql_extract_methods}
+        if not extract_methods:
+            pytest.skip("Pipeline sem extratores SQL")
         
-        # Verificações
-        assert len(result) == 3
-        assert "test_col" in result.columns
+        for method_name in extract_methods:
+            {extract_lines}
+            
+            # Verificações
+            assert len(result) == 3
+            assert "test_col" in result.columns
     
     def test_run_pipeline_success(self):
         """Testa execução completa do pipeline"""
-        with patch.object(self.pipeline, 'extract_data') as mock_extract, \\
-             patch.object(self.pipeline, 'transform_data') as mock_transform, \\
-             patch.object(self.pipeline, 'load_data') as mock_load:
+        with patch.object(self.pipeline, 'execute_dataflow') as mock_dataflow:
             
             # Setup mocks
-            test_df = pd.DataFrame({{"col1": [1, 2, 3]}})
-            mock_extract.return_value = test_df
-            mock_transform.return_value = test_df
-            mock_load.return_value = None
+            mock_dataflow.return_value = {{"destino": 3}}
             
             # Executar pipeline
             result = self.pipeline.run_pipeline()
@@ -439,7 +1275,9 @@ class Test{template_data["pipeline_class_name"]}:
     
     def _extract_dependencies(self, ktr_model: KTRModel) -> List[str]:
         """Extrai dependências necessárias do modelo"""
-        deps = ["pandas", "sqlalchemy", "loguru"]
+        deps = ["pandas", "sqlalchemy", "loguru", "pyarrow"]
+        if self.engine in ("polars", "duckdb"):
+            deps.append(self.engine)
         
         for step in ktr_model.steps:
             if step.type.value == "ExcelInput":
@@ -458,6 +1296,17 @@ class Test{template_data["pipeline_class_name"]}:
             if step.type.value in ["TableInput", "TableOutput"]:
                 imports.append("from sqlalchemy import text")
         
+        # Decimais do KTR (BigNumber) viram pd.ArrowDtype(pa.decimal128(...))
+        if requires_pyarrow(ktr_model):
+            imports.append("import pyarrow as pa")
+        
+        if self.engine == "polars":
+            imports.append("import polars as pl")
+        elif self.engine == "duckdb":
+            imports.append("import duckdb")
+            if "import pyarrow as pa" not in imports:
+                imports.append("import pyarrow as pa")
+        
         return imports
     
     def _extract_required_fields(self, ktr_model: KTRModel) -> List[str]:
@@ -614,10 +1463,17 @@ class Test{template_data["pipeline_class_name"]}:
 {extractor['description']}
 Gerado automaticamente do KTR: {template_data['source_ktr']}
 """
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from itertools import islice
+import re
+import threading
 import pandas as pd
+{chr(10).join(line for line in template_data['custom_imports'] if 'pyarrow' in line)}
+import sqlalchemy as sa
 from sqlalchemy import create_engine, text
 from loguru import logger
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional
 from ..utils.database_utils import DatabaseUtils
 from ..utils.validation_utils import ValidationUtils
 
@@ -627,9 +1483,17 @@ class {class_name}:
     Tipo: {extractor['type']}
     """
     
-    def __init__(self, connections: Dict[str, Any]):
+    def __init__(self, connections: Dict[str, Any], fetch_size: int = {template_data['default_fetch_size']},
+                 config: Optional[Dict[str, Any]] = None):
         self.connections = connections
         self.validator = ValidationUtils()
+        self.config = config or {{}}
+        self.connection_slots = {{}}
+        self.metrics = {{"partitions": {{}}}}
+        self._metrics_lock = threading.Lock()
+        self.fetch_options = {{}}
+        for connection_name, cursor_attributes in {template_data['fetch_cursor_attributes']!r}.items():
+            self._set_fetch_size(connection_name, fetch_size, cursor_attributes)
         
     def extract(self) -> pd.DataFrame:
         """
@@ -661,7 +1525,8 @@ class {class_name}:
             "extracted_at": "datetime",
             "source": "string"
         }}
-'''
+    
+{self._render_extractor_helpers()}'''
     
     def _generate_transformer_file_content(self, transformer: Dict[str, Any], template_data: Dict[str, Any]) -> str:
         """Gera conteúdo do arquivo transformer"""
@@ -736,7 +1601,10 @@ class {class_name}:
 {loader['description']}
 Gerado automaticamente do KTR: {template_data['source_ktr']}
 """
+import io
+import time
 import pandas as pd
+import sqlalchemy as sa
 from sqlalchemy import create_engine, text
 from loguru import logger
 from typing import Dict, Any, Optional
@@ -753,6 +1621,7 @@ class {class_name}:
         self.connections = connections
         self.db_utils = DatabaseUtils()
         self.validator = ValidationUtils()
+        self._staged_tables = {{}}
         
     def load(self, df: pd.DataFrame) -> Dict[str, Any]:
         """
@@ -802,7 +1671,16 @@ class {class_name}:
             # Definir schema baseado no destino
             "loaded_at": "datetime"
         }}
-'''
+    
+{self._render_loader_helpers()}'''
+    
+    def _render_extractor_helpers(self) -> str:
+        """Métodos de leitura (cursor no servidor) compartilhados pelo pipeline e pelos extractors"""
+        return self.jinja_env.get_template("extractor_helpers.py.j2").render()
+    
+    def _render_loader_helpers(self) -> str:
+        """Métodos de gravação (COPY/to_sql) compartilhados pelo pipeline e pelos loaders"""
+        return self.jinja_env.get_template("loader_helpers.py.j2").render()
     
     def _generate_database_utils(self) -> str:
         """Gera arquivo database_utils.py"""
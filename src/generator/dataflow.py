@@ -0,0 +1,134 @@
+"""
+Plano de execução do pipeline gerado a partir do grafo de hops
+"""
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import networkx as nx
+
+from src.models.ktr_models import KTRModel, Step, StepType
+
+# Steps que precisam de todas as linhas antes de emitir (bloqueiam o streaming)
+PIPELINE_BREAKERS = {StepType.SORT_ROWS, StepType.GROUP_BY}
+
+@dataclass
+class DataflowNode:
+    """Step posicionado no plano de execução"""
+    step: Step
+    identifier: str                                    # sufixo seguro para métodos/variáveis
+    role: str                                          # "extract", "transform", "load"
+    inputs: List[str] = field(default_factory=list)    # identificadores dos steps de origem
+    consumers: List[str] = field(default_factory=list) # identificadores dos steps de destino
+    release: List[str] = field(default_factory=list)   # frames liberados após este step
+    copy_inputs: List[str] = field(default_factory=list)  # frames que ainda serão usados depois
+
+    @property
+    def method_name(self) -> str:
+        return f"{self.role}_{self.identifier}"
+
+    @property
+    def frame(self) -> str:
+        return f"df_{self.identifier}"
+
+    @property
+    def is_breaker(self) -> bool:
+        """Step bloqueante: materializa todos os chunks de entrada"""
+        return self.step.type in PIPELINE_BREAKERS
+
+    @property
+    def connection(self) -> Optional[str]:
+        """Conexão de banco usada pelo step, se houver"""
+        return getattr(self.step, "connection_name", "") or None
+
+@dataclass
+class DataflowPlan:
+    """Steps em ordem topológica com o ciclo de vida de cada DataFrame"""
+    nodes: List[DataflowNode] = field(default_factory=list)
+    branches: List[List[DataflowNode]] = field(default_factory=list)  # componentes independentes
+    skipped: List[str] = field(default_factory=list)   # steps sem caminho até uma saída
+
+    def get_node(self, identifier: str) -> DataflowNode:
+        return next(node for node in self.nodes if node.identifier == identifier)
+
+def to_identifier(name: str) -> str:
+    """Converte o nome do step em identificador Python (sem acentos, snake_case)"""
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    identifier = re.sub(r"\W+", "_", ascii_name).strip("_").lower() or "step"
+    if identifier[0].isdigit():
+        identifier = f"step_{identifier}"
+    return identifier
+
+def build_dataflow_plan(ktr_model: KTRModel) -> DataflowPlan:
+    """
+    Monta o plano de execução seguindo os hops habilitados
+
+    Steps que não alcançam nenhuma saída são descartados (evita leituras sem
+    destino) quando o KTR possui ao menos um step de saída.
+    """
+    graph = ktr_model.get_graph()
+
+    if not nx.is_directed_acyclic_graph(graph):
+        cycle = nx.find_cycle(graph)
+        raise ValueError(f"Hops formam um ciclo, impossível ordenar os steps: {cycle}")
+
+    # Steps com caminho até alguma saída
+    outputs = [step.name for step in ktr_model.get_output_steps() if step.name in graph]
+    if outputs:
+        relevant = set(outputs)
+        for output in outputs:
+            relevant.update(nx.ancestors(graph, output))
+    else:
+        relevant = set(graph.nodes())
+
+    # Ordem topológica estável (desempate pela ordem dos steps no KTR)
+    position = {step.name: i for i, step in enumerate(ktr_model.steps)}
+    order = [
+        name for name in nx.lexicographical_topological_sort(graph, key=lambda n: position.get(n, len(position)))
+        if name in relevant and ktr_model.get_step(name) is not None
+    ]
+
+    plan = DataflowPlan(skipped=[step.name for step in ktr_model.steps if step.name not in relevant])
+
+    identifiers: Dict[str, str] = {}
+    for name in order:
+        identifier = to_identifier(name)
+        candidate, suffix = identifier, 2
+        while candidate in identifiers.values():
+            candidate = f"{identifier}_{suffix}"
+            suffix += 1
+        identifiers[name] = candidate
+
+    for name in order:
+        step = ktr_model.get_step(name)
+        role = "extract" if step.is_input else "load" if step.is_output else "transform"
+        plan.nodes.append(DataflowNode(
+            step=step,
+            identifier=identifiers[name],
+            role=role,
+            inputs=[identifiers[p] for p in graph.predecessors(name) if p in identifiers],
+            consumers=[identifiers[s] for s in graph.successors(name) if s in identifiers],
+        ))
+
+    # Ciclo de vida: cada frame é liberado após seu último consumidor; antes
+    # disso, transformações recebem uma cópia para não afetar os demais ramos
+    last_use = {}
+    for index, node in enumerate(plan.nodes):
+        for source in node.inputs:
+            last_use[source] = index
+
+    for index, node in enumerate(plan.nodes):
+        for source in node.inputs:
+            if last_use[source] == index:
+                node.release.append(source)
+            else:
+                node.copy_inputs.append(source)
+
+    # Componentes fracamente conexos não trocam dados e podem rodar em paralelo
+    index_by_name = {node.step.name: index for index, node in enumerate(plan.nodes)}
+    components = nx.weakly_connected_components(graph.subgraph(index_by_name))
+    for component in sorted(components, key=lambda c: min(index_by_name[n] for n in c)):
+        plan.branches.append([plan.nodes[i] for i in sorted(index_by_name[n] for n in component)])
+
+    return plan
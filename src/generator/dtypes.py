@@ -0,0 +1,102 @@
+"""
+Mapeamento dos tipos de campo do Pentaho para dtypes compactos do pandas/Arrow
+"""
+from typing import Dict, List, Optional, Tuple
+
+import networkx as nx
+
+from src.models.ktr_models import Field, KTRModel
+
+# Maior número de dígitos representável com exatidão em float32
+FLOAT32_DIGITS = 7
+
+# Strings curtas (UF, sexo, situação...) costumam ser códigos de baixa cardinalidade
+CATEGORY_MAX_LENGTH = 3
+
+# Precisão máxima do decimal128 do Arrow
+DECIMAL_MAX_DIGITS = 38
+
+DATE_TYPES = {"Date", "Timestamp"}
+
+def pandas_dtype(field: Field) -> Optional[str]:
+    """
+    Expressão Python do dtype compacto para o campo (None = inferência do pandas)
+
+    Datas ficam de fora: são convertidas via parse_dates.
+    """
+    if field.type == "Integer":
+        return '"Int32"' if 0 < field.length <= 9 else '"Int64"'
+    if field.type == "Number":
+        return '"float32"' if 0 < field.length <= FLOAT32_DIGITS else '"float64"'
+    if field.type == "BigNumber":
+        if 0 < field.length <= DECIMAL_MAX_DIGITS:
+            return f"pd.ArrowDtype(pa.decimal128({field.length}, {max(field.precision, 0)}))"
+        return '"float64"'
+    if field.type == "String":
+        return '"category"' if 0 < field.length <= CATEGORY_MAX_LENGTH else '"string[pyarrow]"'
+    if field.type == "Boolean":
+        return '"boolean"'
+    return None
+
+def sql_type(field: Field) -> Optional[str]:
+    """Expressão SQLAlchemy (prefixo sa.) usada como dica de tipo na criação da tabela de destino"""
+    if field.type == "Integer":
+        return "sa.Integer()" if 0 < field.length <= 9 else "sa.BigInteger()"
+    if field.type == "Number":
+        return "sa.Float()"
+    if field.type == "BigNumber":
+        if 0 < field.length <= DECIMAL_MAX_DIGITS:
+            return f"sa.Numeric({field.length}, {max(field.precision, 0)})"
+        return "sa.Numeric()"
+    if field.type == "String":
+        return f"sa.String({field.length})" if field.length > 0 else "sa.Text()"
+    if field.type == "Date":
+        return "sa.Date()"
+    if field.type == "Timestamp":
+        return "sa.DateTime()"
+    if field.type == "Boolean":
+        return "sa.Boolean()"
+    return None
+
+def read_options(fields: List[Field]) -> Tuple[Dict[str, str], List[str]]:
+    """dtype (nome → expressão) e parse_dates para leitura dos campos"""
+    dtypes = {}
+    parse_dates = []
+    for field in fields:
+        if field.type in DATE_TYPES:
+            parse_dates.append(field.name)
+            continue
+        dtype = pandas_dtype(field)
+        if dtype:
+            dtypes[field.name] = dtype
+    return dtypes, parse_dates
+
+def render_mapping(mapping: Dict[str, str]) -> str:
+    """Renderiza um dicionário nome → expressão como código Python"""
+    items = ", ".join(f"{name!r}: {expression}" for name, expression in mapping.items())
+    return f"{{{items}}}"
+
+def upstream_fields(ktr_model: KTRModel, step_name: str) -> List[Field]:
+    """Campos com metadados declarados nos steps que alimentam o step (nomes repetidos: vale o último no KTR)"""
+    graph = ktr_model.get_graph()
+    if step_name not in graph:
+        return []
+
+    ancestors = nx.ancestors(graph, step_name)
+    fields: Dict[str, Field] = {}
+    for step in reversed(ktr_model.steps):
+        if step.name in ancestors:
+            for field in _declared_fields(step):
+                fields.setdefault(field.name, field)
+    return list(fields.values())
+
+def requires_pyarrow(ktr_model: KTRModel) -> bool:
+    """Se algum campo usa decimal do Arrow (import de pyarrow no código gerado)"""
+    return any(
+        "pa." in (pandas_dtype(field) or "")
+        for step in ktr_model.steps for field in _declared_fields(step)
+    )
+
+def _declared_fields(step) -> List[Field]:
+    """Campos com metadados (Field) do step; SelectValues/SortRows guardam apenas nomes"""
+    return [field for field in getattr(step, "fields", []) if isinstance(field, Field)]
@@ -0,0 +1,435 @@
+"""
+Tradução de condições, agregações e tipos do Pentaho para expressões pandas/Polars/SQL
+"""
+import re
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+# Tipo do campo (aba metadados do SelectValues) → conversão; {column} é a série/expressão
+PANDAS_CASTS = {
+    "Integer": '{column}.astype("Int64")',
+    "Number": '{column}.astype("float64")',
+    "BigNumber": '{column}.astype("float64")',
+    "String": '{column}.astype("string")',
+    "Boolean": '{column}.astype("boolean")',
+    "Date": "pd.to_datetime({column})",
+    "Timestamp": "pd.to_datetime({column})",
+}
+
+POLARS_CASTS = {
+    "Integer": "{column}.cast(pl.Int64)",
+    "Number": "{column}.cast(pl.Float64)",
+    "BigNumber": "{column}.cast(pl.Float64)",
+    "String": "{column}.cast(pl.String)",
+    "Boolean": "{column}.cast(pl.Boolean)",
+    # Texto não converte por cast no Polars: str.to_datetime conforme o schema
+    "Date": "({column}.str.to_datetime() if schema[{name!r}] == pl.String else {column}.cast(pl.Datetime))",
+    "Timestamp": "({column}.str.to_datetime() if schema[{name!r}] == pl.String else {column}.cast(pl.Datetime))",
+}
+
+SQL_CASTS = {
+    "Integer": "BIGINT",
+    "Number": "DOUBLE",
+    "BigNumber": "DOUBLE",
+    "String": "VARCHAR",
+    "Boolean": "BOOLEAN",
+    "Date": "TIMESTAMP",
+    "Timestamp": "TIMESTAMP",
+}
+
+# Agregações do GroupBy: FIRST/LAST ignoram nulos, COUNT_ALL conta valores e COUNT_ANY linhas
+PANDAS_AGGREGATES = {
+    "SUM": '"sum"',
+    "AVERAGE": '"mean"',
+    "MEDIAN": '"median"',
+    "MIN": '"min"',
+    "MAX": '"max"',
+    "COUNT_ALL": '"count"',
+    "COUNT_DISTINCT": '"nunique"',
+    "COUNT_ANY": '"size"',
+    "FIRST": '"first"',
+    "LAST": '"last"',
+    "STD_DEV": '"std"',
+    "CONCAT_COMMA": 'lambda values: ", ".join(values.dropna().astype(str))',
+}
+
+POLARS_AGGREGATES = {
+    "SUM": "{column}.sum()",
+    "AVERAGE": "{column}.mean()",
+    "MEDIAN": "{column}.median()",
+    "MIN": "{column}.min()",
+    "MAX": "{column}.max()",
+    "COUNT_ALL": "{column}.count()",
+    "COUNT_DISTINCT": "{column}.drop_nulls().n_unique()",
+    "COUNT_ANY": "pl.len()",
+    "FIRST": "{column}.drop_nulls().first()",
+    "LAST": "{column}.drop_nulls().last()",
+    "STD_DEV": "{column}.std()",
+    "CONCAT_COMMA": '{column}.drop_nulls().cast(pl.String).str.join(", ")',
+}
+
+SQL_AGGREGATES = {
+    "SUM": "sum({column})",
+    "AVERAGE": "avg({column})",
+    "MEDIAN": "median({column})",
+    "MIN": "min({column})",
+    "MAX": "max({column})",
+    "COUNT_ALL": "count({column})",
+    "COUNT_DISTINCT": "count(DISTINCT {column})",
+    "COUNT_ANY": "count(*)",
+    "FIRST": "first({column}) FILTER (WHERE {column} IS NOT NULL)",
+    "LAST": "last({column}) FILTER (WHERE {column} IS NOT NULL)",
+    "STD_DEV": "stddev_samp({column})",
+    "CONCAT_COMMA": "string_agg(CAST({column} AS VARCHAR), ', ')",
+}
+
+# Agregações com a mesma sintaxe em qualquer SGBD (ELT no banco de origem)
+PORTABLE_AGGREGATES = {
+    "SUM": "SUM({column})",
+    "AVERAGE": "AVG({column})",
+    "MIN": "MIN({column})",
+    "MAX": "MAX({column})",
+    "COUNT_ALL": "COUNT({column})",
+    "COUNT_DISTINCT": "COUNT(DISTINCT {column})",
+    "COUNT_ANY": "COUNT(*)",
+}
+
+COMPARISONS = {"=": "==", "<>": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+
+# Formatos de data usados pelo Pentaho nos valores constantes
+DATE_FORMATS = ["%Y/%m/%d %H:%M:%S.%f", "%Y/%m/%d %H:%M:%S", "%Y/%m/%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"]
+
+def literal(value_type: str, text: str) -> str:
+    """Constante do Pentaho como literal Python"""
+    try:
+        if value_type == "Integer":
+            return repr(int(text))
+        if value_type in ("Number", "BigNumber"):
+            return repr(float(text.replace(",", ".")))
+    except ValueError:
+        return repr(text)
+    if value_type == "Boolean":
+        return str(text.strip().upper() in ("Y", "TRUE", "1"))
+    value = _parse_date(text) if value_type in ("Date", "Timestamp") else None
+    if value:
+        return f"datetime({value.year}, {value.month}, {value.day}, {value.hour}, {value.minute}, {value.second})"
+    return repr(text)
+
+def _parse_date(text: str) -> Optional[datetime]:
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text.strip(), date_format)
+        except ValueError:
+            continue
+    return None
+
+def quote_identifier(name: str) -> str:
+    """Nome de coluna/relação entre aspas duplas para SQL"""
+    return '"' + name.replace('"', '""') + '"'
+
+def portable_identifier(name: str) -> str:
+    """Nome sem aspas quando possível, para seguir a regra de caixa do SGBD (ex.: Oracle)"""
+    return name if re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name) else quote_identifier(name)
+
+def sql_literal(value_type: str, text: str) -> str:
+    """Constante do Pentaho como literal SQL"""
+    if value_type in ("Integer", "Number", "BigNumber", "Boolean"):
+        python_literal = literal(value_type, text)
+        if not python_literal.startswith("'"):
+            return python_literal.upper()
+    value = _parse_date(text) if value_type in ("Date", "Timestamp") else None
+    if value:
+        return f"TIMESTAMP '{value:%Y-%m-%d %H:%M:%S}'"
+    return "'" + text.replace("'", "''") + "'"
+
+def like_pattern(pattern: str) -> str:
+    """Padrão LIKE (% e _) como expressão regular"""
+    regex = ""
+    for char in pattern:
+        regex += ".*" if char == "%" else "." if char == "_" else ("\\" + char if not char.isalnum() else char)
+    return regex
+
+def _list_values(value: Dict[str, Any]) -> str:
+    """Valores do IN LIST (separados por ;) convertidos pelo tipo da constante"""
+    items = [item.strip() for item in value.get("text", "").split(";") if item.strip()]
+    return f"[{', '.join(literal(value.get('type', 'String'), item) for item in items)}]"
+
+def _pandas_atom(condition: Dict[str, Any]) -> str:
+    column = f"df[{condition['leftvalue']!r}]"
+    function = condition["function"]
+    value = condition.get("value") or {}
+    text = value.get("text", "")
+    if condition.get("rightvalue"):
+        right = f"df[{condition['rightvalue']!r}]"
+    elif value.get("isnull"):
+        right = "None"
+    else:
+        right = literal(value.get("type", "String"), text)
+
+    if function in COMPARISONS:
+        # NULL: `<>` verdadeiro e as demais comparações falsas, em qualquer dtype (object,
+        # category, string[pyarrow], Int*); o resultado nunca tem NA e `~` apenas o inverte
+        null_result = function == "<>"
+        return f"({column} {COMPARISONS[function]} {right}).fillna({null_result}).astype(bool)"
+    if function == "IS NULL":
+        return f"{column}.isna()"
+    if function == "IS NOT NULL":
+        return f"{column}.notna()"
+    if function == "IN LIST":
+        return f"{column}.isin({_list_values(value)}).fillna(False).astype(bool)"
+    if function == "CONTAINS":
+        return f'{column}.astype("string").str.contains({text!r}, regex=False, na=False)'
+    if function == "STARTS WITH":
+        return f'{column}.astype("string").str.startswith({text!r}, na=False)'
+    if function == "ENDS WITH":
+        return f'{column}.astype("string").str.endswith({text!r}, na=False)'
+    if function == "REGEXP":
+        return f'{column}.astype("string").str.fullmatch({text!r}, na=False)'
+    if function == "LIKE":
+        return f'{column}.astype("string").str.fullmatch({like_pattern(text)!r}, na=False)'
+    return None
+
+def _polars_atom(condition: Dict[str, Any]) -> str:
+    column = f"pl.col({condition['leftvalue']!r})"
+    function = condition["function"]
+    value = condition.get("value") or {}
+    text = value.get("text", "")
+    if condition.get("rightvalue"):
+        right = f"pl.col({condition['rightvalue']!r})"
+    elif value.get("isnull"):
+        right = "pl.lit(None)"
+    else:
+        right = f"pl.lit({literal(value.get('type', 'String'), text)})"
+
+    # Mesma regra de NULL do pandas: o resultado nunca é nulo e `~` apenas o inverte
+    if function in COMPARISONS:
+        return f"({column} {COMPARISONS[function]} {right}).fill_null({function == '<>'})"
+    if function == "IS NULL":
+        return f"{column}.is_null()"
+    if function == "IS NOT NULL":
+        return f"{column}.is_not_null()"
+    if function == "IN LIST":
+        return f"{column}.is_in({_list_values(value)}).fill_null(False)"
+    if function == "CONTAINS":
+        return f"{column}.cast(pl.String).str.contains({text!r}, literal=True).fill_null(False)"
+    if function == "STARTS WITH":
+        return f"{column}.cast(pl.String).str.starts_with({text!r}).fill_null(False)"
+    if function == "ENDS WITH":
+        return f"{column}.cast(pl.String).str.ends_with({text!r}).fill_null(False)"
+    if function == "REGEXP":
+        return f"{column}.cast(pl.String).str.contains({'^(?:' + text + ')$'!r}).fill_null(False)"
+    if function == "LIKE":
+        return f"{column}.cast(pl.String).str.contains({'^(?:' + like_pattern(text) + ')$'!r}).fill_null(False)"
+    return None
+
+def _sql_atom(condition: Dict[str, Any]) -> str:
+    column = quote_identifier(condition["leftvalue"])
+    function = condition["function"]
+    value = condition.get("value") or {}
+    text = value.get("text", "")
+    if condition.get("rightvalue"):
+        right = quote_identifier(condition["rightvalue"])
+    elif value.get("isnull"):
+        right = "NULL"
+    else:
+        right = sql_literal(value.get("type", "String"), text)
+    text_column = f"CAST({column} AS VARCHAR)"
+
+    # Mesma regra de NULL do pandas: COALESCE tira o UNKNOWN antes de qualquer NOT
+    if function in COMPARISONS:
+        return f"COALESCE({column} {function} {right}, {'TRUE' if function == '<>' else 'FALSE'})"
+    if function == "IS NULL":
+        return f"({column} IS NULL)"
+    if function == "IS NOT NULL":
+        return f"({column} IS NOT NULL)"
+    if function == "IN LIST":
+        items = [item.strip() for item in text.split(";") if item.strip()]
+        return f"COALESCE({column} IN ({', '.join(sql_literal(value.get('type', 'String'), item) for item in items)}), FALSE)"
+    if function == "CONTAINS":
+        return f"COALESCE(contains({text_column}, {sql_literal('String', text)}), FALSE)"
+    if function == "STARTS WITH":
+        return f"COALESCE(starts_with({text_column}, {sql_literal('String', text)}), FALSE)"
+    if function == "ENDS WITH":
+        return f"COALESCE(ends_with({text_column}, {sql_literal('String', text)}), FALSE)"
+    if function == "REGEXP":
+        return f"COALESCE(regexp_full_match({text_column}, {sql_literal('String', text)}), FALSE)"
+    if function == "LIKE":
+        return f"COALESCE({text_column} LIKE {sql_literal('String', text)}, FALSE)"
+    return None
+
+# Inversa de cada comparação, usada ao empurrar um NOT até a condição atômica
+NEGATED_COMPARISONS = {"=": "<>", "<>": "=", "<": ">=", ">=": "<", ">": "<=", "<=": ">"}
+
+def _portable_atom(condition: Dict[str, Any], negate: bool = False) -> Optional[str]:
+    """
+    Condição atômica em SQL padrão com a regra de NULL dos filtros gerados
+
+    A regra é a mesma das máscaras pandas/Polars/DuckDB: com NULL, `<>` é
+    verdadeiro, as demais comparações, IN LIST e LIKE são falsos, e a negação
+    inverte esse resultado. Em SQL a comparação fica UNKNOWN e o WHERE descarta
+    a linha, então a forma negada (e o `<>`) aceita NULL explicitamente.
+    """
+    column = portable_identifier(condition["leftvalue"])
+    function = condition["function"]
+    value = condition.get("value") or {}
+    text = value.get("text", "")
+    value_type = value.get("type", "String")
+    if value_type not in ("String", "Integer", "Number", "BigNumber") and function not in ("IS NULL", "IS NOT NULL"):
+        return None
+    nullable = [column]
+    if condition.get("rightvalue"):
+        right = portable_identifier(condition["rightvalue"])
+        nullable.append(right)
+    elif value.get("isnull") and function not in ("IS NULL", "IS NOT NULL"):
+        # Comparar com a constante NULL não tem equivalente direto em SQL
+        return None
+    else:
+        right = sql_literal(value_type, text)
+
+    def or_null(predicate: str) -> str:
+        return f"({predicate} OR {' OR '.join(f'{name} IS NULL' for name in nullable)})"
+
+    if function in COMPARISONS:
+        operator = NEGATED_COMPARISONS[function] if negate else function
+        predicate = f"{column} {operator} {right}"
+        # Verdadeira para NULL: `<>` positivo ou qualquer outra comparação negada
+        return or_null(predicate) if (function == "<>") != negate else f"({predicate})"
+    if function == "IS NULL":
+        return f"({column} IS NOT NULL)" if negate else f"({column} IS NULL)"
+    if function == "IS NOT NULL":
+        return f"({column} IS NULL)" if negate else f"({column} IS NOT NULL)"
+    if function == "IN LIST":
+        items = [item.strip() for item in text.split(";") if item.strip()]
+        if not items:
+            return None
+        values = ", ".join(sql_literal(value_type, item) for item in items)
+        return or_null(f"{column} NOT IN ({values})") if negate else f"({column} IN ({values}))"
+    # Curingas no texto mudariam o sentido do LIKE
+    if function in ("CONTAINS", "STARTS WITH", "ENDS WITH") and ("%" in text or "_" in text):
+        return None
+    patterns = {
+        "CONTAINS": "%" + text + "%",
+        "STARTS WITH": text + "%",
+        "ENDS WITH": "%" + text,
+        "LIKE": text,
+    }
+    if function in patterns:
+        pattern = sql_literal("String", patterns[function])
+        return or_null(f"{column} NOT LIKE {pattern}") if negate else f"({column} LIKE {pattern})"
+    return None
+
+def _render_portable(condition: Dict[str, Any], negate: bool = False) -> str:
+    """
+    Como _render, mas empurra cada NOT até as condições atômicas (De Morgan)
+
+    Assim toda negação vira uma comparação que trata NULL como o pandas, em vez
+    de um NOT sobre um valor UNKNOWN.
+    """
+    negate = negate != bool(condition.get("negated"))
+    if condition.get("conditions"):
+        expression = None
+        for child in condition["conditions"]:
+            operator = child.get("operator", "-")
+            child_negate = negate
+            if operator.endswith("NOT"):
+                child_negate = not child_negate
+                operator = operator[:-len("NOT")].strip() or "AND"
+            child_expression = _render_portable(child, child_negate)
+            if expression is None:
+                expression = child_expression
+            else:
+                connective = "OR" if operator == "OR" else "AND"
+                if negate:
+                    connective = "AND" if connective == "OR" else "OR"
+                expression = f"({expression} {connective} {child_expression})"
+        return expression
+    if not condition.get("leftvalue") or condition.get("function") == "TRUE":
+        return "(1 = 0)" if negate else "(1 = 1)"
+    return _portable_atom(condition, negate)
+
+# Conectivos por linguagem: máscaras pandas/Polars usam operadores bit a bit
+PYTHON_CONNECTIVES = {"AND": "({a} & {b})", "OR": "({a} | {b})", "XOR": "({a} ^ {b})", "NOT": "~{a}"}
+SQL_CONNECTIVES = {"AND": "({a} AND {b})", "OR": "({a} OR {b})", "XOR": "({a} <> {b})", "NOT": "(NOT {a})"}
+
+def _render(condition: Dict[str, Any], atom: Callable[[Dict[str, Any]], Optional[str]], true_expr: str,
+            connectives: Dict[str, str] = PYTHON_CONNECTIVES) -> str:
+    """
+    Combina a condição e suas filhas da esquerda para a direita, como o Pentaho
+    (sem precedência entre AND e OR)
+    """
+    if condition.get("conditions"):
+        expression = None
+        for child in condition["conditions"]:
+            child_expression = _render(child, atom, true_expr, connectives)
+            operator = child.get("operator", "-")
+            if operator.endswith("NOT"):
+                child_expression = connectives["NOT"].format(a=child_expression)
+                operator = operator[:-len("NOT")].strip() or "AND"
+            if expression is None:
+                expression = child_expression
+            else:
+                connective = connectives.get(operator, connectives["AND"])
+                expression = connective.format(a=expression, b=child_expression)
+    elif not condition.get("leftvalue") or condition.get("function") == "TRUE":
+        expression = true_expr
+    else:
+        expression = atom(condition)
+        if expression is None:
+            logger.warning(f"⚠️ Função '{condition['function']}' não suportada no filtro, condição considerada verdadeira")
+            expression = true_expr
+
+    return connectives["NOT"].format(a=expression) if condition.get("negated") else expression
+
+def condition_fields(condition: Dict[str, Any]) -> List[str]:
+    """Campos lidos pela condição (lado esquerdo e campo comparado à direita), sem repetição"""
+    if condition.get("conditions"):
+        fields = [name for child in condition["conditions"] for name in condition_fields(child)]
+    else:
+        fields = [name for name in (condition.get("leftvalue"), condition.get("rightvalue")) if name]
+    return list(dict.fromkeys(fields))
+
+def pandas_condition(condition: Dict[str, Any]) -> str:
+    """Máscara booleana (Series) equivalente à condição do FilterRows"""
+    return _render(condition, _pandas_atom, "pd.Series(True, index=df.index)")
+
+def polars_condition(condition: Dict[str, Any]) -> str:
+    """Expressão Polars equivalente à condição do FilterRows"""
+    return _render(condition, _polars_atom, "pl.lit(True)")
+
+def sql_condition(condition: Dict[str, Any]) -> str:
+    """Predicado SQL (dialeto DuckDB) equivalente à condição do FilterRows"""
+    return _render(condition, _sql_atom, "TRUE", SQL_CONNECTIVES)
+
+def portable_condition(condition: Dict[str, Any]) -> Optional[str]:
+    """
+    Predicado em SQL padrão, executável no próprio banco de origem
+
+    Retorna None quando alguma parte não tem tradução portável (XOR, REGEXP,
+    constantes de data/booleanas); nesse caso o filtro continua no Python.
+    Linhas com NULL passam ou não exatamente como nos filtros em memória (em
+    qualquer dtype), desde que o predicado seja usado diretamente no WHERE.
+    """
+    def supported(node: Dict[str, Any]) -> bool:
+        if node.get("operator", "-").startswith("XOR"):
+            return False
+        if node.get("conditions"):
+            return all(supported(child) for child in node["conditions"])
+        if not node.get("leftvalue") or node.get("function") == "TRUE":
+            return True
+        return _portable_atom(node) is not None
+
+    if not supported(condition):
+        return None
+    return _render_portable(condition)
+
+def supported_aggregates(aggregates: List[Dict[str, str]], step_name: str) -> List[Dict[str, str]]:
+    """Agregações com tradução em todos os engines (as demais são descartadas com aviso)"""
+    supported = []
+    for aggregate in aggregates:
+        if aggregate["type"] in PANDAS_AGGREGATES:
+            supported.append(aggregate)
+        else:
+            logger.warning(f"⚠️ {step_name}: agregação '{aggregate['type']}' de {aggregate['name']} não suportada")
+    return supported
@@ -0,0 +1,185 @@
+"""
+Detecção de fluxos executáveis inteiramente no banco (ELT)
+
+Quando um TableInput e o TableOutput a jusante usam a mesma conexão e os
+steps entre eles têm tradução para SQL padrão, o pipeline gerado executa um
+único INSERT INTO destino SELECT ... no servidor em vez de ler as linhas para
+o Python e gravá-las de volta.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import networkx as nx
+
+from src.models.ktr_models import (
+    FilterRowsStep, GroupByStep, KTRModel, SelectValuesStep, SortRowsStep, Step,
+    StringOperationsStep, TableInputStep, TableOutputStep
+)
+from src.generator.expressions import (
+    PANDAS_CASTS, PORTABLE_AGGREGATES, portable_condition, portable_identifier, supported_aggregates
+)
+
+# Tamanho médio estimado de uma linha trafegada (sem estatísticas do banco)
+DEFAULT_ROW_BYTES = 200
+
+@dataclass
+class InDatabaseFlow:
+    """Cadeia TableInput → ... → TableOutput compilada em um único SELECT"""
+    source: TableInputStep
+    target: TableOutputStep
+    steps: List[Step] = field(default_factory=list)    # cadeia completa, da origem ao destino
+    sql: str = ""
+
+    @property
+    def connection(self) -> str:
+        return self.source.connection_name
+
+    @property
+    def step_names(self) -> List[str]:
+        return [step.name for step in self.steps]
+
+def find_in_database_flows(ktr_model: KTRModel) -> List[InDatabaseFlow]:
+    """
+    Cadeias lineares (sem fan-in/fan-out) de um TableInput até um TableOutput
+    de inserção na mesma conexão, com todos os steps intermediários em SQL
+
+    Uma cadeia assim é um componente isolado do grafo: ninguém mais consome
+    suas linhas, então não precisa passar pelo Python.
+    """
+    graph = ktr_model.get_graph()
+    flows = []
+    for component in nx.weakly_connected_components(graph):
+        sources = [name for name in component if graph.in_degree(name) == 0]
+        if len(sources) != 1 or any(graph.in_degree(n) > 1 or graph.out_degree(n) > 1 for n in component):
+            continue
+
+        chain = [ktr_model.get_step(sources[0])]
+        while graph.out_degree(chain[-1].name) == 1:
+            chain.append(ktr_model.get_step(next(iter(graph.successors(chain[-1].name)))))
+        if None in chain or len(chain) != len(component):
+            continue
+
+        source, target = chain[0], chain[-1]
+        if not (isinstance(source, TableInputStep) and isinstance(target, TableOutputStep)):
+            continue
+        if target.load_mode != "insert" or not source.connection_name or source.connection_name != target.connection_name:
+            continue
+
+        sql = compile_chain(source, chain[1:-1])
+        if sql is not None and target.field_mapping:
+            # Campos especificados: só eles, com os nomes das colunas do destino
+            sql = f"SELECT {_select_list(list(target.field_mapping.items()))}\nFROM (\n{sql}\n) q{len(chain) - 1}"
+        if sql is not None:
+            flows.append(InDatabaseFlow(source=source, target=target, steps=chain, sql=sql))
+
+    position = {step.name: index for index, step in enumerate(ktr_model.steps)}
+    return sorted(flows, key=lambda flow: position[flow.source.name])
+
+def compile_chain(source: TableInputStep, steps: List[Step]) -> Optional[str]:
+    """
+    SELECT em SQL padrão equivalente à consulta de origem seguida dos steps
+
+    Cada step envolve o SELECT anterior como subconsulta. As colunas só são
+    conhecidas depois de um SelectValues/GroupBy explícito; steps que precisam
+    delas antes disso (ex.: StringOperations logo após a origem) tornam a
+    cadeia inelegível, assim como qualquer step sem tradução portável.
+    """
+    sql = source.sql.strip().rstrip(";").strip()
+    if not sql:
+        return None
+    columns: Optional[List[str]] = None
+
+    for level, step in enumerate(steps, start=1):
+        subquery = f"(\n{sql}\n) q{level}"
+
+        if isinstance(step, FilterRowsStep):
+            condition = portable_condition(step.condition)
+            if condition is None:
+                return None
+            sql = f"SELECT * FROM {subquery}\nWHERE {condition}"
+
+        elif isinstance(step, SortRowsStep):
+            # A ordem das linhas não sobrevive a um INSERT ... SELECT
+            if step.unique_rows:
+                return None
+
+        elif isinstance(step, SelectValuesStep):
+            # Tipos SQL das conversões variam entre SGBDs
+            if any(meta["type"] in PANDAS_CASTS for meta in step.meta):
+                return None
+            selected = [(f["name"], f["rename"] or f["name"]) for f in step.fields]
+            if step.fields and step.select_unspecified:
+                if columns is None:
+                    return None
+                chosen = {name for name, _ in selected}
+                selected += [(name, name) for name in columns if name not in chosen]
+            elif not step.fields:
+                if columns is None:
+                    return None
+                selected = [(name, name) for name in columns]
+            selected = [(name, alias) for name, alias in selected if alias not in step.remove]
+            meta_renames = {m["name"]: m["rename"] for m in step.meta if m["rename"]}
+            selected = [(name, meta_renames.get(alias, alias)) for name, alias in selected]
+            if not selected:
+                return None
+            columns = [alias for _, alias in selected]
+            sql = f"SELECT {_select_list(selected)}\nFROM {subquery}"
+
+        elif isinstance(step, GroupByStep):
+            aggregates = supported_aggregates(step.aggregates, step.name)
+            if any(aggregate["type"] not in PORTABLE_AGGREGATES for aggregate in aggregates):
+                return None
+            expressions = [portable_identifier(name) for name in step.group_fields]
+            for aggregate in aggregates:
+                column = portable_identifier(aggregate["subject"]) if aggregate["subject"] else "*"
+                expression = PORTABLE_AGGREGATES[aggregate["type"]].format(column=column)
+                expressions.append(f"{expression} AS {portable_identifier(aggregate['name'])}")
+            if not expressions:
+                return None
+            columns = step.group_fields + [aggregate["name"] for aggregate in aggregates]
+            sql = f"SELECT {', '.join(expressions)}\nFROM {subquery}"
+            if step.group_fields:
+                sql += f"\nGROUP BY {', '.join(map(portable_identifier, step.group_fields))}"
+
+        elif isinstance(step, StringOperationsStep):
+            if columns is None:
+                return None
+            functions = {"both": "TRIM({})", "left": "LTRIM({})", "right": "RTRIM({})"}
+            operations = {op["field_name"]: op for op in step.operations}
+            selected = []
+            for name in columns:
+                expression = portable_identifier(name)
+                op = operations.get(name)
+                if op:
+                    if op["trim_type"] in functions:
+                        expression = functions[op["trim_type"]].format(expression)
+                    if op["lower_upper"] in ("lower", "upper"):
+                        expression = f"{op['lower_upper'].upper()}({expression})"
+                selected.append((expression, name))
+            sql = "SELECT " + ", ".join(
+                expression if expression == portable_identifier(name) else f"{expression} AS {portable_identifier(name)}"
+                for expression, name in selected
+            ) + f"\nFROM {subquery}"
+
+        else:
+            return None
+
+    return sql
+
+def _select_list(selected: List[tuple]) -> str:
+    return ", ".join(
+        portable_identifier(name) if name == alias else f"{portable_identifier(name)} AS {portable_identifier(alias)}"
+        for name, alias in selected
+    )
+
+def estimate_transfer_avoided(flows: List[InDatabaseFlow], row_counts: Optional[Dict[str, int]] = None,
+                              row_bytes: int = DEFAULT_ROW_BYTES) -> Dict[str, Optional[int]]:
+    """
+    Linhas e bytes que deixam de trafegar pela rede (leitura da origem e
+    gravação no destino); row_counts (step → linhas, ex.: métricas de uma
+    execução anterior) torna a estimativa concreta, sem ele ela fica indefinida
+    """
+    if row_counts is None:
+        return {"rows_avoided": None, "bytes_avoided": None}
+    rows = sum(row_counts.get(flow.source.name, 0) + row_counts.get(flow.target.name, 0) for flow in flows)
+    return {"rows_avoided": rows, "bytes_avoided": rows * row_bytes}
@@ -0,0 +1,437 @@
+"""
+Pushdown de filtros, ordenação, limite e colunas para a consulta do TableInput
+
+Um FilterRows ou SortRows logo após um TableInput (sem outros consumidores)
+vira WHERE / ORDER BY na própria consulta, e o limite de linhas do step vira
+LIMIT (TOP / FETCH FIRST conforme o SGBD): o banco usa seus índices e só as
+linhas necessárias trafegam. Em seguida o SELECT é reduzido às colunas que
+algum destino de fato consome, propagadas de trás para frente pelos hops.
+A consulta é analisada e reescrita pelo sqlglot no dialeto da conexão; cada
+reescrita é registrada para auditoria.
+
+A ordenação só é levada ao banco quando o resultado é o mesmo do
+sort_values (ordem de codepoints): chaves numéricas ou de data, ou conexões
+com collation binária (SQLite, ou atributo COLLATION = C/POSIX/BINARY/
+UCS_BASIC na conexão do KTR). Textos em outras collations, ordenações sem
+distinção de maiúsculas e com remoção de duplicadas ficam no pipeline.
+"""
+import copy
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import networkx as nx
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+from loguru import logger
+
+from src.models.ktr_models import (
+    FilterRowsStep, GroupByStep, Hop, KTRModel, SelectValuesStep, SortRowsStep, Step, StringOperationsStep,
+    TableInputStep, TableOutputStep
+)
+from src.generator.dtypes import DATE_TYPES, upstream_fields
+from src.generator.expressions import condition_fields, portable_condition, portable_identifier
+
+# Connection.type → dialeto do sqlglot; conexões de outros tipos não são reescritas
+DIALECTS = {
+    "POSTGRESQL": "postgres",
+    "MYSQL": "mysql",
+    "ORACLE": "oracle",
+    "SQLSERVER": "tsql",
+    "MSSQL": "tsql",
+    "SQLITE": "sqlite",
+}
+
+# Collations que comparam textos byte a byte (mesma ordem do sort_values)
+BINARY_COLLATIONS = {"C", "POSIX", "BINARY", "UCS_BASIC"}
+
+# Tipos do Pentaho cuja ordem não depende de collation
+ORDERABLE_TYPES = {"Integer", "Number", "BigNumber"} | DATE_TYPES
+
+@dataclass
+class PushdownRewrite:
+    """Reescrita aplicada à consulta de um TableInput"""
+    source: str         # TableInput reescrito
+    step: str           # step absorvido (o próprio TableInput no caso do limite)
+    clause: str         # "WHERE", "ORDER BY", "LIMIT" ou "SELECT" (colunas)
+    mode: str           # "merge" (cláusula na própria consulta) ou "subquery" (consulta envolvida)
+    sql_before: str
+    sql_after: str
+
+    def to_dict(self) -> Dict[str, str]:
+        return asdict(self)
+
+def push_down(ktr_model: KTRModel, sort: bool = True) -> Tuple[KTRModel, List[PushdownRewrite]]:
+    """
+    Cópia do modelo com filtros, ordenações, limites e colunas levados para o SQL
+
+    Os steps absorvidos saem do modelo e seus consumidores passam a ler
+    direto do TableInput. sort=False mantém as ordenações no pipeline (ex.:
+    engines que não preservam a ordem de leitura). O modelo original não é
+    alterado.
+    """
+    model, rewrites = _push_clauses(ktr_model, sort)
+    model, projections = _prune_columns(model)
+    return model, rewrites + projections
+
+def required_columns(ktr_model: KTRModel) -> Dict[str, Optional[Set[str]]]:
+    """
+    Colunas que a saída de cada step precisa carregar (None = todas)
+
+    Parte dos destinos com campos especificados (field_mapping e chaves) e
+    volta pelos hops: cada step acrescenta as colunas que lê e traduz os
+    nomes que renomeia. Steps sem tradução conhecida, destinos sem campos
+    especificados e SelectValues que repassam campos não listados para um
+    consumidor sem restrição exigem todas as colunas.
+    """
+    graph = ktr_model.get_graph()
+    try:
+        order = list(nx.topological_sort(graph))
+    except nx.NetworkXUnfeasible:
+        return {}
+
+    needed: Dict[str, Optional[Set[str]]] = {}
+    for name in reversed(order):
+        columns: Optional[Set[str]] = set()
+        for consumer in graph.successors(name):
+            demand = _input_columns(ktr_model.get_step(consumer), needed.get(consumer, set()))
+            if demand is None:
+                columns = None
+                break
+            columns |= demand
+        needed[name] = columns
+    return needed
+
+def _input_columns(step: Optional[Step], output: Optional[Set[str]]) -> Optional[Set[str]]:
+    """Colunas que o step lê da entrada para produzir output (None = todas)"""
+    if isinstance(step, TableOutputStep):
+        if not (step.field_mapping or step.key_fields):
+            return None
+        return set(step.field_mapping) | set(step.key_fields)
+    if isinstance(step, GroupByStep):
+        if step.all_rows:
+            return None
+        return set(step.group_fields) | {aggregate["subject"] for aggregate in step.aggregates if aggregate["subject"]}
+    if isinstance(step, SelectValuesStep):
+        return _select_values_input(step, output)
+    if output is None:
+        return None
+    if isinstance(step, FilterRowsStep):
+        return output | set(condition_fields(step.condition))
+    if isinstance(step, SortRowsStep):
+        return output | {f["name"] for f in step.fields}
+    if isinstance(step, StringOperationsStep):
+        return output | {op["field_name"] for op in step.operations}
+    return None
+
+def _select_values_input(step: SelectValuesStep, output: Optional[Set[str]]) -> Optional[Set[str]]:
+    """
+    Entrada do SelectValues: campos listados sempre (o código os indexa), além
+    dos repassados quando select_unspecified ou sem lista, com os renomes desfeitos
+    """
+    listed = {f["name"] for f in step.fields}
+    field_names = {f["rename"] or f["name"]: f["name"] for f in step.fields}
+    if step.fields and not step.select_unspecified:
+        passed: Set[str] = set()
+    elif output is None:
+        return None
+    else:
+        meta_names = {m["rename"]: m["name"] for m in step.meta if m["rename"]}
+        passed = {field_names.get(meta_names.get(name, name), meta_names.get(name, name)) for name in output}
+    # Colunas removidas e convertidas precisam existir (nomes posteriores aos renomes dos campos)
+    touched = set(step.remove) | {m["name"] for m in step.meta}
+    return listed | passed | {field_names.get(name, name) for name in touched}
+
+def _push_clauses(ktr_model: KTRModel, sort: bool) -> Tuple[KTRModel, List[PushdownRewrite]]:
+    """Filtros, ordenações e limites levados para a consulta (steps absorvidos saem do modelo)"""
+    rewrites: List[PushdownRewrite] = []
+    absorbed: Dict[str, str] = {}
+    new_sql: Dict[str, str] = {}
+
+    for source in ktr_model.steps:
+        if not isinstance(source, TableInputStep):
+            continue
+        dialect = _dialect(ktr_model, source)
+        query = _parse(source.sql, dialect)
+        if query is None:
+            continue
+        sql = source.sql.strip()
+        source_rewrites = []
+        # Tipos das colunas da consulta original (antes de virar subconsulta)
+        column_types = _projection_types(query)
+
+        if source.limit > 0:
+            query, mode = _apply(query, "LIMIT", source.limit)
+            source_rewrites.append(_record(source.name, source.name, "LIMIT", mode, sql, query, dialect))
+            sql = source_rewrites[-1].sql_after
+
+        current = source.name
+        while True:
+            step = _single_consumer(ktr_model, current)
+            if isinstance(step, FilterRowsStep) and not step.send_false_to:
+                condition = portable_condition(step.condition)
+                if condition is None:
+                    break
+                clause, argument = "WHERE", sqlglot.parse_one(condition)
+            elif isinstance(step, SortRowsStep) and sort and step.fields and not step.unique_rows and step.copies == 1:
+                if not all(f["case_sensitive"] for f in step.fields):
+                    break
+                if not _sort_matches_pandas(ktr_model, source, step, column_types):
+                    break
+                clause = "ORDER BY"
+                argument = [
+                    exp.Ordered(this=_identifier(f["name"]), desc=not f["ascending"], nulls_first=True)
+                    for f in step.fields
+                ]
+            else:
+                break
+
+            query, mode = _apply(query, clause, argument)
+            source_rewrites.append(_record(source.name, step.name, clause, mode, sql, query, dialect))
+            sql = source_rewrites[-1].sql_after
+            absorbed[step.name] = source.name
+            current = step.name
+            # Nada além da ordenação: qualquer step depois dela leria a subconsulta sem ordem garantida
+            if clause == "ORDER BY":
+                break
+
+        if source_rewrites:
+            new_sql[source.name] = sql
+            rewrites.extend(source_rewrites)
+
+    return _rebuild(ktr_model, new_sql, absorbed), rewrites
+
+def _projection_types(query: exp.Expression) -> Dict[str, bool]:
+    """Colunas do SELECT cuja ordem independe de collation (casts e agregações numéricas ou de data)"""
+    if not isinstance(query, exp.Select):
+        return {}
+    orderable_types = exp.DataType.NUMERIC_TYPES | exp.DataType.TEMPORAL_TYPES
+    types = {}
+    for projection in query.expressions:
+        value = projection.unalias()
+        if isinstance(value, (exp.Count, exp.Sum, exp.Avg)) or (isinstance(value, exp.Literal) and value.is_number):
+            types[projection.alias_or_name.lower()] = True
+        elif isinstance(value, exp.Cast):
+            types[projection.alias_or_name.lower()] = value.to.this in orderable_types
+    return types
+
+def _sort_matches_pandas(ktr_model: KTRModel, source: TableInputStep, step: SortRowsStep,
+                         column_types: Dict[str, bool]) -> bool:
+    """
+    ORDER BY no banco dá a mesma ordem do sort_values: collation binária na
+    conexão, ou todas as chaves numéricas/de data (metadados do KTR ou do SELECT)
+    """
+    connection = ktr_model.get_connection(source.connection_name)
+    if connection and (
+        connection.type.upper() == "SQLITE"
+        or str(connection.attributes.get("COLLATION", "")).upper() in BINARY_COLLATIONS
+    ):
+        return True
+    declared = {field.name: field.type for field in upstream_fields(ktr_model, step.name)}
+    return all(
+        declared.get(f["name"]) in ORDERABLE_TYPES or column_types.get(f["name"].lower(), False)
+        for f in step.fields
+    )
+
+def _prune_columns(ktr_model: KTRModel) -> Tuple[KTRModel, List[PushdownRewrite]]:
+    """SELECT de cada TableInput reduzido às colunas consumidas a jusante"""
+    needed = required_columns(ktr_model)
+    rewrites: List[PushdownRewrite] = []
+    new_sql: Dict[str, str] = {}
+
+    for source in ktr_model.steps:
+        if not isinstance(source, TableInputStep) or needed.get(source.name) is None:
+            continue
+        dialect = _dialect(ktr_model, source)
+        query = _parse(source.sql, dialect)
+        if query is None:
+            continue
+        projected = _project(query, needed[source.name], dialect)
+        if projected is None:
+            continue
+        rewrites.append(_record(source.name, source.name, "SELECT", "merge", source.sql.strip(), projected, dialect))
+        new_sql[source.name] = rewrites[-1].sql_after
+
+    return _rebuild(ktr_model, new_sql), rewrites
+
+def _project(query: exp.Query, columns: Set[str], dialect: str) -> Optional[exp.Query]:
+    """
+    Consulta só com as colunas pedidas; None quando não há o que reduzir ou
+    quando tirar colunas mudaria as linhas (DISTINCT, UNION) ou referências
+    (posições no ORDER BY/GROUP BY, aliases usados em outras cláusulas)
+    """
+    if not isinstance(query, exp.Select) or query.args.get("distinct"):
+        return None
+    projections = query.expressions
+
+    stars = [p for p in projections if isinstance(p, exp.Star)]
+    if stars:
+        # SELECT * de uma única tabela vira a lista explícita; com junções os nomes seriam ambíguos
+        if len(projections) != 1 or query.args.get("joins") or not columns:
+            return None
+        return query.select(*(_column(name, dialect) for name in sorted(columns)), append=False)
+    if any(isinstance(p, exp.Column) and isinstance(p.this, exp.Star) for p in projections):
+        return None
+
+    clauses = [query.args.get(key) for key in ("group", "order", "having", "qualify")]
+    keys = [e for clause in clauses if clause for e in (clause.expressions if clause.expressions else [clause.this])]
+    if any(isinstance(key, exp.Literal) or isinstance(getattr(key, "this", None), exp.Literal) for key in keys):
+        return None
+    referenced = {column.name.lower() for clause in clauses if clause for column in clause.find_all(exp.Column)}
+
+    wanted = {name.lower() for name in columns}
+    kept = [p for p in projections if p.alias_or_name.lower() in wanted | referenced] or projections[:1]
+    if len(kept) == len(projections):
+        return None
+    return query.select(*kept, append=False)
+
+def _column(name: str, dialect: str) -> exp.Column:
+    """Coluna com o nome exato do stream: PostgreSQL e Oracle só preservam maiúsculas entre aspas"""
+    quoted = portable_identifier(name) != name or (dialect in ("postgres", "oracle") and name != name.lower())
+    return exp.column(name, quoted=quoted)
+
+def _rebuild(ktr_model: KTRModel, new_sql: Dict[str, str], absorbed: Optional[Dict[str, str]] = None) -> KTRModel:
+    """Modelo com as consultas reescritas e os steps absorvidos religados à origem"""
+    absorbed = absorbed or {}
+    if not new_sql:
+        return ktr_model
+    steps = []
+    for step in ktr_model.steps:
+        if step.name in absorbed:
+            continue
+        if step.name in new_sql:
+            step = copy.copy(step)
+            step.sql = new_sql[step.name]
+            step.limit = 0
+        steps.append(step)
+    hops = [
+        Hop(absorbed.get(hop.from_step, hop.from_step), hop.to_step, hop.enabled)
+        for hop in ktr_model.hops
+        if hop.to_step not in absorbed
+    ]
+    return KTRModel(
+        name=ktr_model.name, description=ktr_model.description, connections=ktr_model.connections,
+        steps=steps, hops=hops, parameters=ktr_model.parameters
+    )
+
+def ordered_sources(rewrites: List[PushdownRewrite]) -> set:
+    """
+    TableInputs cuja consulta passou a ter ORDER BY ou LIMIT (leitura única, sem faixas paralelas)
+
+    Faixas sobre uma consulta com LIMIT aplicariam o limite em cada faixa,
+    e sem ORDER BY cada uma poderia escolher linhas diferentes.
+    """
+    return {rewrite.source for rewrite in rewrites if rewrite.clause in ("ORDER BY", "LIMIT")}
+
+def filtered_sources(rewrites: List[PushdownRewrite]) -> set:
+    """TableInputs que absorveram WHERE ou LIMIT: extração vazia é resultado válido, não falha"""
+    return {rewrite.source for rewrite in rewrites if rewrite.clause in ("WHERE", "LIMIT")}
+
+def _dialect(ktr_model: KTRModel, source: TableInputStep) -> Optional[str]:
+    connection = ktr_model.get_connection(source.connection_name)
+    return DIALECTS.get(connection.type.upper()) if connection else None
+
+def _parse(sql: str, dialect: Optional[str]) -> Optional[exp.Expression]:
+    """SELECT analisável e sem parâmetros; variáveis ${...} só são resolvidas em execução"""
+    sql = sql.strip().rstrip(";").strip()
+    if dialect is None or not sql or "${" in sql or "%%" in sql:
+        return None
+    try:
+        statements = sqlglot.parse(sql, read=dialect)
+    except SqlglotError as e:
+        logger.debug(f"Consulta não analisável para pushdown: {e}")
+        return None
+    if len(statements) != 1 or not isinstance(statements[0], exp.Query):
+        return None
+    query = statements[0]
+    if query.find(exp.Placeholder, exp.Parameter):
+        return None
+    return query
+
+def _single_consumer(ktr_model: KTRModel, name: str):
+    """Único step a jusante, desde que ele só leia deste step"""
+    downstream = ktr_model.get_downstream_steps(name)
+    if len(downstream) != 1 or len(ktr_model.get_upstream_steps(downstream[0])) != 1:
+        return None
+    if len(ktr_model.get_outgoing_hops(name)) != 1 or len(ktr_model.get_incoming_hops(downstream[0])) != 1:
+        return None
+    return ktr_model.get_step(downstream[0])
+
+def _apply(query: exp.Query, clause: str, argument: Any) -> Tuple[exp.Query, str]:
+    """Acrescenta a cláusula à consulta ou, quando isso mudaria o resultado, a uma subconsulta"""
+    if clause == "LIMIT":
+        if isinstance(query, exp.Select) and not query.args.get("limit") and not query.args.get("offset"):
+            return query.limit(argument), "merge"
+        return _wrap(query).limit(argument), "subquery"
+
+    if clause == "WHERE":
+        columns = list(argument.find_all(exp.Column))
+        mapping = _resolve(query, [column.name for column in columns], where=True)
+        if mapping is None:
+            return _wrap(query).where(argument), "subquery"
+        argument = argument.copy()
+        for column in list(argument.find_all(exp.Column)):
+            column.replace(mapping[column.name].copy())
+        return query.where(argument), "merge"
+
+    mapping = _resolve(query, [ordered.this.name for ordered in argument], where=False)
+    if mapping is None:
+        return _wrap(query).order_by(*argument), "subquery"
+    keys = [exp.Ordered(this=mapping[o.this.name].copy(), desc=o.args.get("desc"), nulls_first=True) for o in argument]
+    # Ordenação estável: a ordem anterior da consulta desempata as novas chaves
+    previous = query.args["order"].expressions if query.args.get("order") else []
+    return query.order_by(*keys, *previous, append=False), "merge"
+
+def _resolve(query: exp.Query, names: List[str], where: bool) -> Optional[Dict[str, exp.Expression]]:
+    """
+    Expressão de cada coluna de saída referenciada, se a cláusula puder ir
+    direto na consulta; None quando ela precisa envolver a consulta
+
+    WHERE atua antes de agregações, DISTINCT e limites, então só se aplica a
+    SELECTs simples; ORDER BY atua depois de tudo, exceto do limite. Colunas
+    calculadas (ou de um * com junções) também exigem a subconsulta.
+    """
+    if not isinstance(query, exp.Select) or query.args.get("limit") or query.args.get("offset"):
+        return None
+    if where and (
+        query.args.get("group") or query.args.get("having") or query.args.get("distinct")
+        or query.args.get("qualify") or any(p.find(exp.AggFunc, exp.Window) for p in query.expressions)
+    ):
+        return None
+
+    outputs: Dict[str, Optional[exp.Expression]] = {}
+    star = False
+    for projection in query.expressions:
+        inner = projection.this if isinstance(projection, exp.Alias) else projection
+        if isinstance(inner, exp.Star) or (isinstance(inner, exp.Column) and isinstance(inner.this, exp.Star)):
+            star = True
+        elif isinstance(inner, exp.Column):
+            outputs[projection.alias_or_name] = inner
+        else:
+            outputs[projection.alias_or_name] = None
+    single_table = not query.args.get("joins")
+
+    mapping = {}
+    for name in names:
+        if name in outputs:
+            if outputs[name] is None:
+                return None
+            mapping[name] = outputs[name]
+        elif star and single_table:
+            mapping[name] = _identifier(name)
+        else:
+            return None
+    return mapping
+
+def _identifier(name: str) -> exp.Column:
+    return sqlglot.parse_one(portable_identifier(name), into=exp.Column)
+
+def _wrap(query: exp.Query) -> exp.Select:
+    return exp.select("*").from_(query.subquery("q"))
+
+def _record(source: str, step: str, clause: str, mode: str, sql_before: str,
+            query: exp.Query, dialect: str) -> PushdownRewrite:
+    return PushdownRewrite(
+        source=source, step=step, clause=clause, mode=mode,
+        sql_before=sql_before, sql_after=query.sql(dialect=dialect, pretty=True)
+    )
@@ -9,6 +9,8 @@ class StepType(Enum):
     """Tipos de steps do Pentaho"""
     TABLE_INPUT = "TableInput"
     TABLE_OUTPUT = "TableOutput"
+    INSERT_UPDATE = "InsertUpdate"
+    UPDATE = "Update"
     EXCEL_INPUT = "ExcelInput"
     EXCEL_OUTPUT = "ExcelOutput"
     TEXT_FILE_INPUT = "TextFileInput"
@@ -70,6 +72,11 @@ class Step:
     type: StepType = StepType.TABLE_INPUT  # Valor padrão temporário
     description: str = ""
     config: Dict[str, Any] = field(default_factory=dict)
+    copies: int = 1                     # <copies>: instâncias paralelas do step
+    distribute: bool = True             # <distribute>: Y = round-robin entre destinos, N = cópia
+    partition_method: str = ""          # "" (sem particionamento) ou "mod" (ModPartitioner)
+    partition_schema: str = ""
+    partition_field: str = ""
     
     @property
     def is_input(self) -> bool:
@@ -86,6 +93,8 @@ class Step:
         """Verifica se é um step de saída"""
         return self.type in [
             StepType.TABLE_OUTPUT,
+            StepType.INSERT_UPDATE,
+            StepType.UPDATE,
             StepType.EXCEL_OUTPUT,
             StepType.TEXT_FILE_OUTPUT,
             StepType.JSON_OUTPUT
@@ -108,16 +117,20 @@ class TableInputStep(Step):
 
 @dataclass
 class TableOutputStep(Step):
-    """Step específico para TableOutput"""
+    """Step específico para TableOutput (e InsertUpdate/Update, via load_mode)"""
     connection_name: str = ""
     schema: str = ""
     table: str = ""
     truncate: bool = False
     commit_size: int = 1000
-    field_mapping: Dict[str, str] = field(default_factory=dict)
+    field_mapping: Dict[str, str] = field(default_factory=dict)     # stream → coluna
+    load_mode: str = "insert"                                       # "insert", "upsert" ou "update"
+    key_fields: Dict[str, str] = field(default_factory=dict)        # stream → coluna chave
+    update_columns: List[str] = field(default_factory=list)         # colunas atualizadas (vazio = todas não-chave)
     
     def __post_init__(self):
-        self.type = StepType.TABLE_OUTPUT
+        if self.type not in (StepType.INSERT_UPDATE, StepType.UPDATE):
+            self.type = StepType.TABLE_OUTPUT
 
 @dataclass
 class ExcelInputStep(Step):
@@ -140,6 +153,47 @@ class StringOperationsStep(Step):
     def __post_init__(self):
         self.type = StepType.STRING_OPERATIONS
 
+@dataclass
+class SelectValuesStep(Step):
+    """Step específico para SelectValues"""
+    fields: List[Dict[str, str]] = field(default_factory=list)      # {"name", "rename"} na ordem de saída
+    select_unspecified: bool = False                                # mantém os campos não listados
+    remove: List[str] = field(default_factory=list)
+    meta: List[Dict[str, str]] = field(default_factory=list)        # {"name", "rename", "type"}
+
+    def __post_init__(self):
+        self.type = StepType.SELECT_VALUES
+
+@dataclass
+class FilterRowsStep(Step):
+    """Step específico para FilterRows"""
+    # {"negated", "operator", "leftvalue", "function", "rightvalue", "value", "conditions"}
+    condition: Dict[str, Any] = field(default_factory=dict)
+    send_true_to: str = ""
+    send_false_to: str = ""
+
+    def __post_init__(self):
+        self.type = StepType.FILTER_ROWS
+
+@dataclass
+class SortRowsStep(Step):
+    """Step específico para SortRows"""
+    fields: List[Dict[str, Any]] = field(default_factory=list)      # {"name", "ascending", "case_sensitive"}
+    unique_rows: bool = False
+
+    def __post_init__(self):
+        self.type = StepType.SORT_ROWS
+
+@dataclass
+class GroupByStep(Step):
+    """Step específico para GroupBy"""
+    group_fields: List[str] = field(default_factory=list)
+    aggregates: List[Dict[str, str]] = field(default_factory=list)  # {"name", "subject", "type"}
+    all_rows: bool = False
+
+    def __post_init__(self):
+        self.type = StepType.GROUP_BY
+
 @dataclass
 class KTRModel:
     """Modelo completo do arquivo KTR"""
@@ -150,19 +204,117 @@ class KTRModel:
     hops: List[Hop] = field(default_factory=list)
     parameters: Dict[str, Any] = field(default_factory=dict)
     
+    # Índices derivados, construídos sob demanda (não entram em eq/repr/pickle)
+    _index: Dict[str, Any] = field(default_factory=dict, init=False, repr=False, compare=False)
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_index"] = {}
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._index = {}
+    
+    def _get_index(self) -> Dict[str, Any]:
+        """
+        Retorna os índices nome→objeto e as listas de adjacência
+        
+        São reconstruídos automaticamente quando as listas de steps, hops ou
+        conexões são substituídas ou mudam de tamanho. Alterações in-place que
+        preservam o tamanho (ex.: renomear um step) exigem invalidate_indexes().
+        """
+        signature = (
+            id(self.steps), len(self.steps),
+            id(self.hops), len(self.hops),
+            id(self.connections), len(self.connections),
+        )
+        if self._index.get("signature") == signature:
+            return self._index
+        
+        steps_by_name: Dict[str, Step] = {}
+        for step in self.steps:
+            steps_by_name.setdefault(step.name, step)
+        
+        connections_by_name: Dict[str, Connection] = {}
+        for conn in self.connections:
+            connections_by_name.setdefault(conn.name, conn)
+        
+        incoming: Dict[str, List[Hop]] = {}
+        outgoing: Dict[str, List[Hop]] = {}
+        upstream: Dict[str, List[str]] = {}
+        downstream: Dict[str, List[str]] = {}
+        for hop in self.hops:
+            incoming.setdefault(hop.to_step, []).append(hop)
+            outgoing.setdefault(hop.from_step, []).append(hop)
+            if hop.enabled:
+                upstream.setdefault(hop.to_step, []).append(hop.from_step)
+                downstream.setdefault(hop.from_step, []).append(hop.to_step)
+        
+        self._index = {
+            "signature": signature,
+            "steps": steps_by_name,
+            "connections": connections_by_name,
+            "incoming": incoming,
+            "outgoing": outgoing,
+            "upstream": upstream,
+            "downstream": downstream,
+            "graph": None,
+        }
+        return self._index
+    
+    def invalidate_indexes(self):
+        """Descarta os índices e o grafo em cache"""
+        self._index = {}
+    
     def get_connection(self, name: str) -> Optional[Connection]:
         """Busca conexão por nome"""
-        for conn in self.connections:
-            if conn.name == name:
-                return conn
-        return None
+        return self._get_index()["connections"].get(name)
     
     def get_step(self, name: str) -> Optional[Step]:
         """Busca step por nome"""
-        for step in self.steps:
-            if step.name == name:
-                return step
-        return None
+        return self._get_index()["steps"].get(name)
+    
+    def get_incoming_hops(self, step_name: str) -> List[Hop]:
+        """Hops (habilitados ou não) que chegam ao step"""
+        return self._get_index()["incoming"].get(step_name, [])
+    
+    def get_outgoing_hops(self, step_name: str) -> List[Hop]:
+        """Hops (habilitados ou não) que saem do step"""
+        return self._get_index()["outgoing"].get(step_name, [])
+    
+    def get_upstream_steps(self, step_name: str) -> List[str]:
+        """Nomes dos steps que alimentam este step por hops habilitados"""
+        return self._get_index()["upstream"].get(step_name, [])
+    
+    def get_downstream_steps(self, step_name: str) -> List[str]:
+        """Nomes dos steps alimentados por este step via hops habilitados"""
+        return self._get_index()["downstream"].get(step_name, [])
+    
+    def get_graph(self):
+        """
+        Grafo direcionado (networkx.DiGraph) dos hops habilitados
+        
+        A instância é compartilhada entre analisador, gerador e plataforma:
+        trate-a como somente leitura e use .copy() antes de modificá-la.
+        """
+        index = self._get_index()
+        if index["graph"] is None:
+            import networkx as nx
+            
+            graph = nx.DiGraph()
+            
+            # Adicionar steps como nós
+            for step in self.steps:
+                graph.add_node(step.name, step_type=step.type.value, step_obj=step)
+            
+            # Adicionar hops como arestas
+            for hop in self.hops:
+                if hop.enabled:
+                    graph.add_edge(hop.from_step, hop.to_step)
+            
+            index["graph"] = graph
+        return index["graph"]
     
     def get_input_steps(self) -> List[Step]:
         """Retorna todos os steps de entrada"""
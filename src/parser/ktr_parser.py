@@ -2,47 +2,75 @@
 Parser principal para arquivos KTR do Pentaho
 Converte XML do KTR em modelo interno Python
 """
+import os
 import xml.etree.ElementTree as ET
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from loguru import logger
 import re
 
 from src.models.ktr_models import (
     KTRModel, Connection, Step, Hop, Field,
     TableInputStep, TableOutputStep, ExcelInputStep, 
-    StringOperationsStep, StepType
+    StringOperationsStep, SelectValuesStep, FilterRowsStep,
+    SortRowsStep, GroupByStep, StepType
 )
 
+# Versão do formato do modelo produzido; altere ao mudar o parse ou o KTRModel
+# (invalida entradas do cache persistente)
+PARSER_VERSION = "1.5.0"
+
+# Arquivos maiores que este limite são lidos em modo streaming (iterparse)
+STREAMING_THRESHOLD_BYTES = 5 * 1024 * 1024
+
 class KTRParser:
     """Parser principal para arquivos KTR"""
     
-    def __init__(self):
+    def __init__(self, streaming_threshold: int = STREAMING_THRESHOLD_BYTES):
+        self.streaming_threshold = streaming_threshold
         self.step_parsers = {
             "TableInput": self._parse_table_input,
             "TableOutput": self._parse_table_output,
+            "InsertUpdate": self._parse_insert_update,
+            "Update": self._parse_insert_update,
             "ExcelInput": self._parse_excel_input,
             "StringOperations": self._parse_string_operations,
+            "SelectValues": self._parse_select_values,
+            "FilterRows": self._parse_filter_rows,
+            "SortRows": self._parse_sort_rows,
+            "GroupBy": self._parse_group_by,
         }
     
-    def parse_file(self, ktr_file_path: str) -> KTRModel:
+    def parse_file(self, ktr_file_path: str, streaming: Optional[bool] = None) -> KTRModel:
         """
         Parse completo do arquivo KTR
+        
+        Args:
+            ktr_file_path: Caminho do arquivo .ktr
+            streaming: True força o modo iterparse, False força o DOM completo e
+                None escolhe automaticamente pelo tamanho do arquivo
         """
         logger.info(f"🔍 Analisando arquivo KTR: {ktr_file_path}")
         
+        if streaming is None:
+            streaming = os.path.getsize(ktr_file_path) >= self.streaming_threshold
+        
         try:
-            tree = ET.parse(ktr_file_path)
-            root = tree.getroot()
-            
-            # Extrair informações básicas
-            info = root.find('info')
-            name = info.find('name').text if info.find('name') is not None else "unnamed_pipeline"
-            description = info.find('description').text if info.find('description') is not None else ""
+            if streaming:
+                name, description, partition_schemas, connections, steps, hops = self._parse_streaming(ktr_file_path)
+            else:
+                tree = ET.parse(ktr_file_path)
+                root = tree.getroot()
+                
+                # Extrair informações básicas
+                name, description = self._parse_info(root.find('info'))
+                partition_schemas = self._parse_partition_schemas(root.find('info'))
+                
+                # Parse de cada seção
+                connections = self._parse_connections(root)
+                steps = self._parse_steps(root)
+                hops = self._parse_hops(root)
             
-            # Parse de cada seção
-            connections = self._parse_connections(root)
-            steps = self._parse_steps(root)
-            hops = self._parse_hops(root)
+            self._apply_partition_schemas(steps, partition_schemas)
             
             model = KTRModel(
                 name=name,
@@ -52,86 +80,207 @@ class KTRParser:
                 hops=hops
             )
             
-            logger.info(f"✅ KTR analisado: {len(connections)} conexões, {len(steps)} steps, {len(hops)} hops")
+            modo = "streaming" if streaming else "DOM"
+            logger.info(f"✅ KTR analisado ({modo}): {len(connections)} conexões, {len(steps)} steps, {len(hops)} hops")
             return model
             
         except Exception as e:
             logger.error(f"❌ Erro ao analisar KTR: {e}")
             raise
     
+    def _parse_streaming(self, ktr_file_path: str) -> Tuple[str, str, Dict[str, int], List[Connection], List[Step], List[Hop]]:
+        """
+        Parse incremental via iterparse
+        
+        Cada conexão, step e hop é convertido assim que seu elemento fecha e
+        o elemento é descartado em seguida, de modo que o pico de memória não
+        cresce com SQL embutido, notas da GUI ou blocos de tabelas de log.
+        """
+        name, description = "unnamed_pipeline", ""
+        partition_schemas: Dict[str, int] = {}
+        connections: List[Connection] = []
+        steps: List[Step] = []
+        hops: List[Hop] = []
+        
+        # Pilha de elementos abertos; mesma semântica de root.find() (primeira ocorrência)
+        stack: List[ET.Element] = []
+        info_done = False
+        order_done = False
+        
+        for event, elem in ET.iterparse(ktr_file_path, events=("start", "end")):
+            if event == "start":
+                stack.append(elem)
+                continue
+            
+            stack.pop()
+            depth = len(stack)
+            
+            if depth == 2:
+                parent = stack[-1]
+                if parent.tag == 'info' and not info_done:
+                    # Blocos de log e parâmetros dentro de <info> não são usados
+                    if elem.tag not in ('name', 'description', 'partitionschemas'):
+                        parent.remove(elem)
+                elif parent.tag == 'order' and not order_done and elem.tag == 'hop':
+                    hop = self._parse_hop(elem)
+                    if hop is not None:
+                        hops.append(hop)
+                    parent.remove(elem)
+            
+            elif depth == 1:
+                if elem.tag == 'info' and not info_done:
+                    name, description = self._parse_info(elem)
+                    partition_schemas = self._parse_partition_schemas(elem)
+                    info_done = True
+                elif elem.tag == 'connection':
+                    connection = self._parse_connection(elem)
+                    if connection is not None:
+                        connections.append(connection)
+                elif elem.tag == 'step':
+                    step = self._parse_step(elem)
+                    if step is not None:
+                        steps.append(step)
+                elif elem.tag == 'order':
+                    order_done = True
+                
+                # Elemento de primeiro nível já convertido: libera a subárvore
+                stack[0].remove(elem)
+        
+        return name, description, partition_schemas, connections, steps, hops
+    
+    def _parse_info(self, info_elem: Optional[ET.Element]) -> Tuple[str, str]:
+        """Parse do bloco <info> (nome e descrição da transformação)"""
+        if info_elem is None:
+            return "unnamed_pipeline", ""
+        name = info_elem.find('name').text if info_elem.find('name') is not None else "unnamed_pipeline"
+        description = info_elem.find('description').text if info_elem.find('description') is not None else ""
+        return name, description
+    
+    def _parse_partition_schemas(self, info_elem: Optional[ET.Element]) -> Dict[str, int]:
+        """Número de partições de cada <partitionschema> declarado em <info>"""
+        schemas = {}
+        if info_elem is None or info_elem.find('partitionschemas') is None:
+            return schemas
+        
+        for schema_elem in info_elem.find('partitionschemas').findall('partitionschema'):
+            count = len(schema_elem.findall('partition'))
+            per_slave = self._find_text(schema_elem, 'partitions_per_slave')
+            if self._find_text(schema_elem, 'dynamic') == 'Y' and per_slave.isdigit():
+                count = int(per_slave)
+            schemas[self._find_text(schema_elem, 'name')] = count
+        
+        return schemas
+    
+    def _apply_partition_schemas(self, steps: List[Step], partition_schemas: Dict[str, int]):
+        """Steps particionados rodam uma cópia por partição do schema (como no Pentaho)"""
+        for step in steps:
+            partitions = partition_schemas.get(step.partition_schema, 0)
+            if step.partition_method and partitions > 1:
+                step.copies = partitions
+    
     def _parse_connections(self, root: ET.Element) -> List[Connection]:
         """Parse das conexões de banco de dados"""
         connections = []
         
         for conn_elem in root.findall('connection'):
-            try:
-                name = conn_elem.find('name').text
-                server = conn_elem.find('server').text or ""
-                db_type = conn_elem.find('type').text
-                database = conn_elem.find('database').text or ""
-                port = int(conn_elem.find('port').text) if conn_elem.find('port') is not None else 5432
-                username = conn_elem.find('username').text or ""
-                password = conn_elem.find('password').text or ""
-                
-                # Parse de atributos adicionais
-                attributes = {}
-                attrs_elem = conn_elem.find('attributes')
-                if attrs_elem is not None:
-                    for attr in attrs_elem.findall('attribute'):
-                        code = attr.find('code').text
-                        value = attr.find('attribute').text
-                        attributes[code] = value
-                
-                connection = Connection(
-                    name=name,
-                    type=db_type,
-                    server=server,
-                    database=database,
-                    port=port,
-                    username=username,
-                    password=password,
-                    attributes=attributes
-                )
-                
+            connection = self._parse_connection(conn_elem)
+            if connection is not None:
                 connections.append(connection)
-                logger.debug(f"📡 Conexão encontrada: {name} ({db_type})")
-                
-            except Exception as e:
-                logger.warning(f"⚠️ Erro ao parse de conexão: {e}")
-                continue
         
         return connections
     
+    def _parse_connection(self, conn_elem: ET.Element) -> Optional[Connection]:
+        """Parse de um elemento <connection>"""
+        try:
+            name = conn_elem.find('name').text
+            server = conn_elem.find('server').text or ""
+            db_type = conn_elem.find('type').text
+            database = conn_elem.find('database').text or ""
+            port = int(conn_elem.find('port').text) if conn_elem.find('port') is not None else 5432
+            username = conn_elem.find('username').text or ""
+            password = conn_elem.find('password').text or ""
+            
+            # Parse de atributos adicionais
+            attributes = {}
+            attrs_elem = conn_elem.find('attributes')
+            if attrs_elem is not None:
+                for attr in attrs_elem.findall('attribute'):
+                    code = attr.find('code').text
+                    value = attr.find('attribute').text
+                    attributes[code] = value
+            
+            connection = Connection(
+                name=name,
+                type=db_type,
+                server=server,
+                database=database,
+                port=port,
+                username=username,
+                password=password,
+                attributes=attributes
+            )
+            
+            logger.debug(f"📡 Conexão encontrada: {name} ({db_type})")
+            return connection
+            
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao parse de conexão: {e}")
+            return None
+    
     def _parse_steps(self, root: ET.Element) -> List[Step]:
         """Parse dos steps do pipeline"""
         steps = []
         
         for step_elem in root.findall('step'):
-            try:
-                name = step_elem.find('name').text
-                step_type = step_elem.find('type').text
-                description = step_elem.find('description').text or ""
-                
-                # Use parser específico se disponível
-                if step_type in self.step_parsers:
-                    step = self.step_parsers[step_type](step_elem, name, description)
-                else:
-                    # Step genérico
-                    step = Step(
-                        name=name,
-                        type=StepType(step_type) if step_type in [e.value for e in StepType] else StepType.TABLE_INPUT,
-                        description=description
-                    )
-                
+            step = self._parse_step(step_elem)
+            if step is not None:
                 steps.append(step)
-                logger.debug(f"🔧 Step encontrado: {name} ({step_type})")
-                
-            except Exception as e:
-                logger.warning(f"⚠️ Erro ao parse de step: {e}")
-                continue
         
         return steps
     
+    def _parse_step(self, step_elem: ET.Element) -> Optional[Step]:
+        """Parse de um elemento <step>"""
+        try:
+            name = step_elem.find('name').text
+            step_type = step_elem.find('type').text
+            description = self._find_text(step_elem, 'description')
+            
+            # Use parser específico se disponível
+            if step_type in self.step_parsers:
+                step = self.step_parsers[step_type](step_elem, name, description)
+            else:
+                # Step genérico
+                step = Step(
+                    name=name,
+                    type=StepType(step_type) if step_type in [e.value for e in StepType] else StepType.TABLE_INPUT,
+                    description=description
+                )
+            
+            self._parse_step_execution(step_elem, step)
+            logger.debug(f"🔧 Step encontrado: {name} ({step_type})")
+            return step
+            
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao parse de step: {e}")
+            return None
+    
+    def _parse_step_execution(self, step_elem: ET.Element, step: Step):
+        """Cópias, distribuição e particionamento do step (<copies>, <distribute>, <partitioning>)"""
+        copies = self._find_text(step_elem, 'copies', '1').strip()
+        # Cópias parametrizadas (ex.: ${COPIES}) não são resolvidas na conversão
+        step.copies = max(1, int(copies)) if copies.isdigit() else 1
+        step.distribute = self._find_text(step_elem, 'distribute', 'Y') == 'Y'
+        
+        partitioning = step_elem.find('partitioning')
+        if partitioning is not None:
+            method = self._find_text(partitioning, 'method', 'none')
+            if method == 'ModPartitioner':
+                step.partition_method = "mod"
+                step.partition_schema = self._find_text(partitioning, 'schema_name')
+                step.partition_field = self._find_text(partitioning, 'field_name')
+            elif method not in ('none', ''):
+                logger.warning(f"⚠️ {step.name}: particionamento '{method}' não suportado, usando distribuição round-robin")
+    
     def _parse_hops(self, root: ET.Element) -> List[Hop]:
         """Parse das conexões entre steps (hops)"""
         hops = []
@@ -139,26 +288,39 @@ class KTRParser:
         order_elem = root.find('order')
         if order_elem is not None:
             for hop_elem in order_elem.findall('hop'):
-                try:
-                    from_step = hop_elem.find('from').text
-                    to_step = hop_elem.find('to').text
-                    enabled = hop_elem.find('enabled').text == 'Y'
-                    
-                    hop = Hop(
-                        from_step=from_step,
-                        to_step=to_step,
-                        enabled=enabled
-                    )
-                    
+                hop = self._parse_hop(hop_elem)
+                if hop is not None:
                     hops.append(hop)
-                    logger.debug(f"🔗 Hop encontrado: {from_step} → {to_step}")
-                    
-                except Exception as e:
-                    logger.warning(f"⚠️ Erro ao parse de hop: {e}")
-                    continue
         
         return hops
     
+    def _parse_hop(self, hop_elem: ET.Element) -> Optional[Hop]:
+        """Parse de um elemento <hop>"""
+        try:
+            from_step = hop_elem.find('from').text
+            to_step = hop_elem.find('to').text
+            enabled = hop_elem.find('enabled').text == 'Y'
+            
+            hop = Hop(
+                from_step=from_step,
+                to_step=to_step,
+                enabled=enabled
+            )
+            
+            logger.debug(f"🔗 Hop encontrado: {from_step} → {to_step}")
+            return hop
+            
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao parse de hop: {e}")
+            return None
+    
+    def _find_text(self, elem: ET.Element, tag: str, default: str = "") -> str:
+        """Texto de um subelemento, tolerando tag ausente ou vazia"""
+        child = elem.find(tag)
+        if child is None or child.text is None:
+            return default
+        return child.text
+    
     def _parse_table_input(self, step_elem: ET.Element, name: str, description: str) -> TableInputStep:
         """Parse específico para TableInput"""
         connection_name = step_elem.find('connection').text if step_elem.find('connection') is not None else ""
@@ -185,10 +347,10 @@ class KTRParser:
         truncate = step_elem.find('truncate').text == 'Y' if step_elem.find('truncate') is not None else False
         commit_size = int(step_elem.find('commit').text) if step_elem.find('commit') is not None else 1000
         
-        # Parse field mapping
+        # Parse field mapping (specify_fields=N: o Pentaho ignora a lista e grava todos os campos)
         field_mapping = {}
         fields_elem = step_elem.find('fields')
-        if fields_elem is not None:
+        if fields_elem is not None and self._find_text(step_elem, 'specify_fields', 'Y') == 'Y':
             for field_elem in fields_elem.findall('field'):
                 column_name = field_elem.find('column_name').text
                 stream_name = field_elem.find('stream_name').text
@@ -205,6 +367,52 @@ class KTRParser:
             field_mapping=field_mapping
         )
     
+    def _parse_insert_update(self, step_elem: ET.Element, name: str, description: str) -> TableOutputStep:
+        """
+        Parse específico para InsertUpdate e Update
+        
+        Em <key>, <name> é o campo do stream e <field> a coluna da tabela; em
+        <value>, <name> é a coluna e <rename> o campo do stream. Update só
+        altera linhas existentes; InsertUpdate insere as demais.
+        """
+        step_type = StepType(self._find_text(step_elem, 'type'))
+        lookup = step_elem.find('lookup')
+        if lookup is None:
+            lookup = ET.Element('lookup')
+        
+        key_fields = {}
+        for key_elem in lookup.findall('key'):
+            stream_name = self._find_text(key_elem, 'name')
+            column_name = self._find_text(key_elem, 'field') or stream_name
+            condition = self._find_text(key_elem, 'condition', '=')
+            if condition not in ('=', '= ~NULL'):
+                logger.warning(f"⚠️ {name}: condição '{condition}' na chave {column_name} tratada como igualdade")
+            key_fields[stream_name] = column_name
+        
+        field_mapping = {}
+        update_columns = []
+        for value_elem in lookup.findall('value'):
+            column_name = self._find_text(value_elem, 'name')
+            stream_name = self._find_text(value_elem, 'rename') or column_name
+            field_mapping[stream_name] = column_name
+            # <update>N</update>: coluna só é gravada na inserção
+            if self._find_text(value_elem, 'update', 'Y') == 'Y' and column_name not in key_fields.values():
+                update_columns.append(column_name)
+        
+        return TableOutputStep(
+            name=name,
+            type=step_type,
+            description=description,
+            connection_name=self._find_text(step_elem, 'connection'),
+            schema=self._find_text(lookup, 'schema'),
+            table=self._find_text(lookup, 'table'),
+            commit_size=int(self._find_text(step_elem, 'commit', '1000')),
+            field_mapping=field_mapping,
+            load_mode="upsert" if step_type == StepType.INSERT_UPDATE else "update",
+            key_fields=key_fields,
+            update_columns=update_columns
+        )
+    
     def _parse_excel_input(self, step_elem: ET.Element, name: str, description: str) -> ExcelInputStep:
         """Parse específico para ExcelInput"""
         file_elem = step_elem.find('file')
@@ -273,7 +481,115 @@ class KTRParser:
             description=description,
             operations=operations
         )
-    
+
+    def _parse_select_values(self, step_elem: ET.Element, name: str, description: str) -> SelectValuesStep:
+        """Parse específico para SelectValues (abas selecionar, remover e metadados)"""
+        fields_elem = step_elem.find('fields')
+        if fields_elem is None:
+            fields_elem = ET.Element('fields')
+
+        fields = [
+            {"name": self._find_text(f, 'name'), "rename": self._find_text(f, 'rename')}
+            for f in fields_elem.findall('field')
+        ]
+        remove = [self._find_text(r, 'name') for r in fields_elem.findall('remove')]
+        meta = [
+            {"name": self._find_text(m, 'name'), "rename": self._find_text(m, 'rename'), "type": self._find_text(m, 'type')}
+            for m in fields_elem.findall('meta')
+        ]
+
+        return SelectValuesStep(
+            name=name,
+            description=description,
+            fields=fields,
+            select_unspecified=self._find_text(fields_elem, 'select_unspecified', 'N') == 'Y',
+            remove=remove,
+            meta=meta
+        )
+
+    def _parse_filter_rows(self, step_elem: ET.Element, name: str, description: str) -> FilterRowsStep:
+        """Parse específico para FilterRows"""
+        condition_elem = step_elem.find('compare/condition')
+        send_false_to = self._find_text(step_elem, 'send_false_to')
+        if send_false_to:
+            logger.warning(f"⚠️ {name}: linhas falsas enviadas a '{send_false_to}' não são roteadas, apenas as verdadeiras seguem")
+
+        return FilterRowsStep(
+            name=name,
+            description=description,
+            condition=self._parse_condition(condition_elem) if condition_elem is not None else {},
+            send_true_to=self._find_text(step_elem, 'send_true_to'),
+            send_false_to=send_false_to
+        )
+
+    def _parse_condition(self, condition_elem: ET.Element) -> Dict[str, Any]:
+        """Condição do Pentaho (recursiva em <conditions>, combinadas pelo <operator> de cada filha)"""
+        condition = {
+            "negated": self._find_text(condition_elem, 'negated', 'N') == 'Y',
+            "operator": self._find_text(condition_elem, 'operator', '-'),
+            "leftvalue": self._find_text(condition_elem, 'leftvalue'),
+            "function": self._find_text(condition_elem, 'function', '='),
+            "rightvalue": self._find_text(condition_elem, 'rightvalue'),
+            "value": None,
+            "conditions": [],
+        }
+
+        value_elem = condition_elem.find('value')
+        if value_elem is not None:
+            condition["value"] = {
+                "type": self._find_text(value_elem, 'type', 'String'),
+                "text": self._find_text(value_elem, 'text'),
+                "isnull": self._find_text(value_elem, 'isnull', 'N') == 'Y',
+            }
+
+        conditions_elem = condition_elem.find('conditions')
+        if conditions_elem is not None:
+            condition["conditions"] = [self._parse_condition(c) for c in conditions_elem.findall('condition')]
+
+        return condition
+
+    def _parse_sort_rows(self, step_elem: ET.Element, name: str, description: str) -> SortRowsStep:
+        """Parse específico para SortRows"""
+        fields = []
+        fields_elem = step_elem.find('fields')
+        if fields_elem is not None:
+            for field_elem in fields_elem.findall('field'):
+                fields.append({
+                    "name": self._find_text(field_elem, 'name'),
+                    "ascending": self._find_text(field_elem, 'ascending', 'Y') == 'Y',
+                    "case_sensitive": self._find_text(field_elem, 'case_sensitive', 'Y') == 'Y',
+                })
+
+        return SortRowsStep(
+            name=name,
+            description=description,
+            fields=fields,
+            unique_rows=self._find_text(step_elem, 'unique_rows', 'N') == 'Y'
+        )
+
+    def _parse_group_by(self, step_elem: ET.Element, name: str, description: str) -> GroupByStep:
+        """Parse específico para GroupBy"""
+        group_fields = [self._find_text(f, 'name') for f in step_elem.findall('group/field')]
+        aggregates = [
+            {
+                "name": self._find_text(f, 'aggregate'),
+                "subject": self._find_text(f, 'subject'),
+                "type": self._find_text(f, 'type'),
+            }
+            for f in step_elem.findall('fields/field')
+        ]
+        all_rows = self._find_text(step_elem, 'all_rows', 'N') == 'Y'
+        if all_rows:
+            logger.warning(f"⚠️ {name}: 'incluir todas as linhas' não suportado, apenas os agregados são emitidos")
+
+        return GroupByStep(
+            name=name,
+            description=description,
+            group_fields=group_fields,
+            aggregates=aggregates,
+            all_rows=all_rows
+        )
+
     def _clean_sql(self, sql: str) -> str:
         """
         Limpa SQL do Pentaho removendo caracteres especiais
@@ -0,0 +1,136 @@
+"""
+Testes para a conversão em lote com manifesto
+"""
+import pytest
+from pathlib import Path
+import shutil
+import tempfile
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import src.batch.batch_converter as batch_converter_module
+from src.batch.batch_converter import BUILD_VERSION, BatchConverter, ConversionManifest
+
+EXAMPLE_KTR = Path(__file__).parent.parent / "examples" / "exemplo_simples.ktr"
+
+class TestBatchConverter:
+    """Testes do BatchConverter"""
+
+    def setup_method(self):
+        """Setup para cada teste"""
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.input_dir = self.tmp_dir / "ktrs"
+        self.output_dir = self.tmp_dir / "out"
+        self.input_dir.mkdir()
+        for i in range(3):
+            content = EXAMPLE_KTR.read_text(encoding="utf-8").replace(
+                "<name>exemplo_simples</name>", f"<name>exemplo_{i}</name>", 1
+            )
+            (self.input_dir / f"exemplo_{i}.ktr").write_text(content, encoding="utf-8")
+
+    def teardown_method(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _run(self, jobs: int = 1, force: bool = False, **options):
+        converter = BatchConverter(str(self.input_dir), str(self.output_dir), jobs=jobs, use_cache=False, force=force,
+                                   **options)
+        return converter.run(sorted(self.input_dir.glob("*.ktr")))
+
+    def test_rerun_skips_unchanged_files(self):
+        """Testa que a segunda execução pula arquivos já convertidos"""
+        first = self._run()
+        assert first.converted == 3
+        assert first.errors == 0
+
+        second = self._run()
+        assert second.converted == 0
+        assert second.skipped == 3
+
+        manifest = ConversionManifest(str(self.output_dir))
+        entry = manifest.entries["exemplo_0.ktr"]
+        assert entry.status == "success"
+        assert entry.pipeline_name == "exemplo_0"
+        assert len(entry.sha256) == 64
+
+    def test_changed_file_is_reconverted_in_parallel(self):
+        """Testa reconversão de arquivo alterado usando o pool de processos"""
+        self._run()
+        changed = self.input_dir / "exemplo_1.ktr"
+        changed.write_text(changed.read_text(encoding="utf-8") + "\n", encoding="utf-8")
+
+        summary = self._run(jobs=2)
+
+        assert summary.converted == 1
+        assert summary.skipped == 2
+        assert summary.files_per_second > 0
+
+    def test_same_transformation_name_does_not_collide(self):
+        """Testa que KTRs com o mesmo nome de transformação em pastas diferentes geram projetos separados"""
+        for folder in ("vendas", "compras"):
+            (self.input_dir / folder).mkdir()
+            shutil.copy(EXAMPLE_KTR, self.input_dir / folder / "carga.ktr")
+
+        converter = BatchConverter(str(self.input_dir), str(self.output_dir), jobs=2, use_cache=False)
+        summary = converter.run(sorted(self.input_dir.glob("*/carga.ktr")))
+
+        assert summary.converted == 2
+        entries = [converter.manifest.entries[str(Path(folder) / "carga.ktr")] for folder in ("compras", "vendas")]
+        assert [entry.pipeline_name for entry in entries] == ["exemplo_simples", "exemplo_simples"]
+        assert [Path(entry.output_dir) for entry in entries] == [
+            self.output_dir / "compras" / "carga", self.output_dir / "vendas" / "carga"
+        ]
+        assert all(Path(entry.output_dir, "src", "pipelines").is_dir() for entry in entries)
+
+    def test_outputs_from_previous_version_are_reconverted(self, monkeypatch):
+        """Testa que a retomada não pula saídas geradas por outra versão do parser/gerador"""
+        self._run()
+        entry = ConversionManifest(str(self.output_dir)).entries["exemplo_0.ktr"]
+        assert entry.version == BUILD_VERSION
+
+        monkeypatch.setattr(batch_converter_module, "BUILD_VERSION", "1.4.0-1.4.0")
+        summary = self._run()
+
+        assert summary.converted == 3
+        assert summary.skipped == 0
+        assert ConversionManifest(str(self.output_dir)).entries["exemplo_0.ktr"].version == "1.4.0-1.4.0"
+
+    def test_manifest_without_version_is_reconverted(self):
+        """Testa que entradas de manifestos antigos (sem versão) não são puladas"""
+        self._run()
+        manifest = ConversionManifest(str(self.output_dir))
+        for entry in manifest.entries.values():
+            entry.version = None
+        manifest.save()
+
+        summary = self._run()
+
+        assert summary.converted == 3
+        assert summary.skipped == 0
+
+    def test_changed_generation_options_are_reconverted(self):
+        """Testa que trocar engine, streaming ou pushdown reconverte arquivos com o mesmo conteúdo"""
+        self._run()
+        entry = ConversionManifest(str(self.output_dir)).entries["exemplo_0.ktr"]
+        assert entry.options == {"streaming": False, "chunk_size": None, "engine": "pandas",
+                                 "in_database": True, "pushdown": True}
+
+        for options in ({"engine": "polars"}, {"engine": "polars", "streaming": True},
+                        {"engine": "polars", "streaming": True, "pushdown": False}):
+            summary = self._run(jobs=2, **options)
+            assert (summary.converted, summary.skipped) == (3, 0), options
+            assert self._run(**options).skipped == 3
+
+        entry = ConversionManifest(str(self.output_dir)).entries["exemplo_0.ktr"]
+        assert (entry.options["engine"], entry.options["streaming"], entry.options["pushdown"]) == ("polars", True, False)
+        assert "polars" in Path(entry.output_dir, "requirements.txt").read_text(encoding="utf-8")
+
+        # Manifestos anteriores às opções também são reconvertidos
+        manifest = ConversionManifest(str(self.output_dir))
+        for stale in manifest.entries.values():
+            stale.options = None
+        manifest.save()
+        assert self._run(engine="polars", streaming=True, pushdown=False).converted == 3
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,1121 @@
+"""
+Testes para o gerador de código
+"""
+import pytest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+from concurrent.futures import ProcessPoolExecutor
+import importlib
+import tempfile
+import threading
+import time
+
+import pandas as pd
+import polars as pl
+import duckdb
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from src.generator.code_generator import CodeGenerator
+from src.generator.dataflow import build_dataflow_plan, to_identifier
+from src.generator.dtypes import read_options
+from src.generator.expressions import pandas_condition, polars_condition, portable_condition, sql_condition
+from src.generator.in_database import find_in_database_flows
+from src.models.ktr_models import (
+    KTRModel, Connection, ExcelInputStep, Field, Hop, Step, StepType, TableInputStep, TableOutputStep,
+    StringOperationsStep, SelectValuesStep, FilterRowsStep, SortRowsStep, GroupByStep
+)
+
+def build_fan_out_model() -> KTRModel:
+    """
+    Dois ramos independentes, um deles com fan-out:
+
+    clientes → upper → saida_upper
+             ↘ saida_bruta
+    pedidos → saida_pedidos
+    """
+    upper = StringOperationsStep("upper", operations=[
+        {"field_name": "nome", "trim_type": "none", "lower_upper": "upper", "padding_type": "none"}
+    ])
+    return KTRModel(
+        name="fan_out",
+        connections=[Connection("db", "POSTGRESQL", "localhost", "db", 5432, "u", "p")],
+        steps=[
+            TableOutputStep("saida_upper", connection_name="db", table="saida_upper"),
+            upper,
+            TableInputStep("clientes", connection_name="db", sql="SELECT nome FROM clientes"),
+            TableOutputStep("saida_bruta", connection_name="db", table="saida_bruta"),
+            TableInputStep("pedidos", connection_name="db", sql="SELECT id FROM pedidos"),
+            TableOutputStep("saida_pedidos", connection_name="db", table="saida_pedidos"),
+            TableInputStep("sem destino", connection_name="db", sql="SELECT 1"),
+        ],
+        hops=[
+            Hop("clientes", "upper"),
+            Hop("upper", "saida_upper"),
+            Hop("clientes", "saida_bruta"),
+            Hop("pedidos", "saida_pedidos"),
+        ]
+    )
+
+def build_sales_model() -> KTRModel:
+    """vendas → limpa → seleciona → filtra → ordena → agrupa → resumo (SQLite)"""
+    condition = {"negated": False, "operator": "-", "leftvalue": "", "function": "=", "rightvalue": "", "value": None, "conditions": [
+        {"negated": False, "operator": "-", "leftvalue": "valor", "function": ">", "rightvalue": "",
+         "value": {"type": "Number", "text": "10", "isnull": False}, "conditions": []},
+        {"negated": True, "operator": "AND", "leftvalue": "uf", "function": "IN LIST", "rightvalue": "",
+         "value": {"type": "String", "text": "RJ;MG", "isnull": False}, "conditions": []},
+    ]}
+    return KTRModel(
+        name="vendas",
+        connections=[Connection("db", "SQLITE", "", "", 0, "", "")],
+        steps=[
+            TableInputStep("vendas", connection_name="db", sql="SELECT * FROM vendas"),
+            StringOperationsStep("limpa", operations=[
+                {"field_name": "nome", "trim_type": "both", "lower_upper": "upper", "padding_type": "none"}
+            ]),
+            SelectValuesStep("seleciona", fields=[
+                {"name": "nome", "rename": "cliente"}, {"name": "uf", "rename": ""}, {"name": "valor", "rename": ""}
+            ], meta=[{"name": "valor", "rename": "", "type": "Number"}]),
+            FilterRowsStep("filtra", condition=condition),
+            SortRowsStep("ordena", fields=[
+                {"name": "uf", "ascending": True, "case_sensitive": False},
+                {"name": "cliente", "ascending": False, "case_sensitive": True},
+            ]),
+            GroupByStep("agrupa", group_fields=["uf"], aggregates=[
+                {"name": "total", "subject": "valor", "type": "SUM"},
+                {"name": "clientes", "subject": "cliente", "type": "COUNT_DISTINCT"},
+                {"name": "linhas", "subject": "", "type": "COUNT_ANY"},
+            ]),
+            TableOutputStep("resumo", connection_name="db", table="resumo", truncate=True),
+        ],
+        hops=[
+            Hop("vendas", "limpa"), Hop("limpa", "seleciona"), Hop("seleciona", "filtra"),
+            Hop("filtra", "ordena"), Hop("ordena", "agrupa"), Hop("agrupa", "resumo"),
+        ]
+    )
+
+def load_pipeline_class(ktr_model: KTRModel, tmp_dir: str, streaming: bool = False, engine: str = "pandas",
+                        in_database: bool = False, pushdown: bool = True):
+    """Renderiza o pipeline e retorna a classe gerada (ELT desligado: cargas passam pelo Python)"""
+    generator = CodeGenerator(streaming=streaming, engine=engine, in_database=in_database, pushdown=pushdown)
+    template_data = generator._prepare_template_data(ktr_model)
+    source = generator._generate_main_pipeline(template_data)
+    namespace = {"__name__": "generated_pipeline"}
+    exec(compile(source, "generated_pipeline.py", "exec"), namespace)
+    # Engines falsos: o teste não abre conexões reais
+    namespace["create_engine"] = MagicMock()
+    return namespace[template_data["pipeline_class_name"]]
+
+class TestDataflowGeneration:
+    """Testes da geração orientada pelos hops"""
+
+    def setup_method(self):
+        """Setup para cada teste"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def teardown_method(self):
+        self.tmp_dir.cleanup()
+
+    def test_plan_is_topological_and_prunes_dead_steps(self):
+        """Testa ordem topológica, reuso de frames e steps sem destino"""
+        plan = build_dataflow_plan(build_fan_out_model())
+        order = [node.step.name for node in plan.nodes]
+
+        assert order.index("clientes") < order.index("upper") < order.index("saida_upper")
+        assert order.index("pedidos") < order.index("saida_pedidos")
+        assert plan.skipped == ["sem destino"]
+
+        # O frame de clientes é copiado para a transformação e liberado no último consumidor
+        clientes = plan.get_node("clientes")
+        assert set(clientes.consumers) == {"upper", "saida_bruta"}
+        last_consumer = [node for node in plan.nodes if "clientes" in node.release]
+        assert len(last_consumer) == 1
+
+    def test_identifiers_are_valid_python(self):
+        """Testa conversão de nomes de steps em identificadores"""
+        assert to_identifier("Table input usuários") == "table_input_usuarios"
+        assert to_identifier("2 - Saída") == "step_2_saida"
+
+    def test_generated_pipeline_keeps_one_frame_per_branch(self):
+        """Testa que cada saída recebe os dados do próprio ramo, com uma leitura por fonte"""
+        pipeline_class = load_pipeline_class(build_fan_out_model(), self.tmp_dir.name)
+        pipeline = pipeline_class({"log_file": str(Path(self.tmp_dir.name) / "pipeline.log")})
+
+        sources = {
+            "SELECT nome FROM clientes": pd.DataFrame({"nome": ["ana", "bia"]}),
+            "SELECT id FROM pedidos": pd.DataFrame({"id": [1, 2, 3]}),
+        }
+        reads = []
+        written = {}
+
+        def fake_read_sql(sql, connection, chunksize=None, **kwargs):
+            reads.append(sql)
+            assert chunksize == 10000
+            return iter([sources[sql].copy()])
+
+        def fake_to_sql(df, name, **kwargs):
+            written[name] = df.copy()
+
+        with patch.object(pd, "read_sql", side_effect=fake_read_sql), \
+             patch.object(pd.DataFrame, "to_sql", autospec=True, side_effect=fake_to_sql):
+            result = pipeline.run_pipeline()
+
+        assert result["status"] == "success"
+        assert sorted(reads) == sorted(sources)
+        assert list(written["saida_upper"]["nome"]) == ["ANA", "BIA"]
+        assert list(written["saida_bruta"]["nome"]) == ["ana", "bia"]
+        assert list(written["saida_pedidos"]["id"]) == [1, 2, 3]
+        assert result["records_processed"] == 7
+
+    def test_independent_branches_run_concurrently_within_connection_limit(self):
+        """Testa paralelismo entre ramos respeitando o semáforo da conexão"""
+        steps, hops = [], []
+        for i in range(4):
+            steps.append(TableInputStep(f"entrada_{i}", connection_name="db", sql=f"SELECT {i}"))
+            steps.append(TableOutputStep(f"saida_{i}", connection_name="destino", table=f"saida_{i}"))
+            hops.append(Hop(f"entrada_{i}", f"saida_{i}"))
+        model = KTRModel(
+            name="ramos",
+            connections=[
+                Connection("db", "POSTGRESQL", "localhost", "db", 5432, "u", "p"),
+                Connection("destino", "POSTGRESQL", "localhost", "dw", 5432, "u", "p"),
+            ],
+            steps=steps,
+            hops=hops
+        )
+        assert len(build_dataflow_plan(model).branches) == 4
+
+        pipeline_class = load_pipeline_class(model, self.tmp_dir.name)
+        pipeline = pipeline_class({
+            "log_file": str(Path(self.tmp_dir.name) / "pipeline.log"),
+            "max_workers": 4,
+            "connection_limits": {"db": 2},
+        })
+
+        lock = threading.Lock()
+        active = {"now": 0, "peak": 0}
+
+        def slow_read_sql(sql, connection, **kwargs):
+            with lock:
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+            time.sleep(0.05)
+            with lock:
+                active["now"] -= 1
+            return iter([pd.DataFrame({"valor": [1]})])
+
+        with patch.object(pd, "read_sql", side_effect=slow_read_sql), \
+             patch.object(pd.DataFrame, "to_sql", autospec=True):
+            result = pipeline.run_pipeline()
+
+        assert result["status"] == "success"
+        assert active["peak"] == 2
+        assert set(result["branches"]) == {"ramo_1", "ramo_2", "ramo_3", "ramo_4"}
+        assert result["records_processed"] == 4
+
+    def test_streaming_mode_processes_chunks(self):
+        """Testa modo streaming: chunks por ramo, staging publicada uma vez e step bloqueante"""
+        model = build_fan_out_model()
+        model.get_step("saida_bruta").truncate = True
+        model.steps.append(Step("ordena", StepType.SORT_ROWS))
+        model.hops[3] = Hop("pedidos", "ordena")
+        model.hops.append(Hop("ordena", "saida_pedidos"))
+
+        pipeline_class = load_pipeline_class(model, self.tmp_dir.name, streaming=True)
+        pipeline = pipeline_class({
+            "log_file": str(Path(self.tmp_dir.name) / "pipeline.log"),
+            "chunk_size": 1,
+        })
+        pipeline.connections["db"].dialect = sqlite.dialect()
+
+        sources = {
+            "SELECT nome FROM clientes": pd.DataFrame({"nome": ["ana", "bia"]}),
+            "SELECT id FROM pedidos": pd.DataFrame({"id": [1, 2, 3]}),
+        }
+        written = {}
+
+        def fake_read_sql(sql, connection, chunksize=None, **kwargs):
+            df = sources[sql]
+            return iter([df.iloc[i:i + chunksize].copy() for i in range(0, len(df), chunksize)])
+
+        def fake_to_sql(df, name, **kwargs):
+            assert kwargs["if_exists"] == "append"
+            written.setdefault(name, []).append(df.copy())
+
+        with patch.object(pd, "read_sql", side_effect=fake_read_sql), \
+             patch.object(pd.DataFrame, "to_sql", autospec=True, side_effect=fake_to_sql), \
+             patch.object(sa, "inspect") as mock_inspect:
+            mock_inspect.return_value.has_table.return_value = True
+            result = pipeline.run_pipeline()
+
+        assert result["status"] == "success"
+        assert len(written["saida_upper"]) == 2
+        assert list(pd.concat(written["saida_upper"])["nome"]) == ["ANA", "BIA"]
+        assert "saida_bruta" not in written
+        assert list(pd.concat(written["saida_bruta_ktr_stg"])["nome"]) == ["ana", "bia"]
+        assert result["steps"]["ordena"] == {**result["steps"]["ordena"], "rows": 3, "chunks": 1}
+        assert len(written["saida_pedidos"]) == 1
+        assert result["records_processed"] == 7
+        statements = [
+            str(call.args[0]) for call in
+            pipeline.connections["db"].begin.return_value.__enter__.return_value.execute.call_args_list
+        ]
+        assert statements == [
+            "DROP TABLE IF EXISTS saida_bruta_ktr_stg",
+            "DELETE FROM saida_bruta",
+            "INSERT INTO saida_bruta (nome) SELECT nome FROM saida_bruta_ktr_stg",
+            "DROP TABLE IF EXISTS saida_bruta_ktr_stg",
+        ]
+
+    def test_extraction_uses_server_side_cursor_with_dialect_fetch_size(self):
+        """Testa yield_per por conexão e atributos de cursor do Oracle aplicados antes do execute"""
+        model = build_fan_out_model()
+        model.connections.append(Connection("DAAS", "ORACLE", "remoto", "daas", 1521, "u", "p"))
+        model.get_step("pedidos").connection_name = "DAAS"
+        pipeline_class = load_pipeline_class(model, self.tmp_dir.name)
+        pipeline = pipeline_class({
+            "log_file": str(Path(self.tmp_dir.name) / "pipeline.log"),
+            "fetch_sizes": {"DAAS": 500},
+        })
+        pipeline.setup_connections()
+
+        assert pipeline.fetch_options["db"] == {"execution": {"yield_per": 10000}, "cursor": {}}
+        assert pipeline.fetch_options["DAAS"] == {
+            "execution": {"yield_per": 500}, "cursor": {"arraysize": 500, "prefetchrows": 500}
+        }
+
+        engine = pipeline.connections["DAAS"]
+        connection = engine.connect.return_value.__enter__.return_value
+        chunks = [pd.DataFrame({"id": [1, 2]}), pd.DataFrame({"id": [3]})]
+        with patch.object(pd, "read_sql", return_value=iter(chunks)) as mock_read_sql, \
+             patch.object(sa.event, "listen") as mock_listen:
+            df = pipeline.extract_pedidos()
+
+        assert list(df["id"]) == [1, 2, 3]
+        connection.execution_options.assert_called_once_with(yield_per=500)
+        assert mock_read_sql.call_args.kwargs["chunksize"] == 500
+
+        # O listener ajusta o cursor do driver antes de cada execute
+        target, event_name, tune_cursor = mock_listen.call_args.args
+        assert (target, event_name) == (connection, "before_cursor_execute")
+        cursor = MagicMock()
+        tune_cursor(connection, cursor, "SELECT 1", {}, None, False)
+        assert (cursor.arraysize, cursor.prefetchrows) == (500, 500)
+
+    def test_partitioned_extraction_reads_key_ranges_in_parallel(self):
+        """Testa leitura por faixas da chave primária detectada, em ordem e limitada pela conexão"""
+        model = build_fan_out_model()
+        model.get_step("clientes").sql = "SELECT id, nome FROM clientes WHERE nome <> 'x'"
+        pipeline_class = load_pipeline_class(model, self.tmp_dir.name)
+        pipeline = pipeline_class({
+            "log_file": str(Path(self.tmp_dir.name) / "pipeline.log"),
+            "connection_limits": {"db": 3},
+            "partitioned_extraction": {"clientes": {"partitions": 8}},
+        })
+        pipeline.setup_connections()
+
+        engine = sa.create_engine(f"sqlite:///{Path(self.tmp_dir.name) / 'origem.db'}")
+        with engine.begin() as conn:
+            conn.execute(sa.text("CREATE TABLE clientes (id INTEGER PRIMARY KEY, nome TEXT)"))
+            conn.execute(sa.text("INSERT INTO clientes VALUES " + ", ".join(f"({i}, 'n{i}')" for i in range(1, 101))))
+        pipeline.connections["db"] = engine
+
+        df = pipeline._run_step("extract", "clientes", pipeline.extract_clientes, connection="db")
+        chunks = list(pipeline._read_sql_chunks(model.get_step("clientes").sql, "db", 30, step_name="clientes"))
+        # Com LIMIT, cada faixa repetiria o limite: leitura única com exatamente as linhas pedidas
+        limited_sql = "SELECT id, nome FROM clientes LIMIT 10"
+        limited_plan = pipeline._partition_plan(limited_sql, "db", "clientes")
+        limited = pipeline._read_sql(limited_sql, "db", step_name="clientes")
+        engine.dispose()
+
+        assert limited_plan is None and len(limited) == 10
+
+        assert list(df["id"]) == list(range(1, 101))
+        assert pipeline.metrics["partitions"]["clientes"] == {"column": "id", "partitions": 8, "parallelism": 3}
+        assert list(pd.concat(chunks)["id"]) == list(range(1, 101))
+        assert all(len(chunk) <= 30 for chunk in chunks)
+        # Vagas extras devolvidas ao semáforo da conexão
+        assert pipeline.connection_slots["db"]._value == 3
+
+    def test_partition_bounds_split_numeric_and_date_ranges(self):
+        """Testa limites de faixas inteiras e de datas"""
+        pipeline_class = load_pipeline_class(build_fan_out_model(), self.tmp_dir.name)
+        pipeline = pipeline_class({"log_file": str(Path(self.tmp_dir.name) / "pipeline.log")})
+
+        assert pipeline._partition_bounds(1, 100, 4) == [26, 51, 76]
+        assert pipeline._partition_bounds(1, 2, 8) == [2]
+        dates = pipeline._partition_bounds(pd.Timestamp("2024-01-01").date(), pd.Timestamp("2024-01-05").date(), 2)
+        assert [str(bound) for bound in dates] == ["2024-01-03"]
+
+    def test_step_copies_distribute_rows_across_workers(self):
+        """Testa cópias do step: round-robin e ModPartitioner em threads e processos"""
+        model = build_fan_out_model()
+        model.get_step("upper").copies = 3
+
+        pipeline_class = load_pipeline_class(model, self.tmp_dir.name)
+        pipeline = pipeline_class({"log_file": str(Path(self.tmp_dir.name) / "pipeline.log"), "step_copies": "thread"})
+        df = pd.DataFrame({"nome": ["ana", "bia", "caio", "davi", "eva"]})
+        result = pipeline.transform_upper(df)
+
+        assert sorted(result["nome"]) == ["ANA", "BIA", "CAIO", "DAVI", "EVA"]
+        assert pipeline.metrics["copies"]["upper"] == {
+            "copies": 3, "distribution": "round_robin", "rows_per_copy": [2, 2, 1]
+        }
+        pipeline._copy_pool.shutdown()
+
+        # Processos (spawn) exigem o módulo gerado importável
+        model.get_step("upper").partition_method = "mod"
+        model.get_step("upper").partition_field = "id"
+        generator = CodeGenerator()
+        template_data = generator._prepare_template_data(model)
+        module_path = Path(self.tmp_dir.name) / "pipeline_com_copias.py"
+        module_path.write_text(generator._generate_main_pipeline(template_data))
+        sys.path.insert(0, self.tmp_dir.name)
+        try:
+            module = importlib.import_module("pipeline_com_copias")
+            module.create_engine = MagicMock()
+            pipeline = getattr(module, template_data["pipeline_class_name"])(
+                {"log_file": str(Path(self.tmp_dir.name) / "pipeline.log")}
+            )
+            result = pipeline.transform_upper(pd.DataFrame({"id": [1, 2, 3, 4], "nome": ["a", "b", "c", "d"]}))
+            pipeline._copy_pool.shutdown()
+        finally:
+            sys.path.remove(self.tmp_dir.name)
+            sys.modules.pop("pipeline_com_copias", None)
+
+        assert isinstance(pipeline._copy_pool, ProcessPoolExecutor)
+        assert sorted(zip(result["id"], result["nome"])) == [(1, "A"), (2, "B"), (3, "C"), (4, "D")]
+        assert pipeline.metrics["copies"]["upper"]["rows_per_copy"] == [1, 2, 1]
+
+    def test_postgres_loader_uses_copy(self):
+        """Testa carga via COPY FROM STDIN em conexões PostgreSQL"""
+        pipeline_class = load_pipeline_class(build_fan_out_model(), self.tmp_dir.name)
+        pipeline = pipeline_class({"log_file": str(Path(self.tmp_dir.name) / "pipeline.log")})
+
+        copied = []
+        cursor = MagicMock()
+        cursor.copy_expert.side_effect = lambda sql, buffer: copied.append((sql, buffer.read()))
+        engine = MagicMock()
+        engine.dialect = postgresql.dialect()
+        engine.raw_connection.return_value.cursor.return_value = cursor
+
+        df = pd.DataFrame({"id": [1, 2], "Nome": ["ana", None]})
+        with patch.object(sa, "inspect") as mock_inspect, \
+             patch.object(pd.DataFrame, "to_sql", autospec=True) as mock_to_sql:
+            mock_inspect.return_value.has_table.return_value = True
+            pipeline._write_frame(engine, df, table="clientes", schema="public")
+
+        assert not mock_to_sql.called
+        assert copied == [(
+            'COPY public.clientes (id, "Nome") FROM STDIN WITH (FORMAT csv, NULL \'\\N\')',
+            "1,ana\n2,\\N\n"
+        )]
+        engine.raw_connection.return_value.commit.assert_called_once()
+
+        # Inteiro com NULL (float64 após um merge) sai sem ".0"; frações continuam float
+        copied.clear()
+        df = pd.DataFrame({"id": [1, 2, 3]}).merge(pd.DataFrame({"id": [1, 3], "qtd": [10, 30]}), how="left")
+        df["preco"] = [1.5, None, 2.0]
+        assert df["qtd"].dtype == "float64"
+        with patch.object(sa, "inspect") as mock_inspect:
+            mock_inspect.return_value.has_table.return_value = True
+            pipeline._write_frame(engine, df, table="itens", schema="public")
+
+        assert copied[0][1] == "1,10,1.5\n2,\\N,\\N\n3,30,2.0\n"
+        assert df["qtd"].dtype == "float64"
+
+    def test_postgres_truncate_swaps_staging_in_one_transaction(self):
+        """Testa truncate=Y: staging UNLOGGED via COPY e TRUNCATE + INSERT SELECT na mesma transação"""
+        model = build_fan_out_model()
+        model.get_step("saida_pedidos").truncate = True
+        model.get_step("saida_pedidos").schema = "dw"
+        pipeline_class = load_pipeline_class(model, self.tmp_dir.name)
+        pipeline = pipeline_class({"log_file": str(Path(self.tmp_dir.name) / "pipeline.log")})
+
+        engine = MagicMock()
+        engine.dialect = postgresql.dialect()
+        transactions = []
+        engine.begin.side_effect = lambda: transactions.append(MagicMock()) or transactions[-1]
+
+        with patch.object(sa, "inspect") as mock_inspect, \
+             patch.object(pd.DataFrame, "to_sql", autospec=True) as mock_to_sql:
+            mock_inspect.return_value.has_table.return_value = True
+            pipeline.connections = {"db": engine}
+            loaded = pipeline.load_saida_pedidos(pd.DataFrame({"id": [1, 2]}))
+
+        def statements(transaction):
+            return [str(call.args[0]) for call in transaction.__enter__.return_value.execute.call_args_list]
+
+        assert loaded == 2
+        assert not mock_to_sql.called
+        assert statements(transactions[0]) == [
+            "DROP TABLE IF EXISTS dw.saida_pedidos_ktr_stg",
+            "CREATE UNLOGGED TABLE dw.saida_pedidos_ktr_stg (LIKE dw.saida_pedidos INCLUDING DEFAULTS)",
+        ]
+        copy_sql = engine.raw_connection.return_value.cursor.return_value.copy_expert.call_args.args[0]
+        assert copy_sql.startswith("COPY dw.saida_pedidos_ktr_stg (id) FROM STDIN")
+        assert statements(transactions[1]) == [
+            "TRUNCATE TABLE dw.saida_pedidos",
+            "INSERT INTO dw.saida_pedidos (id) SELECT id FROM dw.saida_pedidos_ktr_stg",
+        ]
+        assert statements(transactions[2]) == ["DROP TABLE IF EXISTS dw.saida_pedidos_ktr_stg"]
+
+    def test_upsert_loader_merges_by_key_fields(self):
+        """Testa InsertUpdate/Update em lote contra um SQLite real (ON CONFLICT e UPDATE ... FROM)"""
+        model = build_fan_out_model()
+        model.steps[0] = TableOutputStep(
+            "saida_upper", type=StepType.INSERT_UPDATE, connection_name="db", table="clientes",
+            load_mode="upsert", key_fields={"codigo": "id"},
+            field_mapping={"codigo": "id", "nome": "nome", "origem": "origem"}, update_columns=["nome"]
+        )
+        model.steps[3] = TableOutputStep(
+            "saida_bruta", type=StepType.UPDATE, connection_name="db", table="clientes",
+            load_mode="update", key_fields={"codigo": "id"},
+            field_mapping={"codigo": "id", "origem": "origem"}, update_columns=["origem"]
+        )
+        pipeline_class = load_pipeline_class(model, self.tmp_dir.name)
+        pipeline = pipeline_class({"log_file": str(Path(self.tmp_dir.name) / "pipeline.log")})
+
+        engine = sa.create_engine(f"sqlite:///{Path(self.tmp_dir.name) / 'dw.db'}")
+        with engine.begin() as conn:
+            conn.execute(sa.text("CREATE TABLE clientes (id INTEGER PRIMARY KEY, nome TEXT, origem TEXT)"))
+            conn.execute(sa.text("INSERT INTO clientes VALUES (1, 'ana', 'legado'), (2, 'bia', 'legado')"))
+        pipeline.connections = {"db": engine}
+
+        upserted = pipeline.load_saida_upper(pd.DataFrame({
+            "codigo": [2, 3], "nome": ["BIA", "CAIO"], "origem": ["novo", "novo"], "extra": [0, 0]
+        }))
+        pipeline.load_saida_bruta(pd.DataFrame({"codigo": [1, 9], "origem": ["corrigido", "inexistente"]}))
+
+        with engine.connect() as conn:
+            rows = conn.execute(sa.text("SELECT id, nome, origem FROM clientes ORDER BY id")).fetchall()
+            leftovers = conn.execute(sa.text("SELECT name FROM sqlite_master WHERE name LIKE '%ktr_merge%'")).fetchall()
+        engine.dispose()
+
+        assert upserted == 2
+        # Linha existente: só "nome" é atualizado; nova linha é inserida; chave 9 é ignorada pelo Update
+        assert rows == [(1, "ana", "corrigido"), (2, "BIA", "legado"), (3, "CAIO", "novo")]
+        assert leftovers == []
+
+    def test_field_metadata_maps_to_compact_dtypes(self):
+        """Testa dtypes de leitura do Excel, dicas de tipo do loader e compactação do resultado do SQL"""
+        fields = [
+            Field("id", "Integer", 9), Field("total", "Integer", 15), Field("uf", "String", 2),
+            Field("nome", "String", 100), Field("valor", "BigNumber", 12, 2), Field("nascimento", "Date"),
+        ]
+        dtypes, parse_dates = read_options(fields)
+        assert dtypes == {
+            "id": '"Int32"', "total": '"Int64"', "uf": '"category"', "nome": '"string[pyarrow]"',
+            "valor": "pd.ArrowDtype(pa.decimal128(12, 2))",
+        }
+        assert parse_dates == ["nascimento"]
+
+        model = KTRModel(
+            name="planilha",
+            connections=[Connection("db", "POSTGRESQL", "localhost", "db", 5432, "u", "p")],
+            steps=[
+                ExcelInputStep("planilha", file_path="dados.xlsx", sheet_name="Plan1", fields=fields),
+                TableOutputStep("saida", connection_name="db", table="saida", field_mapping={"nome": "nm_cliente"}),
+            ],
+            hops=[Hop("planilha", "saida")],
+        )
+        # Sem pushdown a planilha é lida inteira (com ele, só "nome" chegaria ao destino)
+        generator = CodeGenerator(pushdown=False)
+        template_data = generator._prepare_template_data(model)
+        assert "parse_dates=['nascimento']" in template_data["extractors"][0]["generate_code"]
+        loader_code = template_data["loaders"][0]["generate_code"]
+        assert "'nm_cliente': sa.String(100)" in loader_code
+        assert "'valor': sa.Numeric(12, 2)" in loader_code
+        source = generator._generate_main_pipeline(template_data)
+        assert "import pyarrow as pa" in source
+        compile(source, "generated_pipeline.py", "exec")
+
+        # TableInput não declara campos: o resultado da query é compactado em tempo de execução
+        pipeline_class = load_pipeline_class(build_fan_out_model(), self.tmp_dir.name)
+        pipeline = pipeline_class({"log_file": str(Path(self.tmp_dir.name) / "pipeline.log")})
+        df = pipeline._compact_dtypes(pd.DataFrame({
+            "id": [1, 2, 3, 4], "uf": pd.Series(["SP", "RJ", "SP", "SP"], dtype=object), "valor": [1.5, 2.0, 3.0, 4.0],
+        }))
+        assert (str(df["id"].dtype), str(df["uf"].dtype), str(df["valor"].dtype)) == ("Int32", "category", "float64")
+
+    def test_filter_rows_null_rule_does_not_depend_on_dtype(self):
+        """Testa que a máscara do FilterRows trata NULL igual em object, category, string[pyarrow] e Int*"""
+        def atom(field, function, text, value_type="String", negated=False):
+            return {"negated": negated, "operator": "-", "leftvalue": field, "function": function, "rightvalue": "",
+                    "value": {"type": value_type, "text": text, "isnull": False}, "conditions": []}
+
+        text_conditions = [atom("x", "<>", "a"), atom("x", "=", "a", negated=True), atom("x", "=", "a"),
+                           atom("x", "IN LIST", "a;b", negated=True), atom("x", "LIKE", "a%", negated=True)]
+        number_conditions = [atom("n", "<>", "5", "Integer"), atom("n", ">", "2", "Integer", negated=True),
+                             atom("n", "<=", "2", "Integer")]
+        frames = {
+            "object": pd.DataFrame({"x": pd.Series(["a", None, "b"], dtype=object), "n": [1.0, None, 5.0]}),
+            "category": pd.DataFrame({"x": pd.Series(["a", None, "b"], dtype="category"),
+                                      "n": pd.Series([1, None, 5], dtype="Int32")}),
+            "string[pyarrow]": pd.DataFrame({"x": pd.Series(["a", None, "b"], dtype="string[pyarrow]"),
+                                             "n": pd.Series([1, None, 5], dtype="Int64")}),
+        }
+        for condition in text_conditions + number_conditions:
+            kept = {}
+            for name, df in frames.items():
+                mask = eval(pandas_condition(condition), {"pd": pd, "df": df})
+                kept[name] = list(df[mask.fillna(False).astype(bool)].index)
+            assert kept["category"] == kept["object"] and kept["string[pyarrow]"] == kept["object"], (condition, kept)
+            # NULL (linha 1): `<>` e as formas negadas aceitam; comparações positivas descartam
+            assert (1 in kept["object"]) == ((condition["function"] == "<>") != condition["negated"])
+
+    def test_compact_dtypes_are_chosen_once_per_step(self):
+        """Testa que lotes e faixas do mesmo step mantêm o dtype e o filtro não muda no meio do stream"""
+        condition = {"negated": False, "operator": "-", "leftvalue": "uf", "function": "<>", "rightvalue": "",
+                     "value": {"type": "String", "text": "SP", "isnull": False}, "conditions": []}
+        model = KTRModel(
+            name="lotes",
+            connections=[Connection("db", "SQLITE", "", "", 0, "", ""), Connection("dw", "SQLITE", "", "", 0, "", "")],
+            steps=[
+                TableInputStep("origem", connection_name="db", sql="SELECT id, uf FROM t"),
+                FilterRowsStep("filtra", condition=condition),
+                TableOutputStep("saida", connection_name="dw", table="saida"),
+            ],
+            hops=[Hop("origem", "filtra"), Hop("filtra", "saida")]
+        )
+        # 1º lote só com SP (category); no 2º e 3º a cardinalidade alta levaria a string[pyarrow]
+        source = pd.DataFrame({
+            "id": range(1, 11),
+            "uf": ["SP", "SP", "SP", "SP", None, "RJ", "MG", "BA", None, "SP"],
+        })
+        source_db = sa.create_engine(f"sqlite:///{Path(self.tmp_dir.name) / 'lotes.db'}")
+        target_db = sa.create_engine(f"sqlite:///{Path(self.tmp_dir.name) / 'lotes_destino.db'}")
+        source.to_sql("t", source_db, index=False)
+
+        # Filtro no pandas (sem pushdown), em chunks de 4 linhas
+        pipeline_class = load_pipeline_class(model, self.tmp_dir.name, streaming=True, pushdown=False)
+        pipeline = pipeline_class({"log_file": str(Path(self.tmp_dir.name) / "pipeline.log"), "chunk_size": 4})
+        pipeline.connections = {"db": source_db, "dw": target_db}
+
+        chunks = list(pipeline._read_sql_chunks("SELECT id, uf FROM t", "db", 4, step_name="origem"))
+        assert [str(chunk["uf"].dtype) for chunk in chunks] == ["category"] * 3
+        assert [str(chunk["id"].dtype) for chunk in chunks] == ["Int32"] * 3
+
+        # Faixas da leitura particionada recebem o mesmo dtype do step
+        pipeline.config["partitioned_extraction"] = {"origem": {"column": "id", "partitions": 3}}
+        df = pipeline._read_sql("SELECT id, uf FROM t", "db", step_name="origem")
+        assert (str(df["id"].dtype), str(df["uf"].dtype)) == ("Int32", "category")
+        del pipeline.config["partitioned_extraction"]
+
+        metrics = pipeline.run_pipeline()
+
+        assert metrics["status"] == "success", metrics.get("error")
+        with target_db.connect() as conn:
+            assert sorted(pd.read_sql("SELECT id FROM saida", conn)["id"]) == [5, 6, 7, 8, 9]
+        source_db.dispose()
+        target_db.dispose()
+
+    def test_polars_engine_matches_pandas_results(self):
+        """Testa que os engines pandas e Polars carregam o mesmo resultado (SQLite real)"""
+        source = pd.DataFrame({
+            "nome": [" ana ", "bia", "caio", "dani", None, "edu"],
+            "uf": ["SP", "sp", "RJ", "MG", "SP", "BA"],
+            "valor": [20.0, 30.0, 40.0, 5.0, 50.0, 11.0],
+        })
+        results = {}
+        for engine_name in ("pandas", "polars"):
+            pipeline_class = load_pipeline_class(build_sales_model(), self.tmp_dir.name, engine=engine_name)
+            pipeline = pipeline_class({"log_file": str(Path(self.tmp_dir.name) / "pipeline.log")})
+            engine = sa.create_engine(f"sqlite:///{Path(self.tmp_dir.name) / f'{engine_name}.db'}")
+            source.to_sql("vendas", engine, index=False)
+            pipeline.connections = {"db": engine}
+            
+            with patch.object(pl, "collect_all", wraps=pl.collect_all) as collect_all:
+                metrics = pipeline.run_pipeline()
+            
+            assert metrics["status"] == "success", metrics.get("error")
+            assert collect_all.call_count == (1 if engine_name == "polars" else 0)
+            with engine.connect() as conn:
+                results[engine_name] = pd.read_sql("SELECT * FROM resumo", conn)
+            engine.dispose()
+        
+        # Grupos na ordem do sort case-insensitive; "sp" e "SP" são grupos distintos
+        assert results["pandas"].to_dict("list") == {
+            "uf": ["BA", "SP", "sp"], "total": [11.0, 70.0, 30.0], "clientes": [1, 1, 1], "linhas": [1, 2, 1]
+        }
+        pd.testing.assert_frame_equal(results["polars"], results["pandas"])
+    
+    def test_polars_engine_collects_fan_out_plans_together(self):
+        """Testa um collect_all por ramo com todas as saídas e planos lazy nas transformações"""
+        generator = CodeGenerator(engine="polars", streaming=True)
+        template_data = generator._prepare_template_data(build_fan_out_model())
+        source = generator._generate_main_pipeline(template_data)
+        
+        branch = template_data["dataflow_branches"][0]["generate_code"]
+        assert "[out_saida_upper, out_saida_bruta] = self._collect_plans([df_upper, df_clientes])" in branch
+        assert "def transform_upper(self, df: pl.LazyFrame) -> pl.LazyFrame:" in source
+        assert "pl.col('nome').str.to_uppercase()" in source
+        # Streaming no Polars é o engine de streaming do collect_all, não os chunks do pandas
+        assert 'self.config.get("polars_engine", "streaming")' in source
+        assert "_stream_branch" not in source
+        assert "polars>=" in generator._generate_requirements(template_data)
+        compile(source, "generated_pipeline.py", "exec")
+        
+        with pytest.raises(ValueError, match="Engine"):
+            CodeGenerator(engine="spark")
+    
+    def test_duckdb_engine_matches_pandas_results(self):
+        """Testa que o plano SQL do DuckDB carrega o mesmo resultado do pandas (SQLite real)"""
+        source = pd.DataFrame({
+            "nome": [" ana ", "bia", "caio", "dani", None, "edu"],
+            "uf": ["SP", "sp", "RJ", "MG", "SP", "BA"],
+            "valor": [20.0, 30.0, 40.0, 5.0, 50.0, 11.0],
+        })
+        results = {}
+        for engine_name in ("pandas", "duckdb"):
+            pipeline_class = load_pipeline_class(build_sales_model(), self.tmp_dir.name, engine=engine_name)
+            pipeline = pipeline_class({"log_file": str(Path(self.tmp_dir.name) / "pipeline.log")})
+            engine = sa.create_engine(f"sqlite:///{Path(self.tmp_dir.name) / f'{engine_name}.db'}")
+            source.to_sql("vendas", engine, index=False)
+            pipeline.connections = {"db": engine}
+
+            metrics = pipeline.run_pipeline()
+
+            assert metrics["status"] == "success", metrics.get("error")
+            assert metrics["rows_loaded"] == {"resumo": 3}
+            with engine.connect() as conn:
+                results[engine_name] = pd.read_sql("SELECT * FROM resumo", conn)
+            engine.dispose()
+
+        # GROUP BY no SQL não garante a ordem dos grupos
+        duckdb_result = results["duckdb"].sort_values("uf", ignore_index=True)
+        pd.testing.assert_frame_equal(duckdb_result, results["pandas"], check_dtype=False)
+
+    def test_duckdb_engine_compiles_one_query_per_output(self):
+        """Testa a consulta única por saída, com os steps a montante como CTEs"""
+        generator = CodeGenerator(engine="duckdb")
+        template_data = generator._prepare_template_data(build_fan_out_model())
+        source = generator._generate_main_pipeline(template_data)
+
+        branch = template_data["dataflow_branches"][0]["generate_code"]
+        assert '"upper": self.transform_upper(),' in branch
+        assert "query = self._compile_plan(relations, ['upper'], 'SELECT * FROM \"upper\"')" in branch
+        assert "query = self._compile_plan(relations, [], 'SELECT * FROM \"clientes\"')" in branch
+        assert "def transform_upper(self) -> str:" in source
+        assert 'SELECT * REPLACE (upper("nome") AS "nome")' in source
+        assert "duckdb>=" in generator._generate_requirements(template_data)
+        compile(source, "generated_pipeline.py", "exec")
+
+    def test_same_connection_chain_runs_in_database(self):
+        """Testa ELT: origem e destino na mesma conexão viram um INSERT ... SELECT com o mesmo resultado"""
+        condition = {"negated": False, "operator": "-", "leftvalue": "", "function": "=", "rightvalue": "", "value": None, "conditions": [
+            {"negated": False, "operator": "-", "leftvalue": "valor", "function": ">", "rightvalue": "",
+             "value": {"type": "Number", "text": "10", "isnull": False}, "conditions": []},
+            {"negated": True, "operator": "AND", "leftvalue": "uf", "function": "IN LIST", "rightvalue": "",
+             "value": {"type": "String", "text": "RJ;MG", "isnull": False}, "conditions": []},
+        ]}
+        model = KTRModel(
+            name="elt",
+            connections=[Connection("db", "SQLITE", "", "", 0, "", "")],
+            steps=[
+                TableInputStep("vendas", connection_name="db", sql="SELECT * FROM vendas;"),
+                SelectValuesStep("seleciona", fields=[
+                    {"name": "nome", "rename": "cliente"}, {"name": "uf", "rename": ""}, {"name": "valor", "rename": ""}
+                ]),
+                StringOperationsStep("limpa", operations=[
+                    {"field_name": "cliente", "trim_type": "both", "lower_upper": "upper", "padding_type": "none"}
+                ]),
+                FilterRowsStep("filtra", condition=condition),
+                SortRowsStep("ordena", fields=[{"name": "uf", "ascending": True, "case_sensitive": True}]),
+                GroupByStep("agrupa", group_fields=["uf"], aggregates=[
+                    {"name": "total", "subject": "valor", "type": "SUM"},
+                    {"name": "clientes", "subject": "cliente", "type": "COUNT_DISTINCT"},
+                    {"name": "linhas", "subject": "", "type": "COUNT_ANY"},
+                ]),
+                TableOutputStep("resumo", connection_name="db", table="resumo", truncate=True),
+            ],
+            hops=[
+                Hop("vendas", "seleciona"), Hop("seleciona", "limpa"), Hop("limpa", "filtra"),
+                Hop("filtra", "ordena"), Hop("ordena", "agrupa"), Hop("agrupa", "resumo"),
+            ]
+        )
+        source = pd.DataFrame({
+            "nome": [" ana ", "ANA", "caio", "dani", None, "edu"],
+            "uf": ["SP", "SP", "RJ", "MG", "SP", "BA"],
+            "valor": [20.0, 30.0, 40.0, 5.0, 50.0, 11.0],
+        })
+        results = {}
+        for in_database in (False, True):
+            pipeline_class = load_pipeline_class(model, self.tmp_dir.name, in_database=in_database)
+            pipeline = pipeline_class({"log_file": str(Path(self.tmp_dir.name) / "pipeline.log")})
+            engine = sa.create_engine(f"sqlite:///{Path(self.tmp_dir.name) / f'elt_{in_database}.db'}")
+            source.to_sql("vendas", engine, index=False)
+            # Conteúdo anterior do destino é substituído
+            pd.DataFrame({"uf": ["XX"], "total": [0.0], "clientes": [0], "linhas": [0]}).to_sql("resumo", engine, index=False)
+            pipeline.connections = {"db": engine}
+
+            with patch.object(pd, "read_sql", wraps=pd.read_sql) as read_sql:
+                metrics = pipeline.run_pipeline()
+
+            assert metrics["status"] == "success", metrics.get("error")
+            assert metrics["rows_loaded"] == {"resumo": 2}
+            assert read_sql.called != in_database
+            with engine.connect() as conn:
+                results[in_database] = pd.read_sql("SELECT * FROM resumo ORDER BY uf", conn)
+            engine.dispose()
+
+        assert metrics["in_database"]["resumo"]["rows"] == 2
+        assert results[False].to_dict("list") == {
+            "uf": ["BA", "SP"], "total": [11.0, 100.0], "clientes": [1, 1], "linhas": [1, 3]
+        }
+        pd.testing.assert_frame_equal(results[True], results[False])
+
+    def test_in_database_filter_keeps_null_rows_like_python(self):
+        """Testa que o INSERT ... SELECT carrega as mesmas linhas com NULL que o engine Python"""
+        condition = {"negated": False, "operator": "-", "leftvalue": "", "function": "=", "rightvalue": "", "value": None, "conditions": [
+            {"negated": False, "operator": "-", "leftvalue": "uf", "function": "<>", "rightvalue": "",
+             "value": {"type": "String", "text": "RJ", "isnull": False}, "conditions": []},
+            {"negated": True, "operator": "AND", "leftvalue": "valor", "function": ">", "rightvalue": "",
+             "value": {"type": "Number", "text": "40", "isnull": False}, "conditions": []},
+        ]}
+        model = KTRModel(
+            name="elt_nulos",
+            connections=[Connection("db", "SQLITE", "", "", 0, "", "")],
+            steps=[
+                TableInputStep("vendas", connection_name="db", sql="SELECT id, uf, valor FROM vendas"),
+                FilterRowsStep("filtra", condition=condition),
+                TableOutputStep("saida", connection_name="db", table="saida"),
+            ],
+            hops=[Hop("vendas", "filtra"), Hop("filtra", "saida")]
+        )
+        source = pd.DataFrame({
+            "id": [1, 2, 3, 4, 5],
+            "uf": ["SP", None, "RJ", "MG", None],
+            "valor": [10.0, 20.0, 5.0, None, 50.0],
+        })
+        loaded = {}
+        for in_database in (False, True):
+            pipeline_class = load_pipeline_class(model, self.tmp_dir.name, in_database=in_database)
+            pipeline = pipeline_class({"log_file": str(Path(self.tmp_dir.name) / "pipeline.log")})
+            engine = sa.create_engine(f"sqlite:///{Path(self.tmp_dir.name) / f'elt_nulos_{in_database}.db'}")
+            source.to_sql("vendas", engine, index=False)
+            pipeline.connections = {"db": engine}
+
+            metrics = pipeline.run_pipeline()
+
+            assert metrics["status"] == "success", metrics.get("error")
+            assert ("saida" in metrics["in_database"]) == in_database
+            with engine.connect() as conn:
+                loaded[in_database] = sorted(pd.read_sql("SELECT id FROM saida", conn)["id"])
+            engine.dispose()
+
+        # uf NULL passa no `<>` e valor NULL passa no NOT (valor > 40)
+        assert loaded[False] == [1, 2, 4]
+        assert loaded[True] == loaded[False]
+
+    def test_in_database_requires_portable_steps(self):
+        """Testa que conversões de tipo, conexões distintas e fan-out mantêm o fluxo no Python"""
+        # build_sales_model: StringOperations antes de as colunas serem conhecidas e conversão de tipo
+        assert find_in_database_flows(build_sales_model()) == []
+
+        model = build_fan_out_model()
+        flows = find_in_database_flows(model)
+        assert [flow.step_names for flow in flows] == [["pedidos", "saida_pedidos"]]
+        assert flows[0].sql == "SELECT id FROM pedidos"
+
+        # Campos especificados no destino renomeiam as colunas do SELECT
+        model.get_step("saida_pedidos").field_mapping = {"id": "codigo"}
+        assert find_in_database_flows(model)[0].sql.startswith("SELECT id AS codigo\nFROM (\nSELECT id FROM pedidos\n) q1")
+
+        model.get_step("saida_pedidos").connection_name = "outra"
+        assert find_in_database_flows(model) == []
+
+        generator = CodeGenerator()
+        template_data = generator._prepare_template_data(build_fan_out_model())
+        source = generator._generate_main_pipeline(template_data)
+        assert template_data["in_database_flows"] == [["pedidos", "saida_pedidos"]]
+        assert "def extract_pedidos" not in source
+        assert "self._insert_select(" in source
+        compile(source, "generated_pipeline.py", "exec")
+
+    def test_filter_sort_and_limit_push_down_into_source_sql(self):
+        """Testa pushdown de limite, filtro e ordenação para a consulta do TableInput (SQLite real)"""
+        condition = {"negated": False, "operator": "-", "leftvalue": "", "function": "=", "rightvalue": "", "value": None, "conditions": [
+            {"negated": False, "operator": "-", "leftvalue": "valor", "function": ">", "rightvalue": "",
+             "value": {"type": "Number", "text": "10", "isnull": False}, "conditions": []},
+            {"negated": True, "operator": "AND", "leftvalue": "uf", "function": "IN LIST", "rightvalue": "",
+             "value": {"type": "String", "text": "RJ;MG", "isnull": False}, "conditions": []},
+        ]}
+        model = KTRModel(
+            name="pushdown",
+            connections=[Connection("db", "SQLITE", "", "", 0, "", ""), Connection("dw", "SQLITE", "", "", 0, "", "")],
+            steps=[
+                TableInputStep("vendas", connection_name="db", sql="SELECT id, uf, valor FROM vendas", limit=5),
+                FilterRowsStep("filtra", condition=condition),
+                SortRowsStep("ordena", fields=[
+                    {"name": "uf", "ascending": True, "case_sensitive": True},
+                    {"name": "valor", "ascending": False, "case_sensitive": True},
+                ]),
+                TableOutputStep("saida", connection_name="dw", table="saida"),
+            ],
+            hops=[Hop("vendas", "filtra"), Hop("filtra", "ordena"), Hop("ordena", "saida")]
+        )
+
+        generator = CodeGenerator()
+        template_data = generator._prepare_template_data(model)
+        source = generator._generate_main_pipeline(template_data)
+        assert [(r["step"], r["clause"], r["mode"]) for r in template_data["pushdowns"]] == [
+            ("vendas", "LIMIT", "merge"), ("filtra", "WHERE", "subquery"), ("ordena", "ORDER BY", "merge")
+        ]
+        assert template_data["pushdowns"][0]["sql_before"] == "SELECT id, uf, valor FROM vendas"
+        assert "def transform_filtra" not in source and "def transform_ordena" not in source
+        assert 'step_name="vendas", ordered=True)' in source
+        # Sem ORDER BY (ordenação fica no plano do DuckDB), o LIMIT empurrado já impede a leitura em faixas
+        without_sort = CodeGenerator(engine="duckdb")
+        sort_free_data = without_sort._prepare_template_data(model)
+        assert [r["clause"] for r in sort_free_data["pushdowns"]] == ["LIMIT", "WHERE"]
+        assert 'step_name="vendas", ordered=True\n' in without_sort._generate_main_pipeline(sort_free_data)
+        # O modelo original não é alterado
+        assert model.get_step("vendas").limit == 5 and len(model.steps) == 4
+
+        pipeline_class = load_pipeline_class(model, self.tmp_dir.name)
+        pipeline = pipeline_class({"log_file": str(Path(self.tmp_dir.name) / "pipeline.log")})
+        db = sa.create_engine(f"sqlite:///{Path(self.tmp_dir.name) / 'origem.db'}")
+        dw = sa.create_engine(f"sqlite:///{Path(self.tmp_dir.name) / 'destino.db'}")
+        pd.DataFrame({
+            "id": [1, 2, 3, 4, 5, 6],
+            "uf": ["SP", "sp", "RJ", "MG", "SP", "BA"],
+            "valor": [20.0, 30.0, 40.0, 5.0, 50.0, 11.0],
+        }).to_sql("vendas", db, index=False)
+        pipeline.connections = {"db": db, "dw": dw}
+        # Extração particionada configurada não desfaz a ordem da consulta
+        pipeline.config["partitioned_extraction"] = {"vendas": {"column": "id", "partitions": 2}}
+
+        metrics = pipeline.run_pipeline()
+
+        assert metrics["status"] == "success", metrics.get("error")
+        with dw.connect() as conn:
+            result = pd.read_sql("SELECT * FROM saida", conn)
+        db.dispose()
+        dw.dispose()
+        # Limite de 5 linhas antes do filtro (o id 6 nem é lido), ordem codepoint ("SP" < "sp")
+        assert result.to_dict("list") == {"id": [5, 1, 2], "uf": ["SP", "SP", "sp"], "valor": [50.0, 20.0, 30.0]}
+
+    def test_pushed_filter_keeps_null_rows_like_pandas(self):
+        """Testa que o WHERE gerado e os filtros pandas/Polars/DuckDB tratam NULL igual (<>, NOT, IN LIST, LIKE)"""
+        def atom(field, function, text, value_type="Integer", negated=False, operator="-"):
+            return {"negated": negated, "operator": operator, "leftvalue": field, "function": function, "rightvalue": "",
+                    "value": {"type": value_type, "text": text, "isnull": False}, "conditions": []}
+
+        def group(*children, negated=False):
+            return {"negated": negated, "operator": "-", "leftvalue": "", "function": "=", "rightvalue": "",
+                    "value": None, "conditions": list(children)}
+
+        conditions = [
+            atom("x", "<>", "5"),
+            atom("x", "=", "5", negated=True),
+            atom("x", "<>", "5", negated=True),
+            atom("x", ">", "1", negated=True),
+            atom("x", "IN LIST", "1;5", negated=True),
+            atom("nome", "STARTS WITH", "a", "String", negated=True),
+            group(atom("x", "=", "1"), atom("nome", "=", "b", "String", operator="OR"), negated=True),
+            group(atom("x", ">=", "1"), atom("nome", "<>", "a", "String", operator="AND NOT")),
+        ]
+        df = pd.DataFrame({"x": [1, None, 5, None], "nome": ["a", "b", None, None]})
+        # Mesmos dados nos dtypes compactos que _compact_dtypes pode escolher
+        frames = [
+            df,
+            df.astype({"x": "Int32", "nome": "category"}),
+            df.astype({"x": "Int64", "nome": "string[pyarrow]"}),
+        ]
+        db = sa.create_engine("sqlite://")
+        df.to_sql("t", db, index=False)
+        with db.connect() as conn:
+            for condition in conditions:
+                query = f"SELECT rowid - 1 AS i FROM t WHERE {portable_condition(condition)} ORDER BY i"
+                expected = conn.execute(sa.text(query)).scalars().all()
+                for frame in frames:
+                    kept = frame.index[eval(pandas_condition(condition), {"pd": pd, "df": frame})].tolist()
+                    assert kept == expected, (portable_condition(condition), frame.dtypes.tolist())
+                # No Polars inteiros com NULL chegam como Int64
+                polars_df = pl.from_pandas(frames[2]).with_row_index("i")
+                kept = polars_df.filter(eval(polars_condition(condition), {"pl": pl}))["i"].to_list()
+                assert kept == expected, polars_condition(condition)
+                duckdb_query = f"SELECT i FROM (SELECT row_number() OVER () - 1 AS i, * FROM df) WHERE {sql_condition(condition)} ORDER BY i"
+                assert duckdb.sql(duckdb_query).fetchnumpy()["i"].tolist() == expected, sql_condition(condition)
+
+        # Pipeline gerado: o filtro `<>` empurrado para a origem mantém a linha com NULL
+        model = KTRModel(
+            name="nulos",
+            connections=[Connection("db", "SQLITE", "", "", 0, "", ""), Connection("dw", "SQLITE", "", "", 0, "", "")],
+            steps=[
+                TableInputStep("origem", connection_name="db", sql="SELECT id, x FROM t"),
+                FilterRowsStep("filtra", condition=atom("x", "<>", "5")),
+                TableOutputStep("saida", connection_name="dw", table="saida"),
+            ],
+            hops=[Hop("origem", "filtra"), Hop("filtra", "saida")]
+        )
+        pushdowns = CodeGenerator()._prepare_template_data(model)["pushdowns"]
+        assert [r["clause"] for r in pushdowns] == ["WHERE"] and "x IS NULL" in pushdowns[0]["sql_after"]
+
+        pipeline_class = load_pipeline_class(model, self.tmp_dir.name)
+        pipeline = pipeline_class({"log_file": str(Path(self.tmp_dir.name) / "pipeline.log")})
+        source_db = sa.create_engine(f"sqlite:///{Path(self.tmp_dir.name) / 'nulos.db'}")
+        target_db = sa.create_engine(f"sqlite:///{Path(self.tmp_dir.name) / 'nulos_destino.db'}")
+        pd.DataFrame({"id": [1, 2, 3], "x": [1, None, 5]}).to_sql("t", source_db, index=False)
+        pipeline.connections = {"db": source_db, "dw": target_db}
+
+        metrics = pipeline.run_pipeline()
+
+        assert metrics["status"] == "success", metrics.get("error")
+        with target_db.connect() as conn:
+            assert sorted(pd.read_sql("SELECT id FROM saida", conn)["id"]) == [1, 2]
+        source_db.dispose()
+        target_db.dispose()
+
+    def test_pushed_filter_matching_nothing_is_not_a_validation_failure(self):
+        """Testa que a fonte vazia por causa do WHERE empurrado não derruba o pipeline"""
+        condition = {"negated": False, "operator": "-", "leftvalue": "x", "function": ">", "rightvalue": "",
+                     "value": {"type": "Integer", "text": "100", "isnull": False}, "conditions": []}
+        model = KTRModel(
+            name="vazio",
+            connections=[Connection("db", "SQLITE", "", "", 0, "", ""), Connection("dw", "SQLITE", "", "", 0, "", "")],
+            steps=[
+                TableInputStep("origem", connection_name="db", sql="SELECT id, x FROM t"),
+                FilterRowsStep("filtra", condition=condition),
+                TableOutputStep("saida", connection_name="dw", table="saida"),
+            ],
+            hops=[Hop("origem", "filtra"), Hop("filtra", "saida")]
+        )
+        template_data = CodeGenerator()._prepare_template_data(model)
+        assert [r["clause"] for r in template_data["pushdowns"]] == ["WHERE"]
+        assert template_data["filtered_sources"] == ["origem"]
+
+        for engine, streaming in (("pandas", False), ("pandas", True), ("polars", False), ("duckdb", False)):
+            pipeline_class = load_pipeline_class(model, self.tmp_dir.name, streaming=streaming, engine=engine)
+            pipeline = pipeline_class({"log_file": str(Path(self.tmp_dir.name) / "pipeline.log")})
+            source_db = sa.create_engine(f"sqlite:///{Path(self.tmp_dir.name) / f'vazio_{engine}_{streaming}.db'}")
+            target_db = sa.create_engine(f"sqlite:///{Path(self.tmp_dir.name) / f'vazio_destino_{engine}_{streaming}.db'}")
+            pd.DataFrame({"id": [1, 2, 3], "x": [1, 2, 5]}).to_sql("t", source_db, index=False)
+            pipeline.connections = {"db": source_db, "dw": target_db}
+
+            metrics = pipeline.run_pipeline()
+
+            assert metrics["status"] == "success", (engine, streaming, metrics.get("error"))
+            assert metrics["rows_loaded"].get("saida", 0) == 0
+            # Sem pushdown a fonte continua exigindo linhas
+            assert not pipeline.validate_data(pd.DataFrame() if engine != "polars" else pl.DataFrame())
+            source_db.dispose()
+            target_db.dispose()
+
+    def test_pushdown_keeps_unsafe_steps_in_pipeline(self):
+        """Testa que fan-out, ordenações que dependem de collation e SQL com variáveis não são reescritos"""
+        # clientes tem dois consumidores; build_sales_model começa por StringOperations (só as colunas são reduzidas)
+        assert CodeGenerator()._prepare_template_data(build_fan_out_model())["pushdowns"] == []
+        sales_pushdowns = CodeGenerator()._prepare_template_data(build_sales_model())["pushdowns"]
+        assert [rewrite["clause"] for rewrite in sales_pushdowns] == ["SELECT"]
+
+        model = KTRModel(
+            name="pg",
+            connections=[Connection("dw", "POSTGRESQL", "localhost", "dw", 5432, "u", "p")],
+            steps=[
+                TableInputStep("totais", connection_name="dw", sql="SELECT uf, SUM(valor) AS total FROM vendas GROUP BY uf"),
+                SortRowsStep("ordena", fields=[{"name": "uf", "ascending": True, "case_sensitive": False}]),
+                TableOutputStep("saida", connection_name="dw", table="saida", load_mode="upsert"),
+            ],
+            hops=[Hop("totais", "ordena"), Hop("ordena", "saida")]
+        )
+        assert CodeGenerator()._prepare_template_data(model)["pushdowns"] == []
+
+        # Texto em collation desconhecida do PostgreSQL: a ordem pode diferir do sort_values
+        model.get_step("ordena").fields[0]["case_sensitive"] = True
+        assert CodeGenerator()._prepare_template_data(model)["pushdowns"] == []
+        # Chave numérica (SUM) ou collation binária declarada na conexão vão para o banco
+        model.get_step("ordena").fields[0]["name"] = "total"
+        template_data = CodeGenerator()._prepare_template_data(model)
+        assert template_data["pushdowns"][0]["sql_after"].endswith("ORDER BY\n  total ASC NULLS FIRST")
+        model.get_step("ordena").fields[0]["name"] = "uf"
+        model.connections[0].attributes["COLLATION"] = "C"
+        template_data = CodeGenerator()._prepare_template_data(model)
+        assert template_data["pushdowns"][0]["sql_after"].endswith("ORDER BY\n  uf ASC NULLS FIRST")
+        # No DuckDB a ordenação fica no plano; sem pushdown, tudo fica no pipeline
+        assert CodeGenerator(engine="duckdb")._prepare_template_data(model)["pushdowns"] == []
+        assert CodeGenerator(pushdown=False)._prepare_template_data(model)["pushdowns"] == []
+
+        model.get_step("totais").sql = "SELECT * FROM vendas WHERE ano = ${ANO}"
+        assert CodeGenerator()._prepare_template_data(model)["pushdowns"] == []
+
+    def test_projection_pruning_reads_only_consumed_columns(self):
+        """Testa a redução do SELECT às colunas consumidas pelos destinos (SQLite real)"""
+        condition = {"negated": False, "operator": "-", "leftvalue": "valor", "function": ">", "rightvalue": "",
+                     "value": {"type": "Number", "text": "10", "isnull": False}, "conditions": []}
+        model = KTRModel(
+            name="colunas",
+            connections=[Connection("db", "SQLITE", "", "", 0, "", ""), Connection("dw", "SQLITE", "", "", 0, "", "")],
+            steps=[
+                TableInputStep("clientes", connection_name="db", sql="SELECT * FROM clientes"),
+                SelectValuesStep("seleciona", fields=[{"name": "nome", "rename": "cliente"}],
+                                 select_unspecified=True, remove=["obs"]),
+                FilterRowsStep("filtra", condition=condition),
+                TableOutputStep("saida", connection_name="dw", table="saida",
+                                field_mapping={"id": "id", "cliente": "nome_cliente"}),
+            ],
+            hops=[Hop("clientes", "seleciona"), Hop("seleciona", "filtra"), Hop("filtra", "saida")]
+        )
+
+        generator = CodeGenerator()
+        template_data = generator._prepare_template_data(model)
+        # Filtro lê valor; obs precisa existir para o drop; uf, email e criado_em não são lidos
+        assert template_data["pushdowns"] == [{
+            "source": "clientes", "step": "clientes", "clause": "SELECT", "mode": "merge",
+            "sql_before": "SELECT * FROM clientes",
+            "sql_after": "SELECT\n  id,\n  nome,\n  obs,\n  valor\nFROM clientes",
+        }]
+        assert "SELECT reduzido" in generator._generate_readme(template_data)
+
+        pipeline_class = load_pipeline_class(model, self.tmp_dir.name)
+        pipeline = pipeline_class({"log_file": str(Path(self.tmp_dir.name) / "pipeline.log")})
+        db = sa.create_engine(f"sqlite:///{Path(self.tmp_dir.name) / 'origem.db'}")
+        dw = sa.create_engine(f"sqlite:///{Path(self.tmp_dir.name) / 'destino.db'}")
+        pd.DataFrame({
+            "id": [1, 2, 3], "nome": ["ana", "bia", "caio"], "uf": ["SP", "RJ", "MG"], "email": ["a@x", "b@x", "c@x"],
+            "obs": ["", "", ""], "valor": [20.0, 5.0, 30.0], "criado_em": ["2024-01-01"] * 3,
+        }).to_sql("clientes", db, index=False)
+        pipeline.connections = {"db": db, "dw": dw}
+
+        metrics = pipeline.run_pipeline()
+
+        assert metrics["status"] == "success", metrics.get("error")
+        with dw.connect() as conn:
+            result = pd.read_sql("SELECT * FROM saida", conn)
+        db.dispose()
+        dw.dispose()
+        # Campos especificados do TableOutput: só eles, com os nomes das colunas do destino
+        assert result.to_dict("list") == {"id": [1, 3], "nome_cliente": ["ana", "caio"]}
+
+        # Um destino sem campos especificados consome todas as colunas
+        model.steps.append(TableOutputStep("bruta", connection_name="dw", table="bruta"))
+        model.hops.append(Hop("clientes", "bruta"))
+        assert CodeGenerator()._prepare_template_data(model)["pushdowns"] == []
+
+        # Planilhas com cabeçalho leem só as colunas usadas
+        planilha = KTRModel(
+            name="planilha",
+            steps=[
+                ExcelInputStep("planilha", file_path="dados.xlsx", sheet_name="Plan1",
+                               fields=[Field("id", "Integer", 9), Field("nascimento", "Date"), Field("nome", "String", 100)]),
+                TableOutputStep("saida", connection_name="dw", table="saida", field_mapping={"nome": "nm_cliente", "id": "id"}),
+            ],
+            hops=[Hop("planilha", "saida")],
+        )
+        extract = CodeGenerator()._prepare_template_data(planilha)["extractors"][0]["generate_code"]
+        assert "usecols=['id', 'nome']" in extract and "parse_dates=False" in extract
+
+    def test_cyclic_hops_are_rejected(self):
+        """Testa erro claro para hops em ciclo"""
+        model = build_fan_out_model()
+        model.hops.append(Hop("saida_upper", "clientes"))
+
+        with pytest.raises(ValueError, match="ciclo"):
+            build_dataflow_plan(model)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
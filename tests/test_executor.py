@@ -0,0 +1,169 @@
+"""
+Testes para o executor de fluxos da KTR Platform
+"""
+import pytest
+from pathlib import Path
+from datetime import datetime
+import tempfile
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent / "ktr_platform"))
+
+import flow_manager as flow_manager_module
+from executor import FlowExecutor, _FlowRun
+from flow_manager import FlowManager
+from job_queue import FlowJob, RUNNING
+from run_store import RunStore
+
+class TestFlowExecutor:
+    """Testes do FlowExecutor"""
+
+    def setup_method(self):
+        """Setup para cada teste"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.metadata_patch = patch.object(flow_manager_module, "FLOWS_METADATA_FILE",
+                                           Path(self.tmp_dir.name) / "flows.json")
+        self.metadata_patch.start()
+        self.run_store = RunStore(Path(self.tmp_dir.name) / "runs.db", flush_interval=60)
+        self.flow_manager = FlowManager(run_store=self.run_store, flush_interval=60)
+        self.executor = FlowExecutor(self.flow_manager, max_concurrent=1)
+
+        self.flow = self.flow_manager.add_flow("Fluxo")
+        self.flow.project_path = str(Path(self.tmp_dir.name) / "projeto")
+        self.flow_manager.update_flow_status(self.flow.id, "Pronto")
+
+    def teardown_method(self):
+        self.flow_manager.close()
+        self.metadata_patch.stop()
+        self.run_store.close()
+        self.tmp_dir.cleanup()
+
+    def _run(self, stopped: bool = False) -> _FlowRun:
+        """Execução já iniciada, com o job de uma fila falsa"""
+        self.executor.job_queue = MagicMock()
+        run = _FlowRun(job=FlowJob(flow_id=self.flow.id, state=RUNNING), start_time=datetime.now(), stopped=stopped)
+        self.executor._runs[self.flow.id] = run
+        return run
+
+    def _wait(self, predicate, timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not predicate():
+            time.sleep(0.02)
+        assert predicate()
+
+    def test_exit_of_stopped_run_keeps_interrupted_status(self):
+        """Testa que o fim de um processo parado pelo usuário não sobrescreve "Interrompido" """
+        run = self._run(stopped=True)
+        self.flow_manager.update_execution_status(self.flow.id, "Interrompido", end_time=datetime.now().isoformat())
+
+        self.executor._on_exit(run, -15)
+
+        assert self.flow_manager.get_flow(self.flow.id).execution_status == "Interrompido"
+        assert self.flow_manager.get_flow(self.flow.id).error_message is None
+        assert not self.executor.is_flow_running(self.flow.id)
+        self.executor.job_queue.release.assert_called_once_with(run.job)
+
+    def test_exit_records_result_and_releases_slot(self):
+        """Testa o status final por código de saída, com o slot sempre liberado"""
+        run = self._run()
+        self.executor._on_exit(run, 0)
+        assert self.flow_manager.get_flow(self.flow.id).execution_status == "Sucesso"
+        self.executor.job_queue.release.assert_called_once_with(run.job)
+
+        run = self._run()
+        run.stderr_lines = ["Traceback: boom"]
+        self.executor._on_exit(run, 1)
+        flow = self.flow_manager.get_flow(self.flow.id)
+        assert flow.execution_status == "Falha"
+        assert flow.error_message == "[GERAL] Traceback: boom"
+        self.executor.job_queue.release.assert_called_once_with(run.job)
+
+    def test_exit_releases_slot_when_bookkeeping_fails(self):
+        """Testa que release é chamado mesmo se o registro do resultado falhar"""
+        run = self._run()
+        with patch.object(self.flow_manager, "update_execution_status", side_effect=RuntimeError("disco cheio")):
+            with pytest.raises(RuntimeError):
+                self.executor._on_exit(run, 0)
+
+        self.executor.job_queue.release.assert_called_once_with(run.job)
+        assert not self.executor.is_flow_running(self.flow.id)
+
+    def test_stop_flow_interrupts_running_process(self):
+        """Testa parar um processo real: status "Interrompido" preservado e slot liberado para o próximo"""
+        project = Path(self.flow.project_path)
+        project.mkdir()
+        (project / "pipeline.py").write_text(
+            "import time\nprint('rodando', flush=True)\ntime.sleep(60)\n", encoding="utf-8"
+        )
+
+        assert self.executor.execute_flow(self.flow.id)
+        self._wait(lambda: any("rodando" in line for line in self.flow_manager.get_execution_logs(self.flow.id)))
+
+        assert self.executor.stop_flow(self.flow.id)
+        self._wait(lambda: self.executor.get_queue_stats()["running"] == 0)
+
+        assert self.flow_manager.get_flow(self.flow.id).execution_status == "Interrompido"
+        assert not self.executor.is_flow_running(self.flow.id)
+        # O slot liberado aceita uma nova execução
+        assert self.executor.execute_flow(self.flow.id)
+        self._wait(lambda: self.executor.is_flow_running(self.flow.id))
+        self.executor.stop_flow(self.flow.id)
+        self._wait(lambda: self.executor.get_queue_stats()["running"] == 0)
+
+    def test_error_lines_do_not_stop_flow_by_default(self):
+        """Testa que linhas com "error"/"failed" não derrubam o fluxo: o resultado vem do código de saída"""
+        project = Path(self.flow.project_path)
+        project.mkdir()
+        pipeline = project / "pipeline.py"
+        pipeline.write_text(
+            "import time\nprint('0 registros failed na validação opcional', flush=True)\n"
+            "time.sleep(1)\nprint('fim', flush=True)\n", encoding="utf-8"
+        )
+
+        assert self.executor.execute_flow(self.flow.id)
+        self._wait(lambda: any("fim" in line for line in self.flow_manager.get_execution_logs(self.flow.id)))
+        self._wait(lambda: self.executor.get_queue_stats()["running"] == 0)
+
+        flow = self.flow_manager.get_flow(self.flow.id)
+        assert flow.execution_status == "Sucesso"
+        assert flow.error_message is None
+
+        # Com falha, a primeira linha de erro (com a etapa) vira a mensagem do fluxo
+        pipeline.write_text(
+            "import sys\nprint('FileNotFoundError: origem.csv', flush=True)\n"
+            "print('Traceback: detalhes', file=sys.stderr, flush=True)\nsys.exit(1)\n", encoding="utf-8"
+        )
+        assert self.executor.execute_flow(self.flow.id)
+        self._wait(lambda: self.flow_manager.get_flow(self.flow.id).execution_status == "Falha")
+        self._wait(lambda: self.executor.get_queue_stats()["running"] == 0)
+        assert self.flow_manager.get_flow(self.flow.id).error_message == "[EXTRAÇÃO] FileNotFoundError: origem.csv"
+
+    def test_stop_on_error_line_is_opt_in_and_stops_once(self):
+        """Testa que, habilitado, só a primeira linha de erro interrompe, mesmo com linhas concorrentes"""
+        self.executor.supervisor = MagicMock()
+        run = self._run()
+        process = MagicMock()
+
+        with patch.object(self.executor, "_log_and_callback"):
+            self.executor._on_line(run, process, "Traceback: boom", True)
+            self.executor.supervisor.terminate.assert_not_called()
+            assert run.first_error == "[DESCONHECIDO] Traceback: boom" and not run.error_detected
+
+            self.executor.stop_on_error_line = True
+
+            def emit(worker):
+                for i in range(200):
+                    self.executor._on_line(run, process, f"error {worker}.{i}", True)
+
+            threads = [threading.Thread(target=emit, args=(worker,)) for worker in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert len(run.stderr_lines) == 1 + 8 * 200
+        assert run.first_error == "[DESCONHECIDO] Traceback: boom"
+        self.executor.supervisor.terminate.assert_called_once()
@@ -0,0 +1,109 @@
+"""
+Testes para a persistência de fluxos da KTR Platform
+"""
+import pytest
+from pathlib import Path
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent / "ktr_platform"))
+
+import flow_manager as flow_manager_module
+from flow_manager import FlowManager
+from run_store import RunStore
+
+class TestFlowManager:
+    """Testes do FlowManager"""
+
+    def setup_method(self):
+        """Setup para cada teste"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.metadata_file = Path(self.tmp_dir.name) / "flows.json"
+        self.run_store = RunStore(Path(self.tmp_dir.name) / "runs.db", flush_interval=60)
+        # Patch ativo até o close dos managers, para nenhum flush tocar o flows.json real
+        self.metadata_patch = patch.object(flow_manager_module, "FLOWS_METADATA_FILE", self.metadata_file)
+        self.metadata_patch.start()
+        self.managers = []
+
+    def teardown_method(self):
+        for manager in self.managers:
+            manager.close()
+        self.metadata_patch.stop()
+        self.run_store.close()
+        self.tmp_dir.cleanup()
+
+    def _manager(self) -> FlowManager:
+        # Intervalo longo: só o flush explícito grava flows.json
+        manager = FlowManager(run_store=self.run_store, flush_interval=60)
+        self.managers.append(manager)
+        return manager
+
+    def test_legacy_execution_logs_move_to_run_store(self):
+        """Testa que os logs embutidos em flows.json viram uma execução no RunStore"""
+        legacy = {
+            "id": "fluxo-antigo", "name": "Legado", "status": "Pronto",
+            "execution_status": "Sucesso", "execution_start_time": "2024-01-01T10:00:00",
+            "execution_end_time": "2024-01-01T10:00:05", "execution_duration": 5.0,
+            "execution_logs": ["[2024-01-01T10:00:00] 🚀 Iniciando", "[2024-01-01T10:00:05] ✅ Concluído"],
+        }
+        self.metadata_file.write_text(json.dumps([legacy]), encoding="utf-8")
+
+        manager = self._manager()
+
+        flow = manager.get_flow("fluxo-antigo")
+        assert flow.last_run_id
+        assert manager.get_execution_logs("fluxo-antigo") == legacy["execution_logs"]
+        assert manager.count_execution_logs("fluxo-antigo") == 2
+        runs = self.run_store.get_runs("fluxo-antigo")
+        assert [(run["run_id"], run["status"]) for run in runs] == [(flow.last_run_id, "Sucesso")]
+
+        # flows.json é reescrito sem os corpos de log
+        saved = json.loads(self.metadata_file.read_text(encoding="utf-8"))
+        assert "execution_logs" not in saved[0]
+        assert saved[0]["last_run_id"] == flow.last_run_id
+
+    def test_changes_are_written_on_flush_via_atomic_replace(self, monkeypatch):
+        """Testa que alterações só marcam o estado e o flush grava via temporário + os.replace"""
+        manager = self._manager()
+        flow = manager.add_flow("Novo")
+        manager.update_flow_status(flow.id, "Pronto")
+
+        assert json.loads(self.metadata_file.read_text(encoding="utf-8")) == []
+
+        replaced = []
+        real_replace = os.replace
+
+        def spy_replace(src, dst):
+            replaced.append((Path(src), Path(dst)))
+            assert json.loads(Path(src).read_text(encoding="utf-8"))[0]["status"] == "Pronto"
+            real_replace(src, dst)
+
+        monkeypatch.setattr(flow_manager_module.os, "replace", spy_replace)
+        manager.flush()
+
+        assert replaced == [(self.metadata_file.with_name("flows.json.tmp"), self.metadata_file)]
+        assert not self.metadata_file.with_name("flows.json.tmp").exists()
+        saved = json.loads(self.metadata_file.read_text(encoding="utf-8"))
+        assert [(item["id"], item["status"]) for item in saved] == [(flow.id, "Pronto")]
+
+        # Sem alterações pendentes, o flush não grava de novo
+        manager.flush()
+        assert len(replaced) == 1
+
+    def test_execution_logs_follow_last_run(self):
+        """Testa que os logs lidos são os da última execução e respeitam o limite"""
+        manager = self._manager()
+        flow = manager.add_flow("Execuções")
+
+        manager.start_run(flow.id)
+        manager.add_execution_log(flow.id, "primeira execução")
+        manager.start_run(flow.id)
+        for i in range(5):
+            manager.add_execution_log(flow.id, f"linha {i}")
+
+        logs = manager.get_execution_logs(flow.id, limit=2)
+        assert [line.split("] ", 1)[1] for line in logs] == ["linha 3", "linha 4"]
+        assert manager.count_execution_logs(flow.id) == 5
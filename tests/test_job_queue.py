@@ -0,0 +1,117 @@
+"""
+Testes para a fila de execução de fluxos da KTR Platform
+"""
+import pytest
+from pathlib import Path
+import threading
+import time
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent / "ktr_platform"))
+
+from job_queue import CANCELLED, FINISHED, QUEUED, RUNNING, JobQueue
+
+class TestJobQueue:
+    """Testes do JobQueue"""
+
+    def setup_method(self):
+        """Setup para cada teste"""
+        self.started = []
+        self.started_cond = threading.Condition()
+
+    def _start_job(self, job):
+        # Só registra o início: o slot fica ocupado até o teste chamar release
+        with self.started_cond:
+            self.started.append(job)
+            self.started_cond.notify_all()
+
+    def _wait_started(self, count: int, timeout: float = 2.0):
+        with self.started_cond:
+            assert self.started_cond.wait_for(lambda: len(self.started) >= count, timeout), self.started
+        return self.started[count - 1]
+
+    def _assert_not_started(self, count: int, wait: float = 0.1):
+        time.sleep(wait)
+        with self.started_cond:
+            assert len(self.started) == count
+
+    def test_higher_priority_first_then_fifo(self):
+        """Testa que a fila sai por prioridade e, na mesma prioridade, por ordem de chegada"""
+        queue = JobQueue(self._start_job, slots=1)
+        first = queue.submit("ocupa")
+        self._wait_started(1)
+
+        queue.submit("baixa_1", priority=0)
+        queue.submit("alta", priority=5)
+        queue.submit("baixa_2", priority=0)
+        assert [queue.position(flow_id) for flow_id in ("alta", "baixa_1", "baixa_2")] == [1, 2, 3]
+        self._assert_not_started(1)
+
+        queue.release(first)
+        for expected in range(2, 5):
+            queue.release(self._wait_started(expected))
+
+        assert [job.flow_id for job in self.started] == ["ocupa", "alta", "baixa_1", "baixa_2"]
+        assert all(job.state == FINISHED for job in self.started)
+        assert queue.stats()["running"] == 0
+
+    def test_cancel_removes_queued_job(self):
+        """Testa que um job cancelado na fila nunca é iniciado"""
+        queue = JobQueue(self._start_job, slots=1)
+        first = queue.submit("ocupa")
+        self._wait_started(1)
+        cancelled = queue.submit("cancelado")
+        queue.submit("seguinte")
+
+        assert queue.cancel("cancelado")
+        assert cancelled.state == CANCELLED
+        assert queue.get_job("cancelado") is None
+        assert queue.position("seguinte") == 1
+        # Só jobs ainda na fila podem ser cancelados
+        assert not queue.cancel("ocupa")
+        assert not queue.cancel("inexistente")
+
+        queue.release(first)
+        queue.release(self._wait_started(2))
+        self._assert_not_started(2)
+
+        assert [job.flow_id for job in self.started] == ["ocupa", "seguinte"]
+        # Após cancelar, o mesmo fluxo pode ser enfileirado de novo
+        assert queue.submit("cancelado") is not None
+
+    def test_release_frees_slot(self):
+        """Testa que o limite de slots é respeitado e que release libera a vaga"""
+        queue = JobQueue(self._start_job, slots=2)
+        for flow_id in ("a", "b", "c"):
+            queue.submit(flow_id)
+        self._wait_started(2)
+        self._assert_not_started(2)
+
+        stats = queue.stats()
+        assert (stats["running"], stats["queued"]) == (2, 1)
+        assert queue.get_job("c").state == QUEUED
+        # Fluxo já na fila ou executando não é enfileirado de novo
+        assert queue.submit("a") is None
+
+        queue.release(self.started[0])
+        third = self._wait_started(3)
+
+        assert third.flow_id == "c" and third.state == RUNNING
+        assert queue.stats()["running"] == 2
+        # Liberar de novo o mesmo job não abre uma vaga extra
+        queue.release(self.started[0])
+        assert queue.stats()["running"] == 2
+
+    def test_failed_start_releases_slot(self):
+        """Testa que uma falha em start_job não prende o slot"""
+        def failing_start(job):
+            if job.flow_id == "falha":
+                raise RuntimeError("erro ao iniciar")
+            self._start_job(job)
+
+        queue = JobQueue(failing_start, slots=1)
+        queue.submit("falha")
+        queue.submit("ok")
+
+        assert self._wait_started(1).flow_id == "ok"
+        assert [job.flow_id for job in queue.snapshot() if job.state == FINISHED] == ["falha"]
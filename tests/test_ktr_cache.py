@@ -0,0 +1,118 @@
+"""
+Testes para o cache persistente de parse/análise
+"""
+import pytest
+from pathlib import Path
+import tempfile
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import src.cache.ktr_cache as ktr_cache_module
+from src.cache.ktr_cache import KTRCache
+from src.parser.ktr_parser import KTRParser, PARSER_VERSION
+
+EXAMPLE_KTR = Path(__file__).parent.parent / "examples" / "exemplo_simples.ktr"
+
+class CountingParser(KTRParser):
+    """Parser que conta quantas vezes o XML foi realmente lido"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def parse_file(self, ktr_file_path, streaming=None):
+        self.calls += 1
+        return super().parse_file(ktr_file_path, streaming)
+
+class TestKTRCache:
+    """Testes do KTRCache"""
+
+    def setup_method(self):
+        """Setup para cada teste"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = KTRCache(cache_dir=self.tmp_dir.name)
+
+    def teardown_method(self):
+        self.tmp_dir.cleanup()
+
+    def test_parse_file_hit_returns_equal_model(self):
+        """Testa que a segunda leitura vem do cache e gera o mesmo modelo"""
+        parser = CountingParser()
+
+        first = self.cache.parse_file(str(EXAMPLE_KTR), parser)
+        second = self.cache.parse_file(str(EXAMPLE_KTR), parser)
+
+        assert parser.calls == 1
+        assert second == first
+        assert self.cache.stats == {"hits": 1, "misses": 1, "evictions": 0}
+
+    def test_parse_bytes_shares_key_with_file(self):
+        """Testa que upload em memória e arquivo em disco usam a mesma chave"""
+        parser = CountingParser()
+
+        self.cache.parse_file(str(EXAMPLE_KTR), parser)
+        model = self.cache.parse_bytes(EXAMPLE_KTR.read_bytes(), parser)
+
+        assert parser.calls == 1
+        assert model.name == "exemplo_simples"
+
+    def test_analysis_is_cached(self):
+        """Testa cache do AnalysisResult"""
+        content_hash = self.cache.hash_file(str(EXAMPLE_KTR))
+        model = self.cache.parse_file(str(EXAMPLE_KTR), content_hash=content_hash)
+
+        first = self.cache.analyze(model, content_hash)
+        second = self.cache.analyze(model, content_hash)
+
+        assert second.to_dict() == first.to_dict()
+        assert self.cache.stats["hits"] == 1
+
+    def test_lru_eviction_by_total_size(self):
+        """Testa remoção das entradas menos usadas ao exceder o limite"""
+        self.cache.parse_file(str(EXAMPLE_KTR))
+        entry_size = self.cache.total_size()
+
+        small_cache = KTRCache(cache_dir=self.tmp_dir.name, max_bytes=entry_size)
+        small_cache.analyze(small_cache.parse_file(str(EXAMPLE_KTR)), "outro-hash")
+
+        assert small_cache.stats["evictions"] >= 1
+        assert small_cache.total_size() <= entry_size
+
+    def test_corrupted_entry_is_discarded(self):
+        """Testa que entradas corrompidas são tratadas como miss"""
+        self.cache.parse_file(str(EXAMPLE_KTR))
+        for entry in Path(self.tmp_dir.name).glob("*.bin"):
+            entry.write_bytes(b"lixo")
+
+        model = self.cache.parse_file(str(EXAMPLE_KTR))
+
+        assert model.name == "exemplo_simples"
+        assert self.cache.stats["misses"] == 2
+
+    def test_model_from_previous_parser_version_is_invalidated(self, monkeypatch):
+        """Testa que modelos gravados por uma versão anterior do parser não são reaproveitados"""
+        # Entrada gravada antes da mudança de parse do TableOutput (field_mapping desatualizado)
+        monkeypatch.setattr(ktr_cache_module, "PARSER_VERSION", "1.4.0")
+        stale = self.cache.parse_file(str(EXAMPLE_KTR))
+        stale.name = "modelo_desatualizado"
+        content_hash = self.cache.hash_file(str(EXAMPLE_KTR))
+        self.cache._write(self.cache._model_key(content_hash), stale)
+        monkeypatch.undo()
+
+        parser = CountingParser()
+        model = self.cache.parse_file(str(EXAMPLE_KTR), parser)
+
+        assert PARSER_VERSION != "1.4.0"
+        assert parser.calls == 1
+        assert model.name == "exemplo_simples"
+
+    def test_disabled_cache_writes_nothing(self):
+        """Testa que --no-cache não grava entradas"""
+        cache = KTRCache(cache_dir=self.tmp_dir.name, enabled=False)
+        cache.parse_file(str(EXAMPLE_KTR))
+
+        assert cache.total_size() == 0
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -10,7 +10,10 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
 from src.parser.ktr_parser import KTRParser
-from src.models.ktr_models import KTRModel, TableInputStep, TableOutputStep, Connection
+from src.models.ktr_models import (
+    KTRModel, TableInputStep, TableOutputStep, Connection, Hop, Step, StepType,
+    SelectValuesStep, FilterRowsStep, SortRowsStep, GroupByStep
+)
 
 class TestKTRParser:
     """Testes do parser KTR"""
@@ -196,6 +199,258 @@ class TestKTRParser:
         finally:
             Path(temp_file).unlink()
     
+    def test_parse_insert_update_step(self):
+        """Testa parsing de InsertUpdate/Update como TableOutputStep com chaves"""
+        ktr_content = '''<?xml version="1.0" encoding="UTF-8"?>
+        <transformation>
+          <info>
+            <name>upsert_pipeline</name>
+          </info>
+          <step>
+            <name>upsert_clientes</name>
+            <type>InsertUpdate</type>
+            <connection>dw</connection>
+            <commit>500</commit>
+            <lookup>
+              <schema>public</schema>
+              <table>clientes</table>
+              <key>
+                <name>id_cliente</name>
+                <field>id</field>
+                <condition>=</condition>
+              </key>
+              <value>
+                <name>id</name>
+                <rename>id_cliente</rename>
+                <update>N</update>
+              </value>
+              <value>
+                <name>nome</name>
+                <rename>nome_cliente</rename>
+                <update>Y</update>
+              </value>
+              <value>
+                <name>criado_em</name>
+                <rename>criado_em</rename>
+                <update>N</update>
+              </value>
+            </lookup>
+          </step>
+          <step>
+            <name>atualiza_status</name>
+            <type>Update</type>
+            <connection>dw</connection>
+            <lookup>
+              <table>pedidos</table>
+              <key>
+                <name>id</name>
+                <field>id</field>
+                <condition>=</condition>
+              </key>
+              <value>
+                <name>status</name>
+                <rename>status</rename>
+              </value>
+            </lookup>
+          </step>
+        </transformation>'''
+        
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.ktr', delete=False) as f:
+            f.write(ktr_content)
+            temp_file = f.name
+        
+        try:
+            model = self.parser.parse_file(temp_file)
+            
+            upsert = model.get_step("upsert_clientes")
+            assert isinstance(upsert, TableOutputStep)
+            assert upsert.type == StepType.INSERT_UPDATE
+            assert upsert.is_output
+            assert upsert.load_mode == "upsert"
+            assert (upsert.schema, upsert.table, upsert.commit_size) == ("public", "clientes", 500)
+            assert upsert.key_fields == {"id_cliente": "id"}
+            assert upsert.field_mapping == {"id_cliente": "id", "nome_cliente": "nome", "criado_em": "criado_em"}
+            assert upsert.update_columns == ["nome"]
+            
+            update = model.get_step("atualiza_status")
+            assert update.type == StepType.UPDATE
+            assert update.load_mode == "update"
+            assert update.update_columns == ["status"]
+            
+        finally:
+            Path(temp_file).unlink()
+    
+    def test_parse_step_copies_and_partitioning(self):
+        """Testa <copies>, <distribute> e <partitioning> nos modos DOM e streaming"""
+        ktr_content = '''<?xml version="1.0" encoding="UTF-8"?>
+        <transformation>
+          <info>
+            <name>copies_pipeline</name>
+            <partitionschemas>
+              <partitionschema>
+                <name>por_id</name>
+                <partition><id>P1</id></partition>
+                <partition><id>P2</id></partition>
+                <partition><id>P3</id></partition>
+                <dynamic>N</dynamic>
+              </partitionschema>
+            </partitionschemas>
+          </info>
+          <step>
+            <name>upper</name>
+            <type>StringOperations</type>
+            <distribute>N</distribute>
+            <copies>4</copies>
+            <partitioning><method>none</method><schema_name/></partitioning>
+          </step>
+          <step>
+            <name>particionado</name>
+            <type>SelectValues</type>
+            <distribute>Y</distribute>
+            <copies>1</copies>
+            <partitioning>
+              <method>ModPartitioner</method>
+              <schema_name>por_id</schema_name>
+              <field_name>id</field_name>
+            </partitioning>
+          </step>
+          <step>
+            <name>parametrizado</name>
+            <type>SelectValues</type>
+            <copies>${COPIES}</copies>
+          </step>
+        </transformation>'''
+        
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.ktr', delete=False) as f:
+            f.write(ktr_content)
+            temp_file = f.name
+        
+        try:
+            for streaming in (False, True):
+                model = self.parser.parse_file(temp_file, streaming=streaming)
+                
+                upper = model.get_step("upper")
+                assert (upper.copies, upper.distribute, upper.partition_method) == (4, False, "")
+                
+                particionado = model.get_step("particionado")
+                assert particionado.copies == 3
+                assert particionado.partition_method == "mod"
+                assert (particionado.partition_schema, particionado.partition_field) == ("por_id", "id")
+                
+                assert model.get_step("parametrizado").copies == 1
+            
+        finally:
+            Path(temp_file).unlink()
+    
+    def test_parse_transform_steps(self):
+        """Testa parsing de SelectValues, FilterRows (condições aninhadas), SortRows e GroupBy"""
+        ktr_content = '''<?xml version="1.0" encoding="UTF-8"?>
+        <transformation>
+          <info>
+            <name>transform_pipeline</name>
+          </info>
+          <step>
+            <name>seleciona</name>
+            <type>SelectValues</type>
+            <fields>
+              <field><name>nome</name><rename>cliente</rename></field>
+              <field><name>uf</name><rename/></field>
+              <select_unspecified>Y</select_unspecified>
+              <remove><name>tmp</name></remove>
+              <meta><name>valor</name><rename/><type>Number</type></meta>
+            </fields>
+          </step>
+          <step>
+            <name>filtra</name>
+            <type>FilterRows</type>
+            <send_true_to>ordena</send_true_to>
+            <send_false_to/>
+            <compare>
+              <condition>
+                <negated>N</negated>
+                <conditions>
+                  <condition>
+                    <negated>N</negated>
+                    <operator>-</operator>
+                    <leftvalue>valor</leftvalue>
+                    <function>&gt;</function>
+                    <rightvalue/>
+                    <value><name>constant</name><type>Number</type><text>10</text><isnull>N</isnull></value>
+                  </condition>
+                  <condition>
+                    <negated>Y</negated>
+                    <operator>AND</operator>
+                    <leftvalue>uf</leftvalue>
+                    <function>IN LIST</function>
+                    <rightvalue/>
+                    <value><name>constant</name><type>String</type><text>RJ;MG</text><isnull>N</isnull></value>
+                  </condition>
+                </conditions>
+              </condition>
+            </compare>
+          </step>
+          <step>
+            <name>ordena</name>
+            <type>SortRows</type>
+            <unique_rows>Y</unique_rows>
+            <fields>
+              <field><name>uf</name><ascending>Y</ascending><case_sensitive>N</case_sensitive></field>
+              <field><name>valor</name><ascending>N</ascending></field>
+            </fields>
+          </step>
+          <step>
+            <name>agrupa</name>
+            <type>GroupBy</type>
+            <all_rows>N</all_rows>
+            <group><field><name>uf</name></field></group>
+            <fields>
+              <field><aggregate>total</aggregate><subject>valor</subject><type>SUM</type></field>
+              <field><aggregate>linhas</aggregate><subject/><type>COUNT_ANY</type></field>
+            </fields>
+          </step>
+        </transformation>'''
+        
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.ktr', delete=False) as f:
+            f.write(ktr_content)
+            temp_file = f.name
+        
+        try:
+            for streaming in (False, True):
+                model = self.parser.parse_file(temp_file, streaming=streaming)
+                
+                select = model.get_step("seleciona")
+                assert isinstance(select, SelectValuesStep)
+                assert select.fields == [{"name": "nome", "rename": "cliente"}, {"name": "uf", "rename": ""}]
+                assert select.select_unspecified
+                assert select.remove == ["tmp"]
+                assert select.meta == [{"name": "valor", "rename": "", "type": "Number"}]
+                
+                filter_rows = model.get_step("filtra")
+                assert isinstance(filter_rows, FilterRowsStep)
+                assert (filter_rows.send_true_to, filter_rows.send_false_to) == ("ordena", "")
+                first, second = filter_rows.condition["conditions"]
+                assert (first["leftvalue"], first["function"], first["value"]["text"]) == ("valor", ">", "10")
+                assert (second["operator"], second["negated"], second["function"]) == ("AND", True, "IN LIST")
+                
+                sort_rows = model.get_step("ordena")
+                assert isinstance(sort_rows, SortRowsStep)
+                assert sort_rows.unique_rows
+                assert sort_rows.fields == [
+                    {"name": "uf", "ascending": True, "case_sensitive": False},
+                    {"name": "valor", "ascending": False, "case_sensitive": True},
+                ]
+                
+                group_by = model.get_step("agrupa")
+                assert isinstance(group_by, GroupByStep)
+                assert group_by.group_fields == ["uf"]
+                assert group_by.aggregates == [
+                    {"name": "total", "subject": "valor", "type": "SUM"},
+                    {"name": "linhas", "subject": "", "type": "COUNT_ANY"},
+                ]
+            
+        finally:
+            Path(temp_file).unlink()
+    
     def test_clean_sql_method(self):
         """Testa limpeza de SQL com caracteres especiais"""
         dirty_sql = "SELECT&#xd;&#xa;    campo&#x28;test&#x29;&#xd;&#xa;FROM&#x2f;table"
@@ -240,6 +495,56 @@ class TestKTRParser:
         finally:
             Path(temp_file).unlink()
     
+    def test_streaming_parse_matches_dom(self):
+        """Testa que o modo streaming gera o mesmo modelo que o DOM"""
+        example = Path(__file__).parent.parent / "examples" / "exemplo_simples.ktr"
+
+        dom_model = self.parser.parse_file(str(example), streaming=False)
+        streaming_model = self.parser.parse_file(str(example), streaming=True)
+
+        assert streaming_model == dom_model
+        assert len(streaming_model.steps) == 3
+        assert len(streaming_model.hops) == 2
+        # specify_fields=N: a lista de campos do TableOutput é ignorada (todos são gravados)
+        assert all(step.field_mapping == {} for step in streaming_model.get_output_steps())
+
+    def test_streaming_ignores_nested_tags(self):
+        """Testa que tags aninhadas homônimas não viram conexões/hops no streaming"""
+        ktr_content = '''<?xml version="1.0" encoding="UTF-8"?>
+        <transformation>
+          <info>
+            <name>nested_pipeline</name>
+            <log><trans-log-table><connection/><table/></trans-log-table></log>
+          </info>
+          <notepads><notepad><note>texto livre</note></notepad></notepads>
+          <step>
+            <name>input_step</name>
+            <type>TableInput</type>
+            <connection>test_db</connection>
+            <sql>SELECT 1</sql>
+          </step>
+          <order>
+            <hop><from>input_step</from><to>input_step</to><enabled>N</enabled></hop>
+          </order>
+        </transformation>'''
+
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.ktr', delete=False) as f:
+            f.write(ktr_content)
+            temp_file = f.name
+
+        try:
+            model = self.parser.parse_file(temp_file, streaming=True)
+
+            assert model == self.parser.parse_file(temp_file, streaming=False)
+            assert model.name == "nested_pipeline"
+            assert model.description == ""
+            assert len(model.connections) == 0
+            assert model.get_step("input_step").connection_name == "test_db"
+            assert model.hops[0].enabled is False
+
+        finally:
+            Path(temp_file).unlink()
+
     def test_connection_sqlalchemy_url(self):
         """Testa geração de URL SQLAlchemy"""
         conn = Connection(
@@ -289,5 +594,37 @@ class TestKTRParser:
         assert output_step.is_output == True
         assert output_step.is_transform == False
 
+    def test_model_indexes_and_graph(self):
+        """Testa índices de adjacência e grafo compartilhado do modelo"""
+        import pickle
+        
+        steps = [Step(name, StepType.SELECT_VALUES) for name in ("a", "b", "c")]
+        model = KTRModel(
+            name="test",
+            steps=steps,
+            hops=[Hop("a", "b"), Hop("a", "c"), Hop("b", "c", enabled=False)]
+        )
+        
+        assert [hop.to_step for hop in model.get_outgoing_hops("a")] == ["b", "c"]
+        assert len(model.get_incoming_hops("c")) == 2
+        assert model.get_upstream_steps("c") == ["a"]
+        assert model.get_downstream_steps("b") == []
+        
+        graph = model.get_graph()
+        assert graph is model.get_graph()
+        assert set(graph.edges()) == {("a", "b"), ("a", "c")}
+        
+        # Índices são reconstruídos quando as listas mudam
+        model.steps.append(Step("d", StepType.SELECT_VALUES))
+        model.hops.append(Hop("c", "d"))
+        assert model.get_step("d") is not None
+        assert model.get_downstream_steps("c") == ["d"]
+        assert model.get_graph() is not graph
+        
+        # Caches não participam da comparação nem da serialização
+        restored = pickle.loads(pickle.dumps(model))
+        assert restored == model
+        assert restored.get_upstream_steps("d") == ["c"]
+
 if __name__ == "__main__":
     pytest.main([__file__]) 
\ No newline at end of file
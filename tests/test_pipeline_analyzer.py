@@ -0,0 +1,141 @@
+"""
+Testes para o analisador de pipelines
+"""
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from src.analyzer.pipeline_analyzer import PipelineAnalyzer
+from src.models.ktr_models import KTRModel, Step, StepType, Hop, Connection, FilterRowsStep, TableInputStep, TableOutputStep
+
+def build_model(edges, extra_steps=()):
+    """Cria modelo com steps de transformação ligados pelos hops informados"""
+    names = []
+    for from_step, to_step in edges:
+        for name in (from_step, to_step):
+            if name not in names:
+                names.append(name)
+    names.extend(extra_steps)
+    return KTRModel(
+        name="test",
+        steps=[Step(name, StepType.SELECT_VALUES) for name in names],
+        hops=[Hop(from_step, to_step) for from_step, to_step in edges]
+    )
+
+class TestPipelineAnalyzer:
+    """Testes do PipelineAnalyzer"""
+    
+    def setup_method(self):
+        """Setup para cada teste"""
+        self.analyzer = PipelineAnalyzer()
+    
+    def test_metrics_on_dag(self):
+        """Testa profundidade e largura (geração topológica) em um DAG"""
+        model = build_model([("a", "b"), ("a", "c"), ("a", "d"), ("b", "e"), ("c", "e"), ("e", "f")])
+        
+        metrics = self.analyzer.analyze_pipeline(model).metrics
+        
+        assert metrics["graph_depth"] == 3
+        assert metrics["graph_width"] == 3
+        assert metrics["cycles"] == 0
+    
+    def test_cycles_counted_by_strongly_connected_components(self):
+        """Testa detecção de ciclos via SCC (inclusive auto-laço)"""
+        model = build_model([("a", "b"), ("b", "c"), ("c", "b"), ("c", "d"), ("d", "d")])
+        
+        result = self.analyzer.analyze_pipeline(model)
+        
+        assert result.metrics["cycles"] == 2
+        assert result.metrics["graph_depth"] == 2
+    
+    def test_critical_paths_use_longest_path(self):
+        """Testa caminho crítico por componente conectado"""
+        model = build_model(
+            [("a", "b"), ("b", "c"), ("c", "d"), ("a", "d"), ("x", "y")],
+            extra_steps=["isolado"]
+        )
+        
+        paths = self.analyzer.find_critical_paths(model)
+        
+        assert paths == [["a", "b", "c", "d"], ["x", "y"]]
+    
+    def test_step_depths(self):
+        """Testa profundidade individual dos steps"""
+        model = build_model([("a", "b"), ("b", "c"), ("a", "c")])
+        
+        assert self.analyzer.calculate_step_depths(model) == {"a": 0, "b": 1, "c": 2}
+    
+    def test_large_fan_out_is_fast(self):
+        """Testa que grafos com muitos caminhos não explodem exponencialmente"""
+        # 40 camadas de 2 nós totalmente conectadas: 2^40 caminhos simples
+        edges = []
+        for layer in range(39):
+            for i in range(2):
+                for j in range(2):
+                    edges.append((f"n{layer}_{i}", f"n{layer + 1}_{j}"))
+        model = build_model(edges)
+        
+        paths = self.analyzer.find_critical_paths(model)
+        metrics = self.analyzer.analyze_pipeline(model).metrics
+        
+        assert len(paths) == 1 and len(paths[0]) == 40
+        assert metrics["graph_depth"] == 39
+        assert metrics["graph_width"] == 2
+    
+    def test_in_database_flows_report_avoided_transfer(self):
+        """Testa o relatório dos fluxos ELT e do tráfego evitado a partir das linhas de uma execução"""
+        condition = {"negated": False, "operator": "-", "leftvalue": "status", "function": "=", "rightvalue": "",
+                     "value": {"type": "String", "text": "ativo", "isnull": False}, "conditions": []}
+        model = KTRModel(
+            name="elt",
+            connections=[Connection("dw", "POSTGRESQL", "localhost", "dw", 5432, "u", "p")],
+            steps=[
+                TableInputStep("origem", connection_name="dw", sql="SELECT * FROM clientes"),
+                FilterRowsStep("ativos", condition=condition),
+                TableOutputStep("destino", connection_name="dw", table="clientes_ativos"),
+            ],
+            hops=[Hop("origem", "ativos"), Hop("ativos", "destino")]
+        )
+
+        result = self.analyzer.analyze_pipeline(model, row_counts={"origem": 1000, "destino": 400})
+
+        in_database = result.metrics["in_database"]
+        assert in_database["flows"] == [
+            {"steps": ["origem", "ativos", "destino"], "connection": "dw", "target": "clientes_ativos"}
+        ]
+        assert in_database["rows_avoided"] == 1400
+        assert in_database["bytes_avoided"] == 1400 * 200
+        assert "In-Database ELT" in [pattern.name for pattern in result.patterns]
+        suggestion = next(o for o in result.optimizations if o.type == "in_database_elt")
+        assert "WHERE (status = 'ativo')" in suggestion.code_example
+
+        # Sem linhas de referência a estimativa fica indefinida
+        assert self.analyzer.analyze_pipeline(model).metrics["in_database"]["rows_avoided"] is None
+
+    def test_sql_optimization_reports_pushdown_rewrites(self):
+        """Testa que a sugestão de SQL mostra a consulta reescrita pelo pushdown"""
+        condition = {"negated": False, "operator": "-", "leftvalue": "status", "function": "=", "rightvalue": "",
+                     "value": {"type": "String", "text": "ativo", "isnull": False}, "conditions": []}
+        model = KTRModel(
+            name="pushdown",
+            connections=[Connection("db", "MYSQL", "localhost", "db", 3306, "u", "p")],
+            steps=[
+                TableInputStep("origem", connection_name="db", sql="SELECT id, status FROM clientes", limit=100),
+                FilterRowsStep("ativos", condition=condition),
+                TableOutputStep("destino", connection_name="db", table="clientes_ativos", load_mode="upsert"),
+            ],
+            hops=[Hop("origem", "ativos"), Hop("ativos", "destino")]
+        )
+
+        result = self.analyzer.analyze_pipeline(model)
+
+        assert [(r["step"], r["clause"]) for r in result.metrics["pushdown"]] == [("origem", "LIMIT"), ("ativos", "WHERE")]
+        suggestion = next(o for o in result.optimizations if o.type == "sql_optimization")
+        assert "ativos, origem" in suggestion.description
+        assert "SELECT id, status FROM clientes" in suggestion.code_example
+        assert "status = 'ativo'" in suggestion.code_example and "LIMIT 100" in suggestion.code_example
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,101 @@
+"""
+Testes para o armazenamento de execuções e logs da KTR Platform
+"""
+import pytest
+from pathlib import Path
+import sqlite3
+import tempfile
+import time
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent / "ktr_platform"))
+
+from run_store import RunStore
+
+class TestRunStore:
+    """Testes do RunStore"""
+
+    def setup_method(self):
+        """Setup para cada teste"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmp_dir.name) / "runs.db"
+        # Intervalo longo: só o flush explícito (ou o lote cheio) grava as linhas
+        self.store = RunStore(self.db_path, flush_interval=60, batch_size=1000)
+
+    def teardown_method(self):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def _count_all(db_path: Path) -> int:
+        with sqlite3.connect(str(db_path)) as conn:
+            return conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+
+    def _rows_on_disk(self, run_id: str) -> int:
+        """Conta as linhas gravadas lendo o banco por outra conexão, sem passar pelo flush"""
+        with sqlite3.connect(str(self.db_path)) as conn:
+            return conn.execute("SELECT COUNT(*) FROM logs WHERE run_id = ?", (run_id,)).fetchone()[0]
+
+    def test_appended_lines_are_batched_until_flush(self):
+        """Testa que as linhas ficam em memória e chegam ao banco em um único lote no flush"""
+        run_id = self.store.start_run("fluxo")
+        for i in range(10):
+            self.store.append_log(run_id, "fluxo", f"linha {i}")
+
+        assert self._rows_on_disk(run_id) == 0
+
+        self.store.flush()
+
+        assert self._rows_on_disk(run_id) == 10
+        assert self.store.get_logs(run_id) == [f"linha {i}" for i in range(10)]
+
+    def test_reads_include_pending_lines(self):
+        """Testa que get_logs e count_logs enxergam as linhas ainda não gravadas"""
+        run_id = self.store.start_run("fluxo")
+        self.store.append_log(run_id, "fluxo", "pendente")
+
+        assert self.store.count_logs(run_id) == 1
+        assert self.store.get_logs(run_id) == ["pendente"]
+
+    def test_limit_returns_last_lines_in_order(self):
+        """Testa que limit traz as últimas linhas em ordem cronológica e count_logs traz o total"""
+        run_id = self.store.start_run("fluxo")
+        other_run = self.store.start_run("outro")
+        for i in range(100):
+            self.store.append_log(run_id, "fluxo", f"linha {i}")
+            self.store.append_log(other_run, "outro", f"outra {i}")
+
+        assert self.store.get_logs(run_id, limit=3) == ["linha 97", "linha 98", "linha 99"]
+        assert self.store.count_logs(run_id) == 100
+        assert len(self.store.get_logs(run_id)) == 100
+        assert self.store.count_logs("inexistente") == 0
+
+    def test_full_batch_wakes_writer(self):
+        """Testa que um lote cheio é gravado sem esperar o intervalo"""
+        store = RunStore(Path(self.tmp_dir.name) / "lote.db", flush_interval=60, batch_size=5)
+        try:
+            run_id = store.start_run("fluxo")
+            for i in range(5):
+                store.append_log(run_id, "fluxo", f"linha {i}")
+
+            deadline = time.monotonic() + 2
+            while time.monotonic() < deadline and not self._count_all(store.db_path):
+                time.sleep(0.01)
+
+            assert self._count_all(store.db_path) == 5
+        finally:
+            store.close()
+
+    def test_runs_and_delete_flow(self):
+        """Testa o registro de execuções e a remoção de execuções e logs de um fluxo"""
+        run_id = self.store.start_run("fluxo", started_at="2024-01-01T10:00:00")
+        self.store.append_log(run_id, "fluxo", "linha")
+        self.store.update_run(run_id, "Sucesso", ended_at="2024-01-01T10:00:05", duration=5.0)
+
+        runs = self.store.get_runs("fluxo")
+        assert [(run["run_id"], run["status"], run["duration"]) for run in runs] == [(run_id, "Sucesso", 5.0)]
+
+        self.store.delete_flow("fluxo")
+
+        assert self.store.get_runs("fluxo") == []
+        assert self.store.count_logs(run_id) == 0